@@ -33,10 +33,24 @@ DATABASES = {
 
 ELASTICSEARCH_DSL = {
     'default': {
-        'hosts': os.getenv('ES_HOST', 'elasticsearch:9200')
+        'hosts': os.getenv('ES_HOST', 'elasticsearch:9200'),
+        'http_compress': os.getenv('ES_HTTP_COMPRESS', 'true').lower() == 'true',
+        'maxsize': int(os.getenv('ES_CONNECTIONS_PER_HOST', 16)),
     },
 }
 
+# Снимок метрик команды sync_data для эндпоинта /metrics
+ETL_METRICS_PATH = os.getenv('ETL_METRICS_PATH', str(BASE_DIR / 'etl_metrics.prom'))
+
+# Кэш ответов API поиска; поколение индекса перечитывается раз в POLL секунд
+MOVIE_API_CACHE_SIZE = int(os.getenv('MOVIE_API_CACHE_SIZE', 1024))
+MOVIE_API_CACHE_TTL = float(os.getenv('MOVIE_API_CACHE_TTL', 60))
+MOVIE_API_GENERATION_POLL = float(os.getenv('MOVIE_API_GENERATION_POLL', 1))
+
+# Профиль индекса movies (movies/index_profiles.py) и ожидаемый объём каталога
+MOVIES_INDEX_PROFILE = os.getenv('MOVIES_INDEX_PROFILE', 'serving')
+MOVIES_INDEX_EXPECTED_DOCS = int(os.getenv('MOVIES_INDEX_EXPECTED_DOCS', 0))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_TZ = True
@@ -0,0 +1,93 @@
+"""Кэш ответов API поиска: LRU с TTL и объединением одинаковых запросов.
+
+Записи привязаны к поколению индекса: как только ETL увеличил счётчик,
+кэш очищается целиком. Пока первый запрос по ключу ходит в Elasticsearch,
+одновременные запросы с тем же ключом ждут его результат, а не дублируют его.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[Tuple[int, Hashable], _Call] = {}
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, generation: int, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            call = self._inflight.get((generation, key))
+            leader = call is None
+            if leader:
+                call = self._inflight[(generation, key)] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[(generation, key)]
+                # Ответ, посчитанный по устаревшему поколению, не сохраняем
+                if call.error is None and generation == self._generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, call.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            call.event.set()
+        return call.value
+
+
+class GenerationPoller:
+    """Текущее поколение индекса, перечитываемое не чаще раза в interval секунд"""
+    def __init__(self, load: Callable[[], int], interval: float = 1.0):
+        self.load = load
+        self.interval = interval
+        self._value = 0
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        with self._lock:
+            if time.monotonic() - self._checked >= self.interval:
+                self._value = self.load()
+                self._checked = time.monotonic()
+            return self._value
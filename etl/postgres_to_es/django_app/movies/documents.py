@@ -1,45 +1,57 @@
 # documents.py
+from django.conf import settings
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
+from .index_profiles import get_profile, index_settings, mapping_properties
 from .models import Movie
 
+PROFILE = get_profile(settings.MOVIES_INDEX_PROFILE)
+# Поля строятся из того же маппинга, что и индекс в create_es_index
+MAPPING = mapping_properties(PROFILE)
+
+FIELD_TYPES = {
+    'keyword': fields.KeywordField,
+    'text': fields.TextField,
+    'float': fields.FloatField,
+    'nested': fields.NestedField,
+}
+
+
+def dsl_field(spec):
+    params = dict(spec)
+    field_class = FIELD_TYPES[params.pop('type')]
+    if 'properties' in params:
+        params['properties'] = {name: dsl_field(sub) for name, sub in params['properties'].items()}
+    if 'fields' in params:
+        params['fields'] = {name: dsl_field(sub) for name, sub in params['fields'].items()}
+    return field_class(**params)
+
+
 @registry.register_document
 class MovieDocument(Document):
-    id = fields.KeywordField()
-    imdb_rating = fields.FloatField()
-    title = fields.TextField(
-        analyzer='ru_en',
-        fields={'raw': fields.KeywordField()}
-    )
-    description = fields.TextField(analyzer='ru_en')
-    genres = fields.KeywordField()
-    
-    directors = fields.NestedField(properties={
-        'id': fields.KeywordField(),
-        'name': fields.TextField(analyzer='ru_en')
-    })
-    
-    actors = fields.NestedField(properties={
-        'id': fields.KeywordField(),
-        'name': fields.TextField(analyzer='ru_en')
-    })
-    
-    writers = fields.NestedField(properties={
-        'id': fields.KeywordField(),
-        'name': fields.TextField(analyzer='ru_en')
-    })
+    id = dsl_field(MAPPING['id'])
+    imdb_rating = dsl_field(MAPPING['imdb_rating'])
+    title = dsl_field(MAPPING['title'])
+    description = dsl_field(MAPPING['description'])
+    genres = dsl_field(MAPPING['genres'])
+    directors_names = dsl_field(MAPPING['directors_names'])
+    actors_names = dsl_field(MAPPING['actors_names'])
+    writers_names = dsl_field(MAPPING['writers_names'])
+
+    directors = dsl_field(MAPPING['directors'])
+    actors = dsl_field(MAPPING['actors'])
+    writers = dsl_field(MAPPING['writers'])
+    content_hash = dsl_field(MAPPING['content_hash'])
 
     class Index:
         name = 'movies'
-        settings = {
-            'number_of_shards': 1,
-            'number_of_replicas': 0
-        }
+        settings = index_settings(PROFILE, settings.MOVIES_INDEX_EXPECTED_DOCS)
 
     class Django:
         model = Movie
-        fields = [
-            'directors_names',  # Эти поля будут автоматически взяты из модели
-            'actors_names',
-            'writers_names'
-        ]
+        # *_names хранятся списками в JSONField и объявлены явно выше
+        fields = []
+
+    def prepare_content_hash(self, instance):
+        # Есть только у фильмов, выбранных с аннотацией content_hash
+        return getattr(instance, 'content_hash', None)
@@ -0,0 +1,103 @@
+"""Адаптивный размер пачек извлечения и bulk-запросов (AIMD).
+
+Пока сигналы в норме, размер растёт на фиксированный шаг; при отказах ES,
+медленных bulk-запросах или запросах к Postgres, а также при превышении
+лимита памяти процесса — уменьшается вдвое. Размеры не выходят за заданные
+границы, каждое решение пишется в лог.
+"""
+import os
+import logging
+import resource
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Не Linux: пиковое значение, ru_maxrss в килобайтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class AIMDController:
+    """Аддитивный рост, мультипликативное уменьшение в пределах границ"""
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        step: int = 0,
+        factor: float = 0.5
+    ):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step or max((maximum - minimum) // 20, 1)
+        self.factor = factor
+        self._value = min(max(initial, minimum), maximum)
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def increase(self, reason: str) -> None:
+        with self._lock:
+            self._set(self._value + self.step, reason, level=logging.DEBUG)
+
+    def decrease(self, reason: str) -> None:
+        with self._lock:
+            self._set(int(self._value * self.factor), reason, level=logging.INFO)
+
+    def _set(self, value: int, reason: str, level: int) -> None:
+        value = min(max(value, self.minimum), self.maximum)
+        if value != self._value:
+            logger.log(level, f"{self.name}: {self._value} -> {value} ({reason})")
+            self._value = value
+
+
+class BatchTuner:
+    """Обратная связь по размерам пачки извлечения и bulk-запроса"""
+    def __init__(self, settings):
+        self.settings = settings
+        self.batch = AIMDController(
+            'extract batch',
+            settings.batch_size,
+            settings.batch_size_min,
+            settings.batch_size_max,
+        )
+        self.bulk = AIMDController(
+            'bulk chunk',
+            settings.bulk_chunk_size,
+            settings.bulk_chunk_min,
+            settings.bulk_chunk_max,
+        )
+
+    def memory_pressure(self) -> bool:
+        return rss_bytes() > self.settings.rss_limit_mb * 1024 * 1024
+
+    def observe_query(self, seconds: float, rows: int, requested: int) -> None:
+        """Учёт времени запроса к Postgres за пачку"""
+        if self.memory_pressure():
+            self.batch.decrease('rss over limit')
+        elif seconds > self.settings.pg_target_latency:
+            self.batch.decrease(f'query took {seconds:.2f}s')
+        elif rows >= requested:
+            # Растём только на полных пачках: короткая значит, что данные кончились
+            self.batch.increase(f'query took {seconds:.2f}s')
+
+    def observe_bulk(self, seconds: float, docs: int, rejected: int) -> None:
+        """Учёт задержки bulk-запроса и доли отказов ES"""
+        if rejected:
+            self.bulk.decrease(f'{rejected}/{docs} rejected')
+        elif self.memory_pressure():
+            self.bulk.decrease('rss over limit')
+        elif seconds > self.settings.bulk_target_latency:
+            self.bulk.decrease(f'bulk took {seconds:.2f}s')
+        else:
+            self.bulk.increase(f'bulk took {seconds:.2f}s')
@@ -0,0 +1,311 @@
+"""Асинхронный рантайм ETL: extract, transform и load работают одновременно.
+
+Стадии соединены ограниченными очередями asyncio, поэтому Postgres отдаёт
+следующую пачку, пока Elasticsearch индексирует предыдущую. Изменения персон
+и жанров обрабатывают продюсеры синхронного движка в отдельном потоке.
+"""
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
+
+from movies.etl import metrics
+from movies.etl.resources import async_es_client
+from movies.management.commands.sync_data_main import (
+    FILM_WORK_QUERIES,
+    RETRYABLE_STATUSES,
+    BulkLoader,
+    Settings,
+    State,
+    chunk_actions,
+    chunk_ids,
+    error_reason,
+    get_es_connection,
+    is_retryable,
+    observe_extract,
+    run_entity_producers,
+    transform_data,
+)
+
+logger = logging.getLogger(__name__)
+
+# Порядковый номер пачки и её строки
+Batch = Tuple[int, List[Dict]]
+# Порядковый номер, последняя строка (для чекпоинта) и bulk-действия
+Job = Tuple[int, Dict, List[Dict]]
+
+
+def unsupported_settings(settings: Settings) -> List[str]:
+    """Настройки синхронного движка, которые асинхронный рантайм не поддерживает"""
+    from movies.etl.projections import projection_names
+
+    problems = []
+    if settings.extract_mode not in ('batch', 'stream'):
+        problems.append(f'EXTRACT_MODE={settings.extract_mode}')
+    if settings.fingerprint_path:
+        problems.append('FINGERPRINT_PATH')
+    if projection_names(settings):
+        problems.append(f'INDEX_PROJECTIONS={settings.index_projections}')
+    if settings.scheduler != 'single':
+        problems.append(f'SCHEDULER={settings.scheduler}')
+    if settings.change_capture != 'poll':
+        problems.append(f'CHANGE_CAPTURE={settings.change_capture}')
+    if settings.adaptive_batching:
+        problems.append('ADAPTIVE_BATCHING')
+    return problems
+
+
+class Checkpoint:
+    """Продвигает State только по непрерывному префиксу загруженных пачек"""
+    def __init__(self, state: State, generation=None):
+        self.state = state
+        # GenerationCounter: сброс кэша API поиска, как у BulkLoader
+        self.generation = generation
+        self.next_seq = 0
+        self.done: Dict[int, Dict] = {}
+
+    def ack(self, seq: int, last_row: Dict) -> None:
+        self.done[seq] = last_row
+        advanced = False
+        while self.next_seq in self.done:
+            self.state.advance(self.done.pop(self.next_seq))
+            self.next_seq += 1
+            advanced = True
+        if advanced and self.generation is not None:
+            # Увеличения чаще min_interval схлопываются, запрос к Postgres редкий
+            self.generation.bump()
+
+
+async def connect(settings: Settings) -> psycopg.AsyncConnection:
+    return await psycopg.AsyncConnection.connect(
+        dbname=settings.postgres_db,
+        user=settings.postgres_user,
+        password=settings.postgres_password,
+        host=settings.postgres_host,
+        port=settings.postgres_port,
+        row_factory=dict_row,
+    )
+
+
+async def extract(
+    conn: psycopg.AsyncConnection,
+    settings: Settings,
+    state: State,
+    out: asyncio.Queue
+) -> None:
+    """Чтение film_work серверным курсором асинхронного драйвера"""
+    seq = 0
+    async with conn.transaction():
+        async with conn.cursor(name='film_work_stream') as cursor:
+            cursor.itersize = settings.pg_itersize
+            await cursor.execute(
+                FILM_WORK_QUERIES[settings.query_strategy],
+                (state.last_modified, state.last_id)
+            )
+            while True:
+                started = time.monotonic()
+                # На bulk-запросы пачку делит chunk_actions в load()
+                rows = await cursor.fetchmany(settings.batch_size)
+                observe_extract(started, rows, settings.batch_size)
+                if not rows:
+                    break
+                await out.put((seq, rows))
+                seq += 1
+
+
+async def transform(inp: asyncio.Queue, out: asyncio.Queue, loaders: int) -> None:
+    """Преобразование строк в bulk-действия"""
+    while True:
+        batch: Optional[Batch] = await inp.get()
+        if batch is None:
+            for _ in range(loaders):
+                await out.put(None)
+            return
+        seq, rows = batch
+        with metrics.STAGE_SECONDS.time(stage='transform'):
+            actions = list(transform_data(rows))
+        metrics.DOCUMENTS.inc(len(actions), stage='transform')
+        await out.put((seq, rows[-1], actions))
+
+
+async def backoff(attempt: int) -> None:
+    await asyncio.sleep(min(2 ** attempt, 60) * random.uniform(0.5, 1.0))
+
+
+async def send(
+    es: AsyncElasticsearch,
+    settings: Settings,
+    chunk: List[bytes],
+    dead_letters=None,
+) -> int:
+    """Отправка пачки с повтором 429/503 и сетевых сбоев, как BulkLoader._send.
+
+    Документы с постоянными ошибками уходят в dead-letter хранилище; если его
+    нет, пачка считается неподтверждённой и исключение прерывает проход.
+    """
+    indexed = 0
+    attempt = 0
+    while chunk:
+        started = time.monotonic()
+        try:
+            response = await es.bulk(body=b''.join(chunk))
+        except TransportError as e:
+            metrics.BULK_ERRORS.inc(reason=error_reason(e))
+            if not is_retryable(e) or attempt >= settings.bulk_max_retries:
+                raise
+            logger.warning(f"Bulk request failed, retrying: {e}")
+            attempt += 1
+            await backoff(attempt)
+            continue
+
+        metrics.STAGE_SECONDS.observe(time.monotonic() - started, stage='bulk')
+        metrics.BATCH_SIZE.observe(len(chunk), stage='bulk')
+        retry = []
+        failures = []
+        for item, result in zip(chunk, response['items']):
+            op_type, op_result = next(iter(result.items()))
+            status = op_result.get('status', 0)
+            if 'error' in op_result:
+                metrics.BULK_ERRORS.inc(reason=op_result['error'].get('type', status))
+            if status in RETRYABLE_STATUSES and attempt < settings.bulk_max_retries:
+                retry.append(item)
+            elif op_type == 'update' and status == 404:
+                # Частичное обновление фильма, которого ещё нет в индексе
+                logger.debug(f"Skipped update of missing document {op_result.get('_id')}")
+            elif 'error' in op_result:
+                failures.append((item, status, op_result['error'].get('reason')))
+            else:
+                indexed += 1
+                metrics.DOCUMENTS.inc(stage='bulk')
+
+        if failures:
+            for item, status, reason in failures:
+                logger.error(f"Document ID: {chunk_ids([item])[0]}, Error: {reason}")
+            if dead_letters is None:
+                raise RuntimeError(f"Elasticsearch rejected {len(failures)} documents")
+            dead_letters.add(failures)
+        if retry:
+            attempt += 1
+            await backoff(attempt)
+        chunk = retry
+    return indexed
+
+
+async def load(
+    es: AsyncElasticsearch,
+    settings: Settings,
+    inp: asyncio.Queue,
+    checkpoint: Checkpoint,
+    dead_letters=None,
+) -> int:
+    """Отправка пачек в Elasticsearch; чекпоинт двигается после подтверждения"""
+    indexed = 0
+    while True:
+        job: Optional[Job] = await inp.get()
+        if job is None:
+            return indexed
+        seq, last_row, actions = job
+        for chunk in chunk_actions(
+            actions, settings.bulk_chunk_size, settings.bulk_max_bytes
+        ):
+            indexed += await send(es, settings, chunk, dead_letters)
+        checkpoint.ack(seq, last_row)
+
+
+async def run_pass(
+    es: AsyncElasticsearch,
+    conn: psycopg.AsyncConnection,
+    settings: Settings,
+    state: State,
+    dead_letters=None,
+    generation=None
+) -> int:
+    """Один проход по изменениям с перекрытием стадий"""
+    rows_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.bulk_queue_size)
+    actions_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.bulk_queue_size)
+    checkpoint = Checkpoint(state, generation)
+    workers = max(settings.bulk_workers, 1)
+
+    async def produce() -> None:
+        await extract(conn, settings, state, rows_queue)
+        await rows_queue.put(None)
+
+    tasks = [
+        asyncio.create_task(produce()),
+        asyncio.create_task(transform(rows_queue, actions_queue, workers)),
+    ] + [
+        asyncio.create_task(
+            load(es, settings, actions_queue, checkpoint, dead_letters)
+        )
+        for _ in range(workers)
+    ]
+    try:
+        # Падение любой стадии прерывает проход, остальные задачи отменяются
+        results = await asyncio.gather(*tasks)
+        return sum(results[2:])
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_entity_pass(settings: Settings, state: State) -> int:
+    """Проход продюсеров персон и жанров; блокирующий, запускается в потоке"""
+    es = get_es_connection(settings)
+    try:
+        with BulkLoader(es, settings) as loader:
+            return run_entity_producers(loader, settings, state)
+    finally:
+        es.close()
+
+
+async def serve(settings: Settings, state: State) -> None:
+    """Основной асинхронный цикл обработки"""
+    es = async_es_client([str(settings.es_host)], settings)
+    dead_letters = None
+    if settings.dead_letter_path:
+        from movies.etl.deadletter import DeadLetterStore
+        dead_letters = DeadLetterStore(settings.dead_letter_path)
+    generation = None
+    if settings.bump_generation:
+        from movies.etl.generation import GenerationCounter
+        generation = GenerationCounter(settings)
+    # Соединение живёт между проходами и пересоздаётся, только если оборвалось
+    conn = None
+    try:
+        while True:
+            state.load()
+            try:
+                if conn is None or conn.closed or conn.broken:
+                    conn = await connect(settings)
+                started = time.monotonic()
+                total_processed = await run_pass(
+                    es, conn, settings, state, dead_letters, generation
+                )
+                total_processed += await asyncio.to_thread(run_entity_pass, settings, state)
+                elapsed = time.monotonic() - started
+                if total_processed and elapsed:
+                    metrics.DOCS_PER_SECOND.set(total_processed / elapsed)
+                logger.info(f"Total processed: {total_processed}")
+                logger.info(f"Next run in {settings.sleep_interval}s...")
+                await asyncio.sleep(settings.sleep_interval)
+            except Exception as e:
+                logger.error(f"Processing error: {e}", exc_info=True)
+                await asyncio.sleep(60)
+    finally:
+        if conn is not None:
+            await conn.close()
+        if dead_letters is not None:
+            dead_letters.close()
+        if generation is not None:
+            generation.close()
+        await es.close()
+
+
+def run(settings: Settings, state: State) -> None:
+    asyncio.run(serve(settings, state))
@@ -0,0 +1,253 @@
+"""Параллельная первичная загрузка, координируемая через таблицу аренд.
+
+Пространство id фильмов режется на диапазоны (строки movies_backfillpartition).
+Любое число процессов на любых узлах забирает свободные диапазоны через
+``FOR UPDATE SKIP LOCKED``, грузит их обычным transform/load и пишет
+прогресс. Аренда продлевается на каждом шаге; если воркер упал, его диапазон
+после истечения аренды подбирает другой и продолжает с last_id.
+"""
+import uuid
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from elasticsearch import Elasticsearch
+
+from movies.management.commands.sync_data_main import (
+    FILM_WORK_LATERAL_SELECT,
+    FILM_WORK_SELECT,
+    NIL_UUID,
+    BulkLoader,
+    Settings,
+    get_pg_connection,
+    pg_connection,
+    transform_data,
+)
+
+logger = logging.getLogger(__name__)
+
+RANGE_WHERE = """
+    WHERE fw.id > %(after)s
+      AND fw.id >= %(lower)s
+      AND (%(upper)s::uuid IS NULL OR fw.id < %(upper)s::uuid)
+"""
+
+RANGE_QUERIES = {
+    'join': FILM_WORK_SELECT + RANGE_WHERE + """
+    GROUP BY fw.id, fw.modified
+    ORDER BY fw.id
+    LIMIT %(limit)s
+""",
+    'lateral': FILM_WORK_LATERAL_SELECT + RANGE_WHERE + """
+    ORDER BY fw.id
+    LIMIT %(limit)s
+""",
+}
+
+PLAN_QUERY = """
+    INSERT INTO movies_backfillpartition (
+        run, lower_id, upper_id, status, owner, processed, attempts, updated_at
+    )
+    VALUES (%s, %s, %s, 'pending', '', 0, 0, now())
+    ON CONFLICT (run, lower_id) DO NOTHING
+"""
+
+CLAIM_QUERY = """
+    UPDATE movies_backfillpartition
+    SET status = 'running',
+        owner = %(owner)s,
+        lease_expires = now() + make_interval(secs => %(lease)s),
+        attempts = attempts + 1,
+        updated_at = now()
+    WHERE id = (
+        SELECT id FROM movies_backfillpartition
+        WHERE run = %(run)s
+          AND (status = 'pending' OR (status = 'running' AND lease_expires < now()))
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, lower_id, upper_id, last_id, processed
+"""
+
+PROGRESS_QUERY = """
+    UPDATE movies_backfillpartition
+    SET last_id = %(last_id)s,
+        processed = %(processed)s,
+        lease_expires = now() + make_interval(secs => %(lease)s),
+        updated_at = now()
+    WHERE id = %(id)s AND owner = %(owner)s AND status = 'running'
+"""
+
+COMPLETE_QUERY = """
+    UPDATE movies_backfillpartition
+    SET status = 'done', lease_expires = NULL, updated_at = now()
+    WHERE id = %(id)s AND owner = %(owner)s AND status = 'running'
+"""
+
+STATUS_QUERY = """
+    SELECT status, count(*), COALESCE(sum(processed), 0)
+    FROM movies_backfillpartition
+    WHERE run = %s
+    GROUP BY status
+"""
+
+
+class LeaseLost(Exception):
+    """Аренда диапазона истекла и перехвачена другим воркером"""
+
+
+def partition_bounds(partitions: int) -> List[Tuple[str, Optional[str]]]:
+    """Равные диапазоны пространства UUID: [lower, upper)"""
+    step = 2 ** 128 // partitions
+    lowers = [str(uuid.UUID(int=i * step)) for i in range(partitions)]
+    return [
+        (lower, lowers[i + 1] if i + 1 < partitions else None)
+        for i, lower in enumerate(lowers)
+    ]
+
+
+def plan(conn, run: str, partitions: int) -> int:
+    """Создание диапазонов запуска, если их ещё нет"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT count(*) FROM movies_backfillpartition WHERE run = %s', (run,)
+        )
+        existing = cursor.fetchone()[0]
+        if existing:
+            return existing
+        cursor.executemany(
+            PLAN_QUERY,
+            [(run, lower, upper) for lower, upper in partition_bounds(partitions)]
+        )
+    return partitions
+
+
+def claim(conn, run: str, owner: str, lease_seconds: int) -> Optional[Dict]:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            CLAIM_QUERY, {'run': run, 'owner': owner, 'lease': lease_seconds}
+        )
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def report_progress(
+    conn,
+    partition: Dict,
+    owner: str,
+    lease_seconds: int
+) -> None:
+    """Запись прогресса с продлением аренды"""
+    with conn.cursor() as cursor:
+        cursor.execute(PROGRESS_QUERY, {
+            'id': partition['id'],
+            'owner': owner,
+            'last_id': partition['last_id'],
+            'processed': partition['processed'],
+            'lease': lease_seconds,
+        })
+        if cursor.rowcount == 0:
+            raise LeaseLost(f"Partition {partition['id']} was taken over")
+
+
+def complete(conn, partition: Dict, owner: str) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(COMPLETE_QUERY, {'id': partition['id'], 'owner': owner})
+        if cursor.rowcount == 0:
+            raise LeaseLost(f"Partition {partition['id']} was taken over")
+
+
+def status(settings: Settings, run: str) -> Dict[str, Tuple[int, int]]:
+    """Число диапазонов и загруженных фильмов по статусам"""
+    with pg_connection(settings) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(STATUS_QUERY, (run,))
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def load_partition(
+    es: Elasticsearch,
+    settings: Settings,
+    lease_conn,
+    data_conn,
+    partition: Dict,
+    owner: str,
+    lease_seconds: int,
+    batch_size: int,
+    progress_every: int = 5
+) -> None:
+    """Загрузка одного диапазона с продолжением с last_id"""
+    query = RANGE_QUERIES[settings.query_strategy]
+    params = {
+        'lower': str(partition['lower_id']),
+        'upper': str(partition['upper_id']) if partition['upper_id'] else None,
+        'limit': batch_size,
+    }
+    partition['last_id'] = str(partition['last_id'] or NIL_UUID)
+    batches = 0
+    with BulkLoader(es, settings) as loader:
+        while True:
+            with data_conn.cursor() as cursor:
+                cursor.execute(query, {**params, 'after': partition['last_id']})
+                rows = cursor.fetchall()
+            # Не держим снимок между пачками
+            data_conn.commit()
+            if not rows:
+                break
+
+            loader.submit(transform_data(rows))
+            batches += 1
+            partition['last_id'] = str(rows[-1]['id'])
+            partition['processed'] += len(rows)
+            if batches % progress_every == 0:
+                # Прогресс пишется только после подтверждения от ES
+                loader.flush()
+                report_progress(lease_conn, partition, owner, lease_seconds)
+
+        loader.flush()
+    report_progress(lease_conn, partition, owner, lease_seconds)
+    complete(lease_conn, partition, owner)
+
+
+def work(
+    es: Elasticsearch,
+    settings: Settings,
+    run: str,
+    owner: str,
+    partitions: int = 64,
+    lease_seconds: int = 300,
+    batch_size: int = 1000
+) -> int:
+    """Цикл воркера: забирать и грузить диапазоны, пока они есть"""
+    lease_conn = get_pg_connection(settings)
+    lease_conn.autocommit = True
+    data_conn = get_pg_connection(settings)
+    completed = 0
+    try:
+        plan(lease_conn, run, partitions)
+        while True:
+            partition = claim(lease_conn, run, owner, lease_seconds)
+            if partition is None:
+                break
+            logger.info(
+                f"{owner}: claimed partition {partition['id']} "
+                f"[{partition['lower_id']}, {partition['upper_id']}) "
+                f"from {partition['last_id'] or 'start'}"
+            )
+            try:
+                load_partition(
+                    es, settings, lease_conn, data_conn, partition,
+                    owner, lease_seconds, batch_size
+                )
+            except LeaseLost as e:
+                logger.warning(f"{owner}: {e}")
+                continue
+            completed += 1
+            logger.info(
+                f"{owner}: partition {partition['id']} done, "
+                f"{partition['processed']} film works"
+            )
+    finally:
+        lease_conn.close()
+        data_conn.close()
+    return completed
@@ -0,0 +1,164 @@
+"""Замеры стадий ETL: извлечение, трансформация и загрузка по отдельности.
+
+Каждая стадия возвращает словарь с числом документов, временем и
+пропускной способностью; run() собирает их в один JSON-отчёт вместе
+с параметрами запуска, чтобы прогоны можно было сравнивать между собой.
+"""
+import sys
+import time
+import platform
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from elasticsearch import Elasticsearch
+
+from movies.etl.adaptive import rss_bytes
+from movies.etl.resources import es_client
+from movies.etl.bulk_standin import BulkStandin
+from movies.management.commands.sync_data_main import (
+    BulkLoader,
+    Settings,
+    State,
+    fetch_data_from_pg,
+    load_to_es,
+    transform_data,
+)
+
+
+# Отдельный индекс: замер на настоящем кластере не засоряет movies
+BENCH_INDEX = 'movies_bench'
+
+
+def measure(docs: int, seconds: float, **extra) -> Dict:
+    return {
+        'docs': docs,
+        'seconds': round(seconds, 4),
+        'docs_per_sec': round(docs / seconds, 1) if seconds else None,
+        **extra,
+    }
+
+
+def bench_fetch(settings: Settings, limit: int, sample_size: int) -> Tuple[Dict, List[Dict]]:
+    """Чтение до limit фильмов с начала; первые sample_size строк идут дальше по стадиям"""
+    sample = []
+    total = batches = 0
+    peak = rss_bytes()
+    started = time.perf_counter()
+    # Позиция только в памяти: замер не трогает боевой чекпоинт
+    for batch in fetch_data_from_pg(State(None), settings, settings.batch_size):
+        batches += 1
+        total += len(batch)
+        if len(sample) < sample_size:
+            sample.extend(dict(row) for row in batch[:sample_size - len(sample)])
+        peak = max(peak, rss_bytes())
+        if total >= limit:
+            break
+    seconds = time.perf_counter() - started
+    return measure(
+        total, seconds,
+        batches=batches,
+        extract_mode=settings.extract_mode,
+        query_strategy=settings.query_strategy,
+        peak_rss_mb=round(peak / 2 ** 20, 1),
+    ), sample
+
+
+def bench_transform(rows: List[Dict], repeat: int = 5) -> Dict:
+    """Трансформация выборки в памяти; берётся лучший из repeat проходов"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in transform_data(rows):
+            pass
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return measure(len(rows), best or 0.0, repeat=repeat)
+
+
+def repeated_actions(rows: List[Dict], total: int) -> Iterator[Dict]:
+    """Поток из total действий по кругу выборки с уникальными _id"""
+    produced = 0
+    round_no = 0
+    while produced < total:
+        for action in islice(transform_data(rows, index=BENCH_INDEX), total - produced):
+            action['_id'] = f"{action['_id']}-{round_no}"
+            yield action
+            produced += 1
+        round_no += 1
+
+
+def bench_bulk_loader(es: Elasticsearch, settings: Settings, rows: List[Dict], total: int) -> Dict:
+    """Загрузка через BulkLoader с его воркерами и очередью"""
+    # Отказы заглушки — часть замера: без dead-letter хранилища и сброса кэша API
+    settings = settings.copy(update={'dead_letter_path': None, 'bump_generation': False})
+    started = time.perf_counter()
+    with BulkLoader(es, settings) as loader:
+        loader.submit(repeated_actions(rows, total))
+    seconds = time.perf_counter() - started
+    return measure(
+        total, seconds,
+        workers=settings.bulk_workers,
+        chunk_size=settings.bulk_chunk_size,
+        retries=sum(stats.retries for stats in loader.stats),
+        bytes=sum(stats.bytes for stats in loader.stats),
+    )
+
+
+def bench_load_to_es(es: Elasticsearch, rows: List[Dict], total: int) -> Dict:
+    """Загрузка однопоточным load_to_es через helpers.bulk"""
+    started = time.perf_counter()
+    load_to_es(es, repeated_actions(rows, total))
+    return measure(total, time.perf_counter() - started)
+
+
+def run(
+    settings: Settings,
+    stages: List[str],
+    limit: int = 100_000,
+    sample_size: int = 10_000,
+    load_docs: int = 50_000,
+    es_url: Optional[str] = None,
+    reject_rate: float = 0.0
+) -> Dict:
+    """Прогон выбранных стадий; без es_url загрузка идёт в локальную заглушку"""
+    report = {
+        'started': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'params': {
+            'limit': limit,
+            'sample_size': sample_size,
+            'load_docs': load_docs,
+            'batch_size': settings.batch_size,
+            'target': es_url or 'standin',
+            'reject_rate': reject_rate,
+        },
+        'stages': {},
+    }
+
+    # Выборка для transform и load всегда берётся из Postgres
+    fetch, sample = bench_fetch(settings, limit if 'fetch' in stages else sample_size, sample_size)
+    if 'fetch' in stages:
+        report['stages']['fetch'] = fetch
+    if not sample:
+        raise ValueError('film_work is empty; generate a catalogue first')
+
+    if 'transform' in stages:
+        report['stages']['transform'] = bench_transform(sample)
+
+    if 'load' in stages:
+        standin = None
+        if es_url is None:
+            standin = BulkStandin(reject_rate=reject_rate).start()
+            es_url = standin.url
+        es = es_client([es_url], settings)
+        try:
+            report['stages']['bulk_loader'] = bench_bulk_loader(es, settings, sample, load_docs)
+            report['stages']['load_to_es'] = bench_load_to_es(es, sample, load_docs)
+        finally:
+            es.close()
+            if standin is not None:
+                report['standin'] = standin.stats.as_dict()
+                standin.close()
+    return report
@@ -0,0 +1,144 @@
+"""Локальная заглушка Elasticsearch для замеров пути загрузки без кластера.
+
+Разбирает тело _bulk и отвечает на каждое действие успехом, поэтому
+замер показывает стоимость сериализации, HTTP и разбора ответа на нашей
+стороне. reject_rate задаёт долю документов, отклоняемых с 429, чтобы
+проверить повторы. Все прочие запросы получают {"acknowledged": true}.
+"""
+import gzip
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+INFO = {
+    'name': 'bulk-standin',
+    'cluster_name': 'bench',
+    'version': {'number': '7.17.7', 'build_flavor': 'default'},
+    'tagline': 'You Know, for Search',
+}
+
+
+class StandinStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.docs = 0
+        self.rejected = 0
+        self.bytes = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'docs': self.docs,
+                'rejected': self.rejected,
+                'bytes': self.bytes,
+            }
+
+
+def bulk_items(body: bytes, reject_rate: float, rng: random.Random) -> List[Dict]:
+    """Ответы на действия NDJSON-тела; строка с телом документа пропускается"""
+    items = []
+    lines = iter(body.splitlines())
+    for line in lines:
+        if not line.strip():
+            continue
+        op_type, meta = next(iter(json.loads(line).items()))
+        if op_type != 'delete':
+            next(lines, None)
+        if rng.random() < reject_rate:
+            result = {
+                'status': 429,
+                'error': {'type': 'es_rejected_execution_exception', 'reason': 'stand-in rejection'},
+            }
+        else:
+            result = {'status': 201 if op_type in ('index', 'create') else 200, 'result': 'created'}
+        items.append({op_type: {'_index': meta.get('_index'), '_id': meta.get('_id'), **result}})
+    return items
+
+
+class BulkStandin:
+    """HTTP-сервер в фоновом потоке; url передаётся клиенту Elasticsearch"""
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, reject_rate: float = 0.0, seed: int = 0):
+        self.stats = StandinStats()
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'BulkStandin':
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name='bulk-standin', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'BulkStandin':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload: Dict) -> None:
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                # Клиент 7.14+ проверяет, что отвечает именно Elasticsearch
+                self.send_header('X-Elastic-Product', 'Elasticsearch')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                return body
+
+            def do_GET(self):
+                self._body()
+                self._reply(INFO if self.path.split('?')[0] == '/' else {'acknowledged': True})
+
+            do_HEAD = do_GET
+
+            def do_POST(self):
+                body = self._body()
+                if not self.path.split('?')[0].endswith('/_bulk'):
+                    self._reply({'acknowledged': True})
+                    return
+                with standin.stats.lock:
+                    items = bulk_items(body, standin.reject_rate, standin.rng)
+                    rejected = sum(1 for item in items if next(iter(item.values()))['status'] == 429)
+                    standin.stats.requests += 1
+                    standin.stats.bytes += len(body)
+                    standin.stats.docs += len(items) - rejected
+                    standin.stats.rejected += rejected
+                self._reply({'took': 1, 'errors': bool(rejected), 'items': items})
+
+            do_PUT = do_POST
+            do_DELETE = do_GET
+
+        return Handler
@@ -0,0 +1,38 @@
+"""Хэш содержимого фильма — поле content_hash документа movies.
+
+Считается в Postgres по исходным таблицам тем же выражением, которым его
+пишут в документ все запросы ETL, поэтому reconcile сравнивает содержимое
+индекса с базой по одному keyword-полю, не собирая документы заново.
+"""
+
+# Скалярный подзапрос по id фильма: подставляется в SELECT любого запроса,
+# где есть выражение с id (fw.id, m.id, movies_movie.id)
+CONTENT_HASH_SQL = """(
+    SELECT md5(concat_ws('|',
+        coalesce(ch_fw.title, ''),
+        coalesce(ch_fw.description, ''),
+        coalesce(ch_fw.rating::text, ''),
+        coalesce((
+            SELECT string_agg(ch_g.id::text || ':' || coalesce(ch_g.name, ''), ',' ORDER BY ch_g.id)
+            FROM genre_film_work ch_gfw
+            JOIN genre ch_g ON ch_g.id = ch_gfw.genre_id
+            WHERE ch_gfw.film_work_id = ch_fw.id
+        ), ''),
+        coalesce((
+            SELECT string_agg(
+                ch_pfw.role || ':' || ch_p.id::text || ':' || coalesce(ch_p.full_name, ''),
+                ',' ORDER BY ch_pfw.role, ch_p.id
+            )
+            FROM person_film_work ch_pfw
+            JOIN person ch_p ON ch_p.id = ch_pfw.person_id
+            WHERE ch_pfw.film_work_id = ch_fw.id
+        ), '')
+    ))
+    FROM film_work ch_fw
+    WHERE ch_fw.id = {film_id}
+)"""
+
+
+def content_hash_sql(film_id: str) -> str:
+    """SQL-выражение хэша содержимого для фильма с id film_id"""
+    return CONTENT_HASH_SQL.format(film_id=film_id)
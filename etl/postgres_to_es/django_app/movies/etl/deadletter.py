@@ -0,0 +1,104 @@
+"""Хранилище документов, которые Elasticsearch так и не принял.
+
+Сюда попадают постоянные ошибки (mapping, парсинг) и документы, исчерпавшие
+повторы по 429/503. Пачка с такими документами считается обработанной,
+и чекпоинт идёт дальше; вернуть их в индекс можно командой replay_dead_letters.
+"""
+import json
+import time
+import sqlite3
+import threading
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS dead_letters (
+        doc_index TEXT NOT NULL,
+        id TEXT NOT NULL,
+        op_type TEXT NOT NULL,
+        item BLOB NOT NULL,
+        status INTEGER NOT NULL,
+        reason TEXT,
+        attempts INTEGER NOT NULL DEFAULT 1,
+        failed REAL NOT NULL,
+        PRIMARY KEY (doc_index, id)
+    )
+"""
+
+UPSERT = """
+    INSERT INTO dead_letters (doc_index, id, op_type, item, status, reason, failed)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(doc_index, id) DO UPDATE SET
+        op_type = excluded.op_type,
+        item = excluded.item,
+        status = excluded.status,
+        reason = excluded.reason,
+        attempts = dead_letters.attempts + 1,
+        failed = excluded.failed
+"""
+
+
+class DeadLetter(NamedTuple):
+    index: str
+    id: str
+    op_type: str
+    item: bytes
+    status: int
+    reason: str
+    attempts: int
+    failed: float
+
+
+def item_meta(item: bytes) -> Tuple[str, dict]:
+    """Тип операции и служебные поля из первой строки NDJSON-действия"""
+    meta = json.loads(item[:item.index(b'\n')])
+    return next(iter(meta.items()))
+
+
+class DeadLetterStore:
+    """Dead-letter очередь на SQLite, общая для потоков BulkLoader"""
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(CREATE_TABLE)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def add(self, failures: Iterable[Tuple[bytes, int, str]]) -> int:
+        """Сохранение пар (NDJSON-действие, статус, причина)"""
+        now = time.time()
+        rows = []
+        for item, status, reason in failures:
+            op_type, meta = item_meta(item)
+            rows.append((meta['_index'], meta['_id'], op_type, item, status, reason, now))
+        if rows:
+            with self._lock:
+                self.conn.executemany(UPSERT, rows)
+                self.conn.commit()
+        return len(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT count(*) FROM dead_letters').fetchone()[0]
+
+    def entries(self, limit: int = 1000, before: Optional[float] = None) -> List[DeadLetter]:
+        """Самые старые записи, упавшие не позже before"""
+        before = time.time() if before is None else before
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT doc_index, id, op_type, item, status, reason, attempts, failed '
+                'FROM dead_letters WHERE failed <= ? ORDER BY failed LIMIT ?',
+                (before, limit)
+            ).fetchall()
+        return [DeadLetter(*row) for row in rows]
+
+    def remove(self, entries: Iterable[DeadLetter]) -> None:
+        """Удаление записей, если они не упали повторно после выборки"""
+        with self._lock:
+            self.conn.executemany(
+                'DELETE FROM dead_letters WHERE doc_index = ? AND id = ? AND failed = ?',
+                [(entry.index, entry.id, entry.failed) for entry in entries]
+            )
+            self.conn.commit()
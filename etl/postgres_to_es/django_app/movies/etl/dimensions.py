@@ -0,0 +1,209 @@
+"""Раздельное извлечение: фильмы и связи из Postgres, имена — из кэша.
+
+Вместо join с person и genre на каждой пачке запрашиваются только базовые
+строки film_work и кортежи связей. Имена персон и жанров берутся из LRU-кэша,
+который добирает промахи одним запросом ``id = ANY(%s)``. Записи кэша
+сбрасываются, когда у персоны или жанра сдвигается modified.
+"""
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from psycopg2 import sql
+
+from movies.etl.content_hash import content_hash_sql
+from movies.management.commands.sync_data_main import (
+    Settings,
+    State,
+    pg_connection,
+)
+
+logger = logging.getLogger(__name__)
+
+FILM_WORK_BASE_QUERY = """
+    SELECT fw.id, fw.title, fw.description, fw.rating AS imdb_rating, fw.modified,
+        """ + content_hash_sql('fw.id') + """ AS content_hash
+    FROM film_work fw
+    WHERE (fw.modified, fw.id) > (%s, %s)
+    ORDER BY fw.modified, fw.id
+    LIMIT %s
+"""
+
+PERSON_LINKS_QUERY = """
+    SELECT film_work_id, person_id, role
+    FROM person_film_work
+    WHERE film_work_id = ANY(%s::uuid[])
+"""
+
+GENRE_LINKS_QUERY = """
+    SELECT film_work_id, genre_id
+    FROM genre_film_work
+    WHERE film_work_id = ANY(%s::uuid[])
+"""
+
+ROLES = ('director', 'actor', 'writer')
+
+_MISSING = object()
+
+
+class DimensionCache:
+    """LRU-кэш имён одного справочника (person или genre)"""
+    def __init__(self, table: str, name_column: str, capacity: int):
+        self.table = table
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.watermark = None
+        self._names: 'OrderedDict[str, Optional[str]]' = OrderedDict()
+        self._names_query = sql.SQL(
+            'SELECT id, {} FROM {} WHERE id = ANY(%s::uuid[])'
+        ).format(sql.Identifier(name_column), sql.Identifier(table))
+        self._changed_query = sql.SQL(
+            'SELECT id, modified FROM {} WHERE modified > %s'
+        ).format(sql.Identifier(table))
+        self._latest_query = sql.SQL(
+            'SELECT max(modified) FROM {}'
+        ).format(sql.Identifier(table))
+
+    def get_many(self, cursor, ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Имена по id; промахи добираются одним запросом"""
+        found: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for entity_id in set(ids):
+            name = self._names.get(entity_id, _MISSING)
+            if name is _MISSING:
+                missing.append(entity_id)
+            else:
+                self._names.move_to_end(entity_id)
+                found[entity_id] = name
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            cursor.execute(self._names_query, (missing,))
+            for entity_id, name in cursor.fetchall():
+                found[str(entity_id)] = name
+                self._put(str(entity_id), name)
+        return found
+
+    def _put(self, entity_id: str, name: Optional[str]) -> None:
+        self._names[entity_id] = name
+        self._names.move_to_end(entity_id)
+        while len(self._names) > self.capacity:
+            self._names.popitem(last=False)
+
+    def invalidate(self, ids: Iterable[str]) -> None:
+        for entity_id in ids:
+            self._names.pop(entity_id, None)
+
+    def refresh(self, cursor) -> None:
+        """Сброс записей, чей modified сдвинулся после прошлой проверки"""
+        if self.watermark is None:
+            cursor.execute(self._latest_query)
+            self.watermark = cursor.fetchone()[0]
+            return
+        cursor.execute(self._changed_query, (self.watermark,))
+        changed = cursor.fetchall()
+        if changed:
+            self.invalidate(str(row[0]) for row in changed)
+            self.watermark = max(row[1] for row in changed)
+            logger.info(f"Invalidated {len(changed)} cached {self.table} names")
+
+
+# Кэши живут всё время работы процесса, между проходами main()
+_caches: Dict[str, DimensionCache] = {}
+
+
+def get_caches(settings: Settings) -> Dict[str, DimensionCache]:
+    if not _caches:
+        _caches['person'] = DimensionCache(
+            'person', 'full_name', settings.dimension_cache_size
+        )
+        _caches['genre'] = DimensionCache(
+            'genre', 'name', settings.dimension_cache_size
+        )
+    return _caches
+
+
+def assemble_rows(
+    base_rows: List[Dict],
+    person_links: List[tuple],
+    genre_links: List[tuple],
+    person_names: Dict[str, Optional[str]],
+    genre_names: Dict[str, Optional[str]],
+) -> List[Dict]:
+    """Сборка строк той же формы, что отдаёт агрегирующий запрос"""
+    rows = {}
+    for base in base_rows:
+        row = dict(base)
+        row['genres'] = []
+        for role in ROLES:
+            row[f'{role}s'] = []
+        rows[str(base['id'])] = row
+
+    for film_work_id, genre_id in genre_links:
+        genre_id = str(genre_id)
+        rows[str(film_work_id)]['genres'].append(
+            {'id': genre_id, 'name': genre_names.get(genre_id)}
+        )
+
+    for film_work_id, person_id, role in person_links:
+        if role not in ROLES:
+            continue
+        person_id = str(person_id)
+        rows[str(film_work_id)][f'{role}s'].append(
+            {'id': person_id, 'name': person_names.get(person_id)}
+        )
+
+    for row in rows.values():
+        for role in ROLES:
+            names = {person['name'] for person in row[f'{role}s'] if person['name']}
+            row[f'{role}s_names'] = sorted(names)
+    return [rows[str(base['id'])] for base in base_rows]
+
+
+def fetch_split_from_pg(
+    state: State,
+    settings: Settings,
+    batch_size: int = 100
+) -> Iterator[List[Dict]]:
+    """Извлечение фильмов без join со справочниками"""
+    caches = get_caches(settings)
+    persons, genres = caches['person'], caches['genre']
+
+    with pg_connection(settings) as conn:
+        cursor = conn.cursor()
+        persons.refresh(cursor)
+        genres.refresh(cursor)
+
+        while True:
+            cursor.execute(
+                FILM_WORK_BASE_QUERY,
+                (state.last_modified, state.last_id, batch_size)
+            )
+            base_rows = [dict(row) for row in cursor.fetchall()]
+            if not base_rows:
+                break
+
+            ids = [str(row['id']) for row in base_rows]
+            cursor.execute(PERSON_LINKS_QUERY, (ids,))
+            person_links = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute(GENRE_LINKS_QUERY, (ids,))
+            genre_links = [tuple(row) for row in cursor.fetchall()]
+
+            person_names = persons.get_many(
+                cursor, (str(link[1]) for link in person_links)
+            )
+            genre_names = genres.get_many(
+                cursor, (str(link[1]) for link in genre_links)
+            )
+
+            state.advance(base_rows[-1])
+            yield assemble_rows(
+                base_rows, person_links, genre_links, person_names, genre_names
+            )
+
+    logger.info(
+        f"Dimension cache: person {persons.hits} hits / {persons.misses} misses, "
+        f"genre {genres.hits} hits / {genres.misses} misses"
+    )
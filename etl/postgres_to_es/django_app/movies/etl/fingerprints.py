@@ -0,0 +1,169 @@
+"""Локальный кэш отпечатков документов для пропуска неизменённых фильмов.
+
+Хранит для каждого id фильма хэш канонического JSON его ``_source``.
+Если после трансформации хэш не изменился, документ не отправляется в ES.
+Новый хэш записывается только после того, как ES принял документ (record),
+иначе упавший между фильтром и bulk процесс навсегда оставил бы индекс
+устаревшим.
+"""
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS fingerprints (
+        id TEXT PRIMARY KEY,
+        hash BLOB NOT NULL,
+        seen REAL NOT NULL
+    )
+"""
+
+UPSERT = """
+    INSERT INTO fingerprints (id, hash, seen) VALUES (?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET hash = excluded.hash, seen = excluded.seen
+"""
+
+
+def fingerprint(source: Dict) -> bytes:
+    """Хэш канонического представления документа"""
+    payload = json.dumps(
+        source, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+
+class FingerprintStore:
+    """Хранилище отпечатков на SQLite с вытеснением давно не виденных id"""
+    def __init__(self, path: str, max_entries: int = 5_000_000):
+        self.max_entries = max_entries
+        self.skipped = 0
+        self._lock = threading.Lock()
+        # record() и forget() вызываются из потоков BulkLoader
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(CREATE_TABLE)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS fingerprints_seen ON fingerprints (seen)')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT count(*) FROM fingerprints').fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def filter(
+        self,
+        actions: Iterable[Dict],
+        pending: Optional[Dict[str, bytes]] = None,
+        group_size: int = 500
+    ) -> Iterator[Dict]:
+        """Пропуск index-действий, чей _source не изменился с прошлой отправки.
+
+        Хэши пропущенных дальше документов попадают в pending и сохраняются
+        вызовом record() после подтверждения от ES.
+        """
+        actions = iter(actions)
+        while True:
+            group = list(islice(actions, group_size))
+            if not group:
+                return
+            yield from self._filter_group(group, pending)
+
+    def _filter_group(self, group: List[Dict], pending: Optional[Dict[str, bytes]]) -> List[Dict]:
+        hashes = {
+            action['_id']: fingerprint(action['_source'])
+            for action in group if action.get('_op_type', 'index') == 'index'
+        }
+        # update и delete делают сохранённый отпечаток недействительным
+        stale = [
+            action['_id'] for action in group
+            if action.get('_op_type', 'index') != 'index'
+        ]
+        with self._lock:
+            known = self._lookup(list(hashes))
+            unchanged = {doc_id for doc_id, value in hashes.items() if known.get(doc_id) == value}
+            # Свежесть для вытеснения: неизменённый документ всё ещё существует
+            self.conn.executemany(
+                'UPDATE fingerprints SET seen = ? WHERE id = ?',
+                [(time.time(), doc_id) for doc_id in unchanged]
+            )
+            self._delete(stale)
+            self.conn.commit()
+
+        self.skipped += len(unchanged)
+        if pending is not None:
+            pending.update(
+                (doc_id, value) for doc_id, value in hashes.items() if doc_id not in unchanged
+            )
+        return [action for action in group if action['_id'] not in unchanged or
+                action.get('_op_type', 'index') != 'index']
+
+    def _lookup(self, ids: List[str]) -> Dict[str, bytes]:
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        return dict(self.conn.execute(
+            f'SELECT id, hash FROM fingerprints WHERE id IN ({placeholders})', ids
+        ))
+
+    def _delete(self, ids: List[str]) -> None:
+        if ids:
+            deleted = self.conn.executemany(
+                'DELETE FROM fingerprints WHERE id = ?', [(doc_id,) for doc_id in ids]
+            ).rowcount
+            self.size -= max(deleted, 0)
+
+    def _evict(self) -> None:
+        """Удаление самых давно виденных записей сверх max_entries"""
+        if self.size <= self.max_entries:
+            return
+        # Вытесняем с запасом, чтобы не делать это на каждой пачке
+        excess = self.size - int(self.max_entries * 0.9)
+        deleted = self.conn.execute(
+            'DELETE FROM fingerprints WHERE id IN '
+            '(SELECT id FROM fingerprints ORDER BY seen LIMIT ?)', (excess,)
+        ).rowcount
+        self.size -= deleted
+        self.conn.commit()
+
+    def record(self, hashes: Dict[str, bytes]) -> None:
+        """Сохранение отпечатков документов, принятых ES"""
+        if not hashes:
+            return
+        with self._lock:
+            known = self._lookup(list(hashes))
+            now = time.time()
+            self.conn.executemany(
+                UPSERT, [(doc_id, value, now) for doc_id, value in hashes.items()]
+            )
+            self.size += len(hashes) - len(known)
+            self.conn.commit()
+            self._evict()
+
+    def forget(self, ids: Iterable[str]) -> None:
+        """Сброс отпечатков документов, которые ES не принял"""
+        with self._lock:
+            self._delete(list(ids))
+            self.conn.commit()
+
+    def replace_all(self, entries: Iterable[Tuple[str, bytes]], group_size: int = 1000) -> int:
+        """Полная перезапись хранилища, например по содержимому индекса"""
+        total = 0
+        entries = iter(entries)
+        with self._lock:
+            self.conn.execute('DELETE FROM fingerprints')
+            now = time.time()
+            while True:
+                group = list(islice(entries, group_size))
+                if not group:
+                    break
+                self.conn.executemany(
+                    UPSERT, [(doc_id, value, now) for doc_id, value in group]
+                )
+                total += len(group)
+            self.conn.commit()
+            self.size = total
+        return total
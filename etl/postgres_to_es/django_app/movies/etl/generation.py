@@ -0,0 +1,90 @@
+"""Счётчик поколений индекса в таблице movies_indexgeneration.
+
+ETL увеличивает его после подтверждённых пачек, а API поиска сбрасывает
+кэш ответов, увидев новое значение. Увеличения чаще min_interval
+схлопываются в одно хвостовое, которое уходит по таймеру, как только
+интервал истёк, или раньше при flush().
+"""
+import time
+import logging
+import threading
+
+import psycopg2
+
+from movies.management.commands.sync_data_main import pg_connection
+
+logger = logging.getLogger(__name__)
+
+BUMP_QUERY = """
+    INSERT INTO movies_indexgeneration (name, value, updated_at)
+    VALUES (%s, 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET value = movies_indexgeneration.value + 1, updated_at = now()
+"""
+
+
+class GenerationCounter:
+    """Увеличение счётчика из потоков BulkLoader через пул соединений"""
+    def __init__(self, settings, name: str = 'movies', min_interval: float = 1.0):
+        self.settings = settings
+        self.name = name
+        self.min_interval = min_interval
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._last_bump = 0.0
+        self._pending = False
+        self._timer = None
+
+    def bump(self) -> None:
+        with self._lock:
+            self._pending = True
+            if not self.enabled:
+                return
+            wait = self.min_interval - (time.monotonic() - self._last_bump)
+            if wait <= 0:
+                self._bump()
+            elif self._timer is None:
+                # Загрузчики полос живут весь запуск: последняя правка всплеска
+                # не должна ждать следующей пачки или close()
+                self._timer = threading.Timer(wait, self._trailing)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Досылка схлопнутого увеличения"""
+        with self._lock:
+            self._cancel_timer()
+            if self._pending and self.enabled:
+                self._bump()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _trailing(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._pending and self.enabled:
+                self._bump()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _bump(self) -> None:
+        try:
+            # Пул фиксирует транзакцию на выходе из блока и откатывает при ошибке
+            with pg_connection(self.settings) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(BUMP_QUERY, (self.name,))
+        except psycopg2.errors.UndefinedTable:
+            # Миграция 0005 не применена: кэшу API нечего инвалидировать
+            self.enabled = False
+            logger.warning("movies_indexgeneration is missing, cache invalidation disabled")
+            return
+        except psycopg2.Error as e:
+            # Не роняем воркер загрузки: увеличение останется отложенным
+            logger.warning(f"Failed to bump index generation: {e}")
+            return
+        self._last_bump = time.monotonic()
+        self._pending = False
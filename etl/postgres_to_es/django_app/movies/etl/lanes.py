@@ -0,0 +1,268 @@
+"""Планировщик с полосами приоритета: realtime и bulk.
+
+Граница floor делит поток изменений по modified: всё, что не старше floor,
+обрабатывает полоса realtime со своими bulk-воркерами, остальное — полоса
+bulk (догоняющая загрузка по основному чекпоинту). Если realtime отстаёт
+больше, чем на REALTIME_BUDGET_SECONDS, floor сдвигается вперёд, а
+пропущенный хвост переходит к полосе bulk. Так правка редактора не ждёт
+за сотнями тысяч строк массового обновления.
+"""
+import time
+import functools
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, List, Optional
+
+from elasticsearch import Elasticsearch
+
+from movies.etl.projections import open_projections
+from movies.management.commands.sync_data_main import (
+    FILM_WORK_LATERAL_SELECT,
+    FILM_WORK_SELECT,
+    NIL_UUID,
+    BulkLoader,
+    Settings,
+    State,
+    get_pg_connection,
+    pg_connection,
+    run_entity_producers,
+    transform_data,
+)
+
+logger = logging.getLogger(__name__)
+
+BOUNDED_WHERE = """
+    WHERE (fw.modified, fw.id) > (%s, %s)
+      AND fw.modified < %s
+"""
+
+LANE_QUERIES = {
+    'join': FILM_WORK_SELECT + BOUNDED_WHERE + """
+    GROUP BY fw.id, fw.modified
+    ORDER BY fw.modified, fw.id
+    LIMIT %s
+""",
+    'lateral': FILM_WORK_LATERAL_SELECT + BOUNDED_WHERE + """
+    ORDER BY fw.modified, fw.id
+    LIMIT %s
+""",
+}
+
+# Верхняя граница для полосы realtime
+UNBOUNDED = 'infinity'
+
+
+class Floor:
+    """Граница между полосами, общая для двух потоков"""
+    def __init__(self, value: datetime):
+        self._value = value
+        self._lock = threading.Lock()
+
+    def get(self) -> datetime:
+        with self._lock:
+            return self._value
+
+    def raise_to(self, value: datetime) -> None:
+        with self._lock:
+            self._value = max(self._value, value)
+
+
+class FreshnessTracker:
+    """Задержка от modified до подтверждения ES по последним документам"""
+    def __init__(self, window: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def unsupported_settings(settings: Settings) -> List[str]:
+    """Настройки однопоточного движка, которые полосы не поддерживают.
+
+    Полосы читают фильмы собственными запросами с границей floor, поэтому
+    режимы извлечения split/raw/document и подстройка размера пачки к ним
+    не применяются. PERSON_UPDATE_MODE полоса bulk учитывает через
+    run_entity_producers.
+    """
+    problems = []
+    if settings.extract_mode not in ('batch', 'stream'):
+        problems.append(f'EXTRACT_MODE={settings.extract_mode}')
+    if settings.adaptive_batching:
+        problems.append('ADAPTIVE_BATCHING')
+    if settings.change_capture != 'poll':
+        problems.append(f'CHANGE_CAPTURE={settings.change_capture}')
+    return problems
+
+
+def db_now(cursor) -> datetime:
+    cursor.execute('SELECT now()')
+    return cursor.fetchone()[0]
+
+
+def fetch_lane(cursor, settings: Settings, state: State, ceiling, limit: int) -> List:
+    cursor.execute(
+        LANE_QUERIES[settings.query_strategy],
+        (state.last_modified, state.last_id, ceiling, limit)
+    )
+    return cursor.fetchall()
+
+
+def realtime_loop(
+    es: Elasticsearch,
+    settings: Settings,
+    state: State,
+    floor: Floor,
+    stop: threading.Event,
+    fingerprints=None
+) -> None:
+    """Полоса свежих правок: маленькие пачки, подтверждение на каждом шаге"""
+    budget = timedelta(seconds=settings.realtime_budget_seconds)
+    lane_settings = settings.copy(update={
+        'bulk_workers': settings.realtime_workers, 'bulk_queue_size': 2,
+    })
+    freshness = FreshnessTracker()
+    ticks = 0
+    backlogged = False
+    conn = get_pg_connection(settings)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        with BulkLoader(es, lane_settings, fingerprints) as loader, \
+                open_projections(es, lane_settings) as projections:
+            while not stop.is_set():
+                now = db_now(cursor)
+                # Старый чекпоинт без очереди — просто простой, а не отставание
+                if backlogged and state.last_modified < now - budget:
+                    # Отставание сверх бюджета: хвост уходит в полосу bulk
+                    floor.raise_to(now - budget / 2)
+                    state.last_modified, state.last_id = floor.get(), NIL_UUID
+                    state.save()
+                    logger.warning(f"Realtime lane over budget, floor moved to {floor.get()}")
+
+                rows = fetch_lane(
+                    cursor, settings, state, UNBOUNDED, settings.realtime_batch_size
+                )
+                if rows:
+                    loader.submit(transform_data(rows))
+                    projections.submit(rows)
+                    loader.flush()
+                    projections.flush()
+                    state.advance(rows[-1])
+                    acked = db_now(cursor)
+                    for row in rows:
+                        freshness.add((acked - row['modified']).total_seconds())
+
+                ticks += 1
+                if ticks % 60 == 0 and freshness.samples:
+                    logger.info(
+                        f"Realtime freshness p50={freshness.percentile(0.5):.1f}s "
+                        f"p99={freshness.percentile(0.99):.1f}s"
+                    )
+                backlogged = len(rows) == settings.realtime_batch_size
+                if not backlogged:
+                    stop.wait(settings.realtime_interval)
+    finally:
+        conn.close()
+
+
+def bulk_loop(
+    es: Elasticsearch,
+    settings: Settings,
+    state: State,
+    floor: Floor,
+    stop: threading.Event,
+    fingerprints=None
+) -> None:
+    """Полоса догоняющей загрузки всего, что старше floor"""
+    lane_settings = settings.copy(update={
+        'bulk_workers': max(settings.bulk_workers - settings.realtime_workers, 1),
+    })
+    batch_size = settings.batch_size
+    conn = get_pg_connection(settings)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        position = state.cursor()
+        with BulkLoader(es, lane_settings, fingerprints) as loader, \
+                open_projections(es, lane_settings) as projections:
+            while not stop.is_set():
+                rows = fetch_lane(cursor, settings, position, floor.get(), batch_size)
+                if rows:
+                    loader.submit(transform_data(rows))
+                    projections.submit(rows)
+                    position.advance(rows[-1])
+                    # Чекпоинт полосы сдвигается только после ответа ES
+                    projections.after(loader, functools.partial(state.advance, rows[-1]))
+                    continue
+
+                run_entity_producers(loader, settings, state, projections)
+                stop.wait(settings.sleep_interval)
+    finally:
+        conn.close()
+
+
+def run_lane(target, name: str, stop: threading.Event, *args) -> None:
+    """Перезапуск полосы после ошибок, пока не остановлен планировщик"""
+    while not stop.is_set():
+        try:
+            target(*args)
+        except Exception as e:
+            logger.error(f"{name} lane error: {e}", exc_info=True)
+            stop.wait(60)
+
+
+def initial_floor(settings: Settings, state: State, realtime: State) -> datetime:
+    with pg_connection(settings) as conn:
+        now = db_now(conn.cursor())
+    budget = timedelta(seconds=settings.realtime_budget_seconds)
+    if realtime.exists() and realtime.last_modified >= now - budget:
+        return realtime.last_modified
+    return max(now - budget / 2, state.last_modified)
+
+
+def run_lanes(
+    es: Elasticsearch,
+    settings: Settings,
+    state: State,
+    fingerprints=None,
+    stop: Optional[threading.Event] = None
+) -> None:
+    """Запуск обеих полос; блокируется до остановки"""
+    stop = stop or threading.Event()
+    realtime = state.child('realtime')
+    floor = Floor(initial_floor(settings, state, realtime))
+    if realtime.last_modified < floor.get():
+        realtime.last_modified, realtime.last_id = floor.get(), NIL_UUID
+        realtime.save()
+    logger.info(f"Lanes started, realtime floor {floor.get()}")
+
+    threads = [
+        threading.Thread(
+            target=run_lane, name='realtime-lane', daemon=True,
+            args=(
+                realtime_loop, 'realtime', stop, es, settings, realtime, floor, stop,
+                fingerprints,
+            ),
+        ),
+        threading.Thread(
+            target=run_lane, name='bulk-lane', daemon=True,
+            args=(bulk_loop, 'bulk', stop, es, settings, state, floor, stop, fingerprints),
+        ),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
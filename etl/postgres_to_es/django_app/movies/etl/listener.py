@@ -0,0 +1,155 @@
+"""Событийный захват изменений через LISTEN/NOTIFY.
+
+Триггеры из миграции 0001_change_notify шлют в канал payload вида
+``<таблица>:<id>``. Пачка уведомлений копится в окне дебаунса, после чего
+переиндексируются только затронутые фильмы. Раз в SLEEP_INTERVAL, даже
+под постоянным потоком уведомлений, выполняется обычный проход по modified:
+он подбирает события, потерянные во время переподключения, и только он
+сдвигает чекпоинт.
+"""
+import time
+import select
+import logging
+import threading
+from typing import Optional, Set
+
+from elasticsearch import Elasticsearch
+from psycopg2 import sql
+
+from movies.etl.projections import open_projections
+from movies.management.commands.sync_data_main import (
+    BulkLoader,
+    Settings,
+    State,
+    get_pg_connection,
+    pg_connection,
+    reindex_film_works,
+    resolve_affected_film_works,
+    run_pass,
+)
+
+logger = logging.getLogger(__name__)
+
+# Канал, в который пишет триггерная функция etl_notify_change()
+CHANGE_CHANNEL = 'etl_changes'
+
+
+class ChangeSet:
+    """Накопленные за окно дебаунса id изменённых сущностей"""
+    def __init__(self):
+        self.film_work_ids: Set[str] = set()
+        self.person_ids: Set[str] = set()
+        self.genre_ids: Set[str] = set()
+
+    def add(self, payload: str) -> None:
+        table, _, entity_id = payload.partition(':')
+        if not entity_id:
+            logger.warning(f"Malformed change payload: {payload!r}")
+        elif table == 'person':
+            self.person_ids.add(entity_id)
+        elif table == 'genre':
+            self.genre_ids.add(entity_id)
+        else:
+            # film_work и таблицы связей присылают id фильма
+            self.film_work_ids.add(entity_id)
+
+    def __len__(self) -> int:
+        return len(self.film_work_ids) + len(self.person_ids) + len(self.genre_ids)
+
+
+class ChangeListener:
+    """Подписка на канал уведомлений об изменениях в Postgres"""
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.conn = None
+
+    def __enter__(self) -> 'ChangeListener':
+        self.conn = get_pg_connection(self.settings)
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('LISTEN {}').format(sql.Identifier(CHANGE_CHANNEL))
+            )
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.conn.close()
+
+    def _poll(self, timeout: float) -> bool:
+        """Ожидание уведомлений не дольше timeout секунд"""
+        if not self.conn.notifies:
+            if select.select([self.conn], [], [], timeout) == ([], [], []):
+                return False
+            self.conn.poll()
+        return bool(self.conn.notifies)
+
+    def wait(self, timeout: float) -> Optional[ChangeSet]:
+        """Ожидание пачки изменений; None, если за timeout ничего не пришло"""
+        if not self._poll(timeout):
+            return None
+
+        # Копим уведомления, пока идут всплески, но не дольше debounce_max
+        deadline = time.monotonic() + self.settings.debounce_max_seconds
+        changes = ChangeSet()
+        while True:
+            while self.conn.notifies:
+                changes.add(self.conn.notifies.pop(0).payload)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._poll(min(self.settings.debounce_seconds, remaining)):
+                break
+        return changes
+
+
+def reindex_changes(
+    es: Elasticsearch,
+    settings: Settings,
+    changes: ChangeSet,
+    fingerprints=None
+) -> int:
+    """Переиндексация фильмов, затронутых накопленными изменениями"""
+    with pg_connection(settings) as conn:
+        cursor = conn.cursor()
+        film_work_ids = set(changes.film_work_ids)
+        if changes.person_ids or changes.genre_ids:
+            film_work_ids.update(resolve_affected_film_works(
+                cursor, changes.person_ids, changes.genre_ids
+            ))
+        with BulkLoader(es, settings, fingerprints) as loader, \
+                open_projections(es, settings) as projections:
+            return reindex_film_works(
+                loader, cursor, sorted(film_work_ids), projections=projections
+            )
+
+
+def listen(
+    es: Elasticsearch,
+    settings: Settings,
+    state: State,
+    fingerprints=None,
+    stop: Optional[threading.Event] = None
+) -> None:
+    """Событийный цикл; опрос по modified идёт по расписанию как запасной путь"""
+    stop = stop or threading.Event()
+    with ChangeListener(settings) as listener:
+        # Догоняем изменения, пропущенные до подписки
+        run_pass(es, settings, state, fingerprints)
+        polled = time.monotonic()
+        while not stop.is_set():
+            remaining = settings.sleep_interval - (time.monotonic() - polled)
+            changes = listener.wait(timeout=max(remaining, 0))
+            if changes is not None:
+                total_processed = reindex_changes(es, settings, changes, fingerprints)
+                logger.info(
+                    f"Reindexed {total_processed} film works "
+                    f"from {len(changes)} change events"
+                )
+
+            if time.monotonic() - polled >= settings.sleep_interval:
+                # Без этого прохода чекпоинт замер бы при постоянных правках,
+                # и каждый перезапуск отправлял бы всё заново
+                state.load()
+                total_processed = run_pass(es, settings, state, fingerprints)
+                logger.info(f"Fallback poll processed: {total_processed}")
+                polled = time.monotonic()
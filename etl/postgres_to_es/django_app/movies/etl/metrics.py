@@ -0,0 +1,256 @@
+"""Метрики ETL в текстовом формате Prometheus.
+
+Счётчики, гистограммы и gauge без внешних зависимостей. Автономный
+sync_data_main отдаёт их своим HTTP-сервером (serve), а Django-команда
+sync_data пишет снимок в файл, который отдаёт представление /metrics
+вместе с отставанием, посчитанным по SyncState в момент запроса.
+"""
+import os
+import math
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Labels, extra: str = '') -> str:
+    pairs = [
+        f'{name}="{value}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+            *self._samples(),
+        ]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f'{self.name}{format_labels(self.label_names, key)} {format_value(value)}'
+            for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+        self._function: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], Optional[float]]) -> None:
+        """Значение вычисляется в момент чтения; None — пропустить"""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [f'{self.name} {format_value(value)}']
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f'{self.name}{format_labels(self.label_names, key)} {format_value(value)}'
+            for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = TIME_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Для каждого набора меток: счётчики по корзинам, сумма, количество
+        self._series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._series.items()
+            )
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(
+                    f'{self.name}_bucket{format_labels(self.label_names, key, le)} {cumulative}'
+                )
+            labels = format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, exclude: Sequence[Metric] = ()) -> str:
+        lines = []
+        for metric in self.metrics:
+            if metric not in exclude:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'etl_stage_seconds', 'Time spent per batch in each ETL stage', ['stage']
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'etl_batch_size', 'Documents per extracted batch and per bulk request', ['stage'],
+    buckets=SIZE_BUCKETS,
+))
+DOCUMENTS = REGISTRY.register(Counter(
+    'etl_documents_total', 'Documents passed through each ETL stage', ['stage']
+))
+BULK_ERRORS = REGISTRY.register(Counter(
+    'etl_bulk_errors_total', 'Documents or requests rejected by Elasticsearch', ['reason']
+))
+DOCS_PER_SECOND = REGISTRY.register(Gauge(
+    'etl_docs_per_second', 'Throughput of the last completed pass'
+))
+LAG_SECONDS = REGISTRY.register(Gauge(
+    'etl_lag_seconds', 'Seconds between now and the last synced modification'
+))
+
+
+def lag_seconds(last_modified) -> Optional[float]:
+    """Отставание чекпоинта от текущего времени; None до первой синхронизации"""
+    if last_modified is None or last_modified.year == 1:
+        return None
+    return time.time() - last_modified.timestamp()
+
+
+def write_snapshot(
+    path: str,
+    registry: Registry = REGISTRY,
+    exclude: Sequence[Metric] = ()
+) -> None:
+    """Атомарная запись текущих значений для чтения другим процессом"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.prom')
+    with os.fdopen(fd, 'w') as f:
+        f.write(registry.render(exclude))
+    os.replace(tmp_path, path)
+
+
+def drop_family(text: str, name: str) -> str:
+    """Текст экспозиции без семейства name: повтор семейства Prometheus отвергает"""
+    headers = (f'# HELP {name} ', f'# TYPE {name} ')
+    samples = {name, f'{name}_bucket', f'{name}_sum', f'{name}_count'}
+    return ''.join(
+        line for line in text.splitlines(keepends=True)
+        if not line.startswith(headers)
+        and line.split('{', 1)[0].split(' ', 1)[0] not in samples
+    )
+
+
+def serve(port: int, host: str = '0.0.0.0', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """HTTP-сервер /metrics в фоновом потоке"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
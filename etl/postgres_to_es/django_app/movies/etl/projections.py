@@ -0,0 +1,222 @@
+"""Проекции выборки фильмов на индексы persons и genres.
+
+Пачка строк, извлечённая для movies, раскладывается ещё и в документы
+персон с их ролями и в документы жанров, так что Postgres читается один
+раз. У каждой проекции свой BulkLoader, то есть свой поток bulk-запросов;
+чекпоинт сдвигается, когда пачку подтвердили все потоки.
+
+В пачке видна только часть фильмографии персоны, поэтому её документ
+дополняется скриптом: роли из фильмов пачки заменяют прежние записи о тех
+же фильмах. Если персону убрали из фильма, запись о нём остаётся в её
+документе до пересборки индекса persons.
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from elasticsearch import Elasticsearch
+
+from movies.management.commands.sync_data_main import (
+    BulkLoader,
+    Settings,
+    fetch_film_works_by_ids,
+    resolve_affected_film_works,
+)
+
+logger = logging.getLogger(__name__)
+
+PROJECTIONS = ('persons', 'genres')
+PERSON_ROLES = ('director', 'actor', 'writer')
+
+MERGE_PERSON_FILMS_SCRIPT_ID = 'persons_merge_films'
+
+MERGE_PERSON_FILMS_SCRIPT = """
+    ctx._source.full_name = params.full_name;
+    Set ids = new HashSet();
+    for (def film : params.films) {
+        ids.add(film.id);
+    }
+    ctx._source.films.removeIf(film -> ids.contains(film.id));
+    ctx._source.films.addAll(params.films);
+"""
+
+
+def projection_names(settings: Settings) -> List[str]:
+    """Включённые проекции из INDEX_PROJECTIONS; movies заполняется всегда"""
+    names = [name.strip() for name in settings.index_projections.split(',') if name.strip()]
+    unknown = set(names) - set(PROJECTIONS) - {'movies'}
+    if unknown:
+        raise ValueError(f"Unknown index projections: {', '.join(sorted(unknown))}")
+    return [name for name in PROJECTIONS if name in names]
+
+
+def transform_persons(rows: List[Dict], index: str = 'persons') -> Iterator[Dict]:
+    """Update-действия персон пачки с их ролями в фильмах пачки"""
+    persons: Dict[str, Dict] = {}
+    for row in rows:
+        film = {
+            'id': str(row['id']),
+            'title': row.get('title', ''),
+            'imdb_rating': float(row['imdb_rating']) if row['imdb_rating'] else 0.0,
+        }
+        for role in PERSON_ROLES:
+            for person in row[f'{role}s']:
+                if not person.get('id'):
+                    continue
+                entry = persons.setdefault(
+                    str(person['id']), {'full_name': person['name'], 'films': {}}
+                )
+                entry['films'].setdefault(film['id'], {**film, 'roles': []})['roles'].append(role)
+
+    for person_id, entry in persons.items():
+        films = list(entry['films'].values())
+        yield {
+            '_op_type': 'update',
+            '_index': index,
+            '_id': person_id,
+            'script': {
+                'id': MERGE_PERSON_FILMS_SCRIPT_ID,
+                'params': {'full_name': entry['full_name'], 'films': films},
+            },
+            'upsert': {'id': person_id, 'full_name': entry['full_name'], 'films': films},
+        }
+
+
+def transform_genres(
+    rows: List[Dict],
+    index: str = 'genres',
+    sent: Optional[Dict[str, str]] = None
+) -> Iterator[Dict]:
+    """Документы жанров пачки; уже отправленные с тем же названием пропускаются"""
+    genres = {}
+    for row in rows:
+        for genre in row['genres']:
+            if genre and genre.get('id'):
+                genres[str(genre['id'])] = genre['name']
+    for genre_id, name in genres.items():
+        if sent is not None:
+            if sent.get(genre_id) == name:
+                continue
+            sent[genre_id] = name
+        yield {'_index': index, '_id': genre_id, '_source': {'id': genre_id, 'name': name}}
+
+
+def after_all(loaders: Iterable[BulkLoader], callback: Callable[[], None]) -> None:
+    """callback, когда поставленные до этого пачки подтверждены во всех загрузчиках"""
+    loaders = list(loaders)
+    remaining = [len(loaders)]
+    lock = threading.Lock()
+
+    def done():
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for loader in loaders:
+        loader.after(done)
+
+
+def ensure_person_script(es: Elasticsearch) -> None:
+    es.put_script(
+        id=MERGE_PERSON_FILMS_SCRIPT_ID,
+        body={'script': {'lang': 'painless', 'source': MERGE_PERSON_FILMS_SCRIPT}},
+    )
+
+
+def reindex_projection(
+    loader: BulkLoader,
+    cursor,
+    name: str,
+    ids: Iterable[str],
+    batch_size: int = 100
+) -> int:
+    """Пересборка документов проекции по id персон или жанров из Postgres"""
+    ids = set(ids)
+    if name == 'persons':
+        film_work_ids = resolve_affected_film_works(cursor, person_ids=ids)
+    else:
+        film_work_ids = resolve_affected_film_works(cursor, genre_ids=ids)
+    sent: Dict[str, str] = {}
+    for start in range(0, len(film_work_ids), batch_size):
+        rows = fetch_film_works_by_ids(
+            cursor, film_work_ids[start:start + batch_size], loader.settings.query_strategy
+        )
+        if name == 'persons':
+            actions = transform_persons(rows, name)
+        else:
+            # Жанру достаточно одного фильма, дальше не читаем
+            actions = transform_genres(rows, name, sent)
+        loader.submit(action for action in actions if action['_id'] in ids)
+        if name == 'genres' and ids <= set(sent):
+            break
+    return len(ids)
+
+
+class Projections:
+    """Загрузчики проекций на время одного прохода"""
+    def __init__(self, es: Elasticsearch, settings: Settings, names: Iterable[str] = ()):
+        # Кэш API поиска зависит только от movies
+        loader_settings = settings.copy(update={'bump_generation': False})
+        self.loaders = {name: BulkLoader(es, loader_settings) for name in names}
+        # Жанры повторяются почти в каждой пачке: за проход отправляем их один раз
+        self._sent_genres: Dict[str, str] = {}
+        if 'persons' in self.loaders:
+            ensure_person_script(es)
+
+    def __enter__(self) -> 'Projections':
+        for loader in self.loaders.values():
+            loader.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # Закрываем все загрузчики, даже если один из них упал
+        errors = []
+        for loader in self.loaders.values():
+            try:
+                loader.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def submit(self, rows: List[Dict]) -> None:
+        """Постановка проекций пачки в очереди их загрузчиков"""
+        for name, loader in self.loaders.items():
+            if name == 'persons':
+                loader.submit(transform_persons(rows, name))
+            else:
+                loader.submit(transform_genres(rows, name, self._sent_genres))
+
+    def rename_persons(self, names: Dict[str, str]) -> None:
+        """Новые имена персон в проекции persons при PERSON_UPDATE_MODE=partial"""
+        loader = self.loaders.get('persons')
+        if loader is None or not names:
+            return
+        # Персоны без документа дают 404 на update, и загрузчик их пропускает
+        loader.submit(
+            {'_op_type': 'update', '_index': 'persons', '_id': person_id,
+             'doc': {'full_name': name}}
+            for person_id, name in names.items()
+        )
+
+    def flush(self) -> None:
+        """Ожидание подтверждения всех поставленных пачек проекций"""
+        for loader in self.loaders.values():
+            loader.flush()
+
+    def after(self, loader: BulkLoader, callback: Callable[[], None]) -> None:
+        """Сдвиг чекпоинта после подтверждения пачки в movies и во всех проекциях"""
+        after_all([loader, *self.loaders.values()], callback)
+
+
+def open_projections(es: Elasticsearch, settings: Settings) -> Projections:
+    names = projection_names(settings)
+    if names and settings.extract_mode in ('raw', 'document'):
+        # Строки приходят готовым JSON-текстом, раскладывать нечего
+        logger.warning(
+            f"Index projections are not built in {settings.extract_mode} extract mode"
+        )
+        names = []
+    return Projections(es, settings, names)
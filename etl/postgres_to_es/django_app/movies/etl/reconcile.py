@@ -0,0 +1,227 @@
+"""Сверка индекса movies с Postgres по контрольным суммам диапазонов id.
+
+Пространство UUID режется на диапазоны; для каждого обе стороны считают
+число документов и сумму первых 64 бит id по модулю 2**64 (Postgres —
+агрегатом, Elasticsearch — scripted_metric). Совпавшие диапазоны дальше не
+смотрим, расходящиеся делим снова, пока в диапазоне не останется не больше
+leaf_size документов. Для таких листьев сравниваются сами множества id,
+а расхождения переиндексируются: фильмы, которых нет в Postgres, удаляются.
+
+В режиме content в сумму входят и первые 64 бита хэша содержимого
+(поле content_hash, см. movies.etl.content_hash), поэтому изменённые
+документы сужаются так же, как пропавшие, а в листьях сравниваются хэши.
+"""
+import uuid
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from elasticsearch import Elasticsearch, helpers
+
+from movies.etl.content_hash import content_hash_sql
+from movies.management.commands.sync_data_main import (
+    BulkLoader,
+    Settings,
+    pg_connection,
+    reindex_film_works,
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'movies'
+SPACE = 2 ** 128
+MODULUS = 2 ** 64
+
+# Границы [lower, upper) как строки UUID; upper None — до конца пространства
+Range = Tuple[str, Optional[str]]
+
+
+class Summary(NamedTuple):
+    count: int
+    checksum: int
+
+
+# {content_sum} — сумма по хэшам содержимого или 0; суммы bigint в numeric не переполняются
+PG_SUMMARY_QUERY = """
+    SELECT b.n,
+           count(fw.id),
+           coalesce(sum(('x' || left(replace(fw.id::text, '-', ''), 16))::bit(64)::bigint), 0)
+           + {content_sum}
+    FROM unnest(%s::uuid[], %s::uuid[]) WITH ORDINALITY AS b(lower_id, upper_id, n)
+    LEFT JOIN film_work fw
+        ON fw.id >= b.lower_id AND (b.upper_id IS NULL OR fw.id < b.upper_id)
+    GROUP BY b.n
+    ORDER BY b.n
+"""
+
+CONTENT_SUM = (
+    "coalesce(sum(('x' || left(" + content_hash_sql('fw.id') + ", 16))::bit(64)::bigint), 0)"
+)
+
+PG_DOCUMENTS_QUERY = """
+    SELECT fw.id, {content_hash}
+    FROM film_work fw
+    WHERE fw.id >= %s AND (%s::uuid IS NULL OR fw.id < %s::uuid)
+"""
+
+# Те же 64 бита id и хэша, что и в PG_SUMMARY_QUERY; переполнение long даёт
+# сумму по модулю 2**64. Документ без content_hash даёт в сумму только id.
+CHECKSUM_AGG = {
+    'scripted_metric': {
+        'init_script': 'state.sum = 0L',
+        'map_script': """
+            String id = doc['id'].value;
+            state.sum += Long.parseUnsignedLong(
+                id.substring(0, 8) + id.substring(9, 13) + id.substring(14, 18), 16
+            );
+            if (params.content && doc.containsKey('content_hash')
+                    && doc['content_hash'].size() > 0) {
+                state.sum += Long.parseUnsignedLong(
+                    doc['content_hash'].value.substring(0, 16), 16
+                );
+            }
+        """,
+        'combine_script': 'return state.sum',
+        'reduce_script': """
+            long total = 0L;
+            for (s in states) { if (s != null) { total += s } }
+            return total;
+        """,
+    }
+}
+
+
+def range_query(bounds: Range) -> Dict:
+    """Запрос ES по диапазону keyword-поля id (порядок строк совпадает с uuid)"""
+    lower, upper = bounds
+    condition = {'gte': lower}
+    if upper is not None:
+        condition['lt'] = upper
+    return {'range': {'id': condition}}
+
+
+def split_range(bounds: Range, parts: int) -> List[Range]:
+    """Деление диапазона на parts равных частей"""
+    lower = uuid.UUID(bounds[0]).int
+    upper = uuid.UUID(bounds[1]).int if bounds[1] is not None else SPACE
+    step = max((upper - lower) // parts, 1)
+    points = list(range(lower, upper, step))[:parts] + [upper]
+    return [
+        (str(uuid.UUID(int=start)), str(uuid.UUID(int=end)) if end < SPACE else None)
+        for start, end in zip(points, points[1:])
+    ]
+
+
+def pg_summaries(cursor, ranges: List[Range], content: bool = False) -> List[Summary]:
+    query = PG_SUMMARY_QUERY.format(content_sum=CONTENT_SUM if content else '0')
+    cursor.execute(query, (
+        [lower for lower, _ in ranges], [upper for _, upper in ranges]
+    ))
+    return [Summary(count, int(total) % MODULUS) for _, count, total in cursor.fetchall()]
+
+
+def es_summaries(es: Elasticsearch, ranges: List[Range], content: bool = False) -> List[Summary]:
+    """Число документов и контрольная сумма всех диапазонов одним запросом"""
+    checksum = {
+        'scripted_metric': dict(CHECKSUM_AGG['scripted_metric'], params={'content': content})
+    }
+    response = es.search(index=INDEX_NAME, body={
+        'size': 0,
+        'aggs': {
+            'ranges': {
+                'filters': {'filters': [range_query(bounds) for bounds in ranges]},
+                'aggs': {'checksum': checksum},
+            }
+        },
+    })
+    return [
+        Summary(bucket['doc_count'], (bucket['checksum']['value'] or 0) % MODULUS)
+        for bucket in response['aggregations']['ranges']['buckets']
+    ]
+
+
+def pg_documents(cursor, bounds: Range, content: bool = False) -> Dict[str, Optional[str]]:
+    """id фильмов диапазона с хэшем содержимого (None без content)"""
+    lower, upper = bounds
+    query = PG_DOCUMENTS_QUERY.format(
+        content_hash=content_hash_sql('fw.id') if content else 'NULL'
+    )
+    cursor.execute(query, (lower, upper, upper))
+    return {str(row[0]): row[1] for row in cursor.fetchall()}
+
+
+def es_documents(es: Elasticsearch, bounds: Range, content: bool = False) -> Dict[str, Optional[str]]:
+    hits = helpers.scan(
+        es,
+        index=INDEX_NAME,
+        query={
+            'query': range_query(bounds),
+            '_source': ['content_hash'] if content else False,
+        },
+        size=1000,
+    )
+    return {
+        hit['_id']: hit.get('_source', {}).get('content_hash') if content else None
+        for hit in hits
+    }
+
+
+def diff_leaf(
+    es: Elasticsearch,
+    cursor,
+    bounds: Range,
+    content: bool,
+    stats: Dict[str, int]
+) -> Set[str]:
+    """Расходящиеся id одного листового диапазона"""
+    in_pg = pg_documents(cursor, bounds, content)
+    in_es = es_documents(es, bounds, content)
+    missing = in_pg.keys() - in_es.keys()
+    extra = in_es.keys() - in_pg.keys()
+    changed = {
+        film_id for film_id in in_pg.keys() & in_es.keys()
+        if in_pg[film_id] != in_es[film_id]
+    }
+    stats['missing'] += len(missing)
+    stats['extra'] += len(extra)
+    stats['changed'] += len(changed)
+    return missing | extra | changed
+
+
+def reconcile(
+    es: Elasticsearch,
+    settings: Settings,
+    fanout: int = 16,
+    leaf_size: int = 1000,
+    content: bool = False,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """Поиск и исправление расхождений; возвращает счётчики"""
+    stats = {'ranges': 0, 'leaves': 0, 'missing': 0, 'extra': 0, 'changed': 0}
+    with pg_connection(settings) as conn:
+        cursor = conn.cursor()
+        with BulkLoader(es, settings) as loader:
+            pending = [(str(uuid.UUID(int=0)), None)]
+            while pending:
+                bounds = pending.pop()
+                children = split_range(bounds, fanout)
+                for child, pg, indexed in zip(
+                    children,
+                    pg_summaries(cursor, children, content),
+                    es_summaries(es, children, content),
+                ):
+                    stats['ranges'] += 1
+                    if pg == indexed:
+                        continue
+                    if max(pg.count, indexed.count) > leaf_size:
+                        pending.append(child)
+                        continue
+
+                    stats['leaves'] += 1
+                    divergent = diff_leaf(es, cursor, child, content, stats)
+                    if divergent:
+                        logger.info(
+                            f"Range [{child[0]}, {child[1]}): {len(divergent)} divergent film works"
+                        )
+                        if not dry_run:
+                            reindex_film_works(loader, cursor, sorted(divergent))
+    return stats
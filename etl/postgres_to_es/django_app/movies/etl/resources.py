@@ -0,0 +1,160 @@
+"""Общие ресурсы процесса ETL: пул соединений Postgres и клиенты Elasticsearch.
+
+Пул переживает циклы main(): проходы берут соединение на время чтения
+и возвращают его, а не открывают новое каждый раз. Соединение, простоявшее
+дольше check_interval, перед выдачей проверяется запросом SELECT 1;
+закрытые и сломанные соединения выбрасываются и заменяются новыми.
+
+Клиенты Elasticsearch держат keep-alive соединения (не больше
+connections_per_host на узел) и сжимают тела запросов gzip: при удалённом
+кластере bulk упирается в сеть, а NDJSON сжимается в разы.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+import psycopg2
+from psycopg2.pool import PoolError
+from elasticsearch import Elasticsearch
+
+ES_CONNECTIONS_PER_HOST = 16
+ES_TIMEOUT = 30
+
+
+def es_client_options(settings=None) -> Dict:
+    """Параметры транспорта из настроек ETL; без настроек — значения по умолчанию"""
+    return {
+        'http_compress': getattr(settings, 'es_http_compress', True),
+        # Размер пула keep-alive соединений к каждому узлу
+        'maxsize': getattr(settings, 'es_connections_per_host', ES_CONNECTIONS_PER_HOST),
+        'timeout': getattr(settings, 'es_timeout', ES_TIMEOUT),
+        'retry_on_timeout': True,
+    }
+
+
+def es_client(hosts: Sequence[str], settings=None) -> Elasticsearch:
+    return Elasticsearch(list(hosts), **es_client_options(settings))
+
+
+def async_es_client(hosts: Sequence[str], settings=None):
+    # Асинхронный клиент требует aiohttp, нужного только рантайму async
+    from elasticsearch import AsyncElasticsearch
+    return AsyncElasticsearch(list(hosts), **es_client_options(settings))
+
+
+class PgPool:
+    """Потокобезопасный пул соединений с ожиданием свободного места"""
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        size: int = 8,
+        timeout: float = 30.0,
+        check_interval: float = 30.0
+    ):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.discarded = 0
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # Свободные соединения и момент их возврата в пул
+        self._idle: List[Tuple[Any, float]] = []
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Соединение на время блока: commit при успехе, rollback при ошибке"""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            broken = not self._rollback(conn)
+            raise
+        finally:
+            self._checkin(conn, broken)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f'No free Postgres connection in {self.timeout}s (pool size {self.size})')
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self.connect()
+                conn, released = entry
+                if self._healthy(conn, released):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn, broken: bool) -> None:
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _healthy(self, conn, released: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _rollback(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, conn) -> None:
+        self.discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pools: Dict[Tuple, PgPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pg_pool(key: Tuple, connect: Callable[[], Any], **options) -> PgPool:
+    """Пул процесса для базы key; создаётся при первом обращении"""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = PgPool(connect, **options)
+        return pool
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
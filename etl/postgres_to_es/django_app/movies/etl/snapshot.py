@@ -0,0 +1,220 @@
+"""Снимок индекса movies в сжатых NDJSON-файлах для быстрого разворачивания.
+
+Экспорт пишет готовые bulk-строки (служебная строка + документ) кусками
+по chunk_docs документов в chunk-NNNNN.ndjson.gz и в конце — manifest.json.
+Источник — тот же конвейер, что у sync_data (extract_mode учитывается),
+либо scroll живого индекса.
+
+Импорт читает куски потоково и отдаёт строки в BulkLoader без разбора
+документов; память ограничена его очередью. Кусок отмечается в файле
+прогресса, только когда подтверждены все его пачки, поэтому после сбоя
+загрузка продолжается с первого неподтверждённого куска.
+"""
+import os
+import gzip
+import json
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from elasticsearch import Elasticsearch, helpers
+
+from movies.index_profiles import (
+    PROFILES, IndexProfile, dynamic_settings, get_profile, index_body
+)
+from movies.management.commands.sync_data_main import (
+    FILM_WORK_SOURCE_QUERY,
+    MOVIE_DOCUMENT_QUERY,
+    BulkLoader,
+    Settings,
+    State,
+    fetch_data_from_pg,
+    fetch_raw_from_pg,
+    raw_bulk_item,
+    serialize_action,
+    transform_data,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+PROGRESS = 'import-progress.{index}.json'
+SOURCES = ('pg', 'es')
+
+
+def write_json(path: str, data: Dict) -> None:
+    """Атомарная запись: прерванный процесс не оставит обрезанный файл"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory: str) -> Dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f'{directory} has no {MANIFEST}: export is missing or unfinished')
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r}")
+    return manifest
+
+
+def pg_items(settings: Settings) -> Iterator[bytes]:
+    """Bulk-строки всех фильмов из Postgres тем же путём, что у sync_data"""
+    # Позиция только в памяти: экспорт не трогает боевой чекпоинт
+    position = State(None)
+    if settings.extract_mode in ('raw', 'document'):
+        query = (
+            MOVIE_DOCUMENT_QUERY if settings.extract_mode == 'document'
+            else FILM_WORK_SOURCE_QUERY
+        )
+        for items in fetch_raw_from_pg(position, settings, settings.batch_size, query=query):
+            yield from items
+    else:
+        for batch in fetch_data_from_pg(position, settings, settings.batch_size):
+            for action in transform_data(batch):
+                yield serialize_action(action)
+
+
+def es_items(es: Elasticsearch, index: str, size: int = 1000) -> Iterator[bytes]:
+    """Bulk-строки документов живого индекса в порядке _doc"""
+    for hit in helpers.scan(es, index=index, size=size, scroll='5m'):
+        source = json.dumps(hit['_source'], ensure_ascii=False).encode('utf-8')
+        yield raw_bulk_item(hit['_id'].encode('utf-8'), source, index)
+
+
+def export(
+    items: Iterable[bytes],
+    directory: str,
+    source: str,
+    chunk_docs: int = 50_000,
+    level: int = 6,
+    index: str = 'movies'
+) -> Dict:
+    """Запись bulk-строк кусками и манифеста; возвращает манифест"""
+    if chunk_docs < 1:
+        raise ValueError('chunk_docs must be positive')
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        raise ValueError(f'{directory} already contains a snapshot')
+
+    chunks: List[Dict] = []
+    out = None
+    try:
+        for item in items:
+            if out is None or chunks[-1]['docs'] >= chunk_docs:
+                if out is not None:
+                    out.close()
+                name = f'chunk-{len(chunks):05d}.ndjson.gz'
+                out = gzip.open(os.path.join(directory, name), 'wb', compresslevel=level)
+                chunks.append({'file': name, 'docs': 0, 'bytes': 0})
+            out.write(item)
+            chunks[-1]['docs'] += 1
+            chunks[-1]['bytes'] += len(item)
+    finally:
+        if out is not None:
+            out.close()
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'index': index,
+        'source': source,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'docs': sum(chunk['docs'] for chunk in chunks),
+        'bytes': sum(chunk['bytes'] for chunk in chunks),
+        'chunks': chunks,
+    }
+    # Манифест пишется последним: его наличие означает законченный экспорт
+    write_json(manifest_path, manifest)
+    return manifest
+
+
+def read_items(path: str, index: Optional[str] = None) -> Iterator[bytes]:
+    """Bulk-строки куска; при index служебная строка переписывается под него"""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            meta = f.readline()
+            if not meta:
+                return
+            source = f.readline()
+            if index is not None:
+                action = json.loads(meta)
+                next(iter(action.values()))['_index'] = index
+                meta = (json.dumps(action) + '\n').encode('utf-8')
+            yield meta + source
+
+
+class Progress:
+    """Куски снимка, уже подтверждённые при загрузке в index"""
+    def __init__(self, directory: str, index: str):
+        self.path = os.path.join(directory, PROGRESS.format(index=index))
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        try:
+            with open(self.path) as f:
+                self.done = set(json.load(f)['done'])
+        except FileNotFoundError:
+            pass
+
+    def mark(self, name: str) -> None:
+        # Вызывается из потоков BulkLoader
+        with self._lock:
+            self.done.add(name)
+            write_json(self.path, {'done': sorted(self.done)})
+
+    def reset(self) -> None:
+        self.done = set()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def prepare_index(es: Elasticsearch, index: str, docs: int, profile: IndexProfile) -> None:
+    """Создание индекса под профиль или перевод существующего в режим загрузки"""
+    bulk_load = dynamic_settings(PROFILES['bulk-load'])
+    if es.indices.exists(index=index):
+        es.indices.put_settings(index=index, body=bulk_load)
+        return
+    body = index_body(profile, docs)
+    body['settings'].update(bulk_load)
+    es.indices.create(index=index, body=body)
+
+
+def restore(
+    es: Elasticsearch,
+    settings: Settings,
+    directory: str,
+    index: Optional[str] = None,
+    profile: str = 'serving',
+    resume: bool = True
+) -> Dict:
+    """Загрузка снимка в index; возвращает число загруженных кусков и документов"""
+    manifest = read_manifest(directory)
+    target_profile = get_profile(profile)
+    target = index or manifest['index']
+    rewrite = target if target != manifest['index'] else None
+
+    progress = Progress(directory, target)
+    if not resume:
+        progress.reset()
+    pending = [chunk for chunk in manifest['chunks'] if chunk['file'] not in progress.done]
+    if len(pending) < len(manifest['chunks']):
+        logger.info(f"Resuming: {len(manifest['chunks']) - len(pending)} chunks already loaded")
+
+    prepare_index(es, target, manifest['docs'], target_profile)
+    docs = 0
+    with BulkLoader(es, settings) as loader:
+        for chunk in pending:
+            loader.submit_raw(read_items(os.path.join(directory, chunk['file']), rewrite))
+            loader.after(lambda name=chunk['file']: progress.mark(name))
+            docs += chunk['docs']
+            logger.info(f"Queued {chunk['file']} ({chunk['docs']} docs)")
+
+    es.indices.refresh(index=target)
+    es.indices.put_settings(index=target, body=dynamic_settings(target_profile))
+    return {'index': target, 'chunks': len(pending), 'docs': docs}
@@ -0,0 +1,224 @@
+"""Профили индекса movies — единственный источник его настроек и маппинга.
+
+По ним строит тело индекса команда create_es_index и поля MovieDocument;
+маппинги проекций persons и genres лежат здесь же.
+Статическая часть профиля (шарды, сортировка, маппинг) задаётся при создании
+индекса; динамическая (refresh, реплики, translog) меняется на лету, поэтому
+bulk-load отличается от serving только ею: загрузка идёт с bulk-load,
+а после неё индекс переводится на профиль, под который он создавался.
+"""
+import copy
+import math
+from typing import Dict, NamedTuple
+
+ANALYSIS = {
+    "filter": {
+        "english_stop": {"type": "stop", "stopwords": "_english_"},
+        "english_stemmer": {"type": "stemmer", "language": "english"},
+        "english_possessive_stemmer": {"type": "stemmer", "language": "possessive_english"},
+        "russian_stop": {"type": "stop", "stopwords": "_russian_"},
+        "russian_stemmer": {"type": "stemmer", "language": "russian"}
+    },
+    "analyzer": {
+        "ru_en": {
+            "tokenizer": "standard",
+            "filter": [
+                "lowercase",
+                "english_stop",
+                "english_stemmer",
+                "english_possessive_stemmer",
+                "russian_stop",
+                "russian_stemmer"
+            ]
+        }
+    }
+}
+
+PERSON_MAPPING = {
+    "type": "nested",
+    "dynamic": "strict",
+    "properties": {
+        "id": {"type": "keyword"},
+        "name": {"type": "text", "analyzer": "ru_en"}
+    }
+}
+
+PROPERTIES = {
+    "id": {"type": "keyword"},
+    "imdb_rating": {"type": "float"},
+    "genres": {"type": "keyword"},
+    "title": {
+        "type": "text",
+        "analyzer": "ru_en",
+        "fields": {"raw": {"type": "keyword"}}
+    },
+    "description": {"type": "text", "analyzer": "ru_en"},
+    "directors_names": {"type": "text", "analyzer": "ru_en"},
+    "actors_names": {"type": "text", "analyzer": "ru_en"},
+    "writers_names": {"type": "text", "analyzer": "ru_en"},
+    "directors": PERSON_MAPPING,
+    "actors": PERSON_MAPPING,
+    "writers": PERSON_MAPPING,
+    # Хэш содержимого из Postgres для reconcile: не ищется, читается из doc values
+    "content_hash": {"type": "keyword", "index": False},
+}
+
+# Поля, появившиеся после создания первых индексов: strict-маппинг отклоняет
+# документы с ними, пока поле не добавлено в существующий индекс
+ADDED_PROPERTIES = ("content_hash",)
+
+# Служебные поля документа, которые API не отдаёт
+SERVICE_FIELDS = ["content_hash"]
+
+# Проекции той же выборки фильмов: персоны с ролями и жанры
+PERSONS_PROPERTIES = {
+    "id": {"type": "keyword"},
+    "full_name": {
+        "type": "text",
+        "analyzer": "ru_en",
+        "fields": {"raw": {"type": "keyword"}}
+    },
+    "films": {
+        "type": "nested",
+        "dynamic": "strict",
+        "properties": {
+            "id": {"type": "keyword"},
+            "title": {"type": "text", "analyzer": "ru_en"},
+            "imdb_rating": {"type": "float"},
+            "roles": {"type": "keyword"}
+        }
+    },
+}
+
+GENRES_PROPERTIES = {
+    "id": {"type": "keyword"},
+    "name": {
+        "type": "text",
+        "analyzer": "ru_en",
+        "fields": {"raw": {"type": "keyword"}}
+    },
+}
+
+INDEX_PROPERTIES = {
+    'movies': PROPERTIES,
+    'persons': PERSONS_PROPERTIES,
+    'genres': GENRES_PROPERTIES,
+}
+
+
+class IndexProfile(NamedTuple):
+    # Динамические настройки
+    refresh_interval: str
+    replicas: int
+    translog_durability: str
+    # Шардов столько, чтобы на каждый приходилось не больше docs_per_shard
+    docs_per_shard: int
+    max_shards: int
+    # Сортировка сегментов по рейтингу: запросы «лучшие фильмы» обрываются рано
+    index_sort: bool
+    # Глобальные ординалы жанров строятся при refresh, а не на первом агрегате
+    eager_genres: bool
+    # title.raw нужен только для сортировки по названию
+    title_raw_doc_values: bool
+
+
+PROFILES: Dict[str, IndexProfile] = {
+    'serving': IndexProfile(
+        refresh_interval='1s',
+        replicas=0,
+        translog_durability='request',
+        docs_per_shard=5_000_000,
+        max_shards=5,
+        index_sort=False,
+        eager_genres=True,
+        title_raw_doc_values=True,
+    ),
+    'bulk-load': IndexProfile(
+        refresh_interval='-1',
+        replicas=0,
+        translog_durability='async',
+        docs_per_shard=5_000_000,
+        max_shards=5,
+        index_sort=False,
+        eager_genres=False,
+        title_raw_doc_values=True,
+    ),
+    'large-catalogue': IndexProfile(
+        refresh_interval='30s',
+        replicas=1,
+        translog_durability='request',
+        docs_per_shard=10_000_000,
+        max_shards=30,
+        index_sort=False,
+        eager_genres=True,
+        title_raw_doc_values=False,
+    ),
+}
+
+DEFAULT_PROFILE = 'serving'
+
+
+def get_profile(name: str) -> IndexProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown index profile {name!r}, expected one of: {', '.join(PROFILES)}")
+
+
+def shard_count(profile: IndexProfile, docs: int) -> int:
+    return min(max(math.ceil(docs / profile.docs_per_shard), 1), profile.max_shards)
+
+
+def dynamic_settings(profile: IndexProfile) -> Dict:
+    """Настройки, которые можно менять у существующего индекса"""
+    return {
+        "refresh_interval": profile.refresh_interval,
+        "number_of_replicas": profile.replicas,
+        "translog.durability": profile.translog_durability,
+    }
+
+
+def mapping_properties(profile: IndexProfile, index: str = 'movies') -> Dict:
+    properties = copy.deepcopy(INDEX_PROPERTIES[index])
+    if index != 'movies':
+        return properties
+    if profile.eager_genres:
+        properties["genres"]["eager_global_ordinals"] = True
+    if not profile.title_raw_doc_values:
+        properties["title"]["fields"]["raw"]["doc_values"] = False
+    return properties
+
+
+def index_settings(profile: IndexProfile, docs: int = 0, index: str = 'movies') -> Dict:
+    settings = {
+        "number_of_shards": shard_count(profile, docs),
+        **dynamic_settings(profile),
+        "analysis": copy.deepcopy(ANALYSIS),
+    }
+    if profile.index_sort and index == 'movies':
+        if any(spec["type"] == "nested" for spec in PROPERTIES.values()):
+            # ES 7.x: "cannot have nested fields when index sort is activated"
+            raise ValueError("index sorting is not supported with nested person fields")
+        settings["sort.field"] = "imdb_rating"
+        settings["sort.order"] = "desc"
+    return settings
+
+
+def index_body(profile: IndexProfile, docs: int = 0, index: str = 'movies') -> Dict:
+    """Полное тело запроса на создание индекса"""
+    return {
+        "settings": index_settings(profile, docs, index),
+        "mappings": {
+            "dynamic": "strict",
+            "properties": mapping_properties(profile, index),
+        },
+    }
+
+
+def upgrade_mapping(es, index: str = 'movies') -> None:
+    """Добавление в уже созданный индекс полей из ADDED_PROPERTIES"""
+    es.indices.put_mapping(
+        index=index,
+        body={"properties": {name: PROPERTIES[name] for name in ADDED_PROPERTIES}},
+        ignore=404,
+    )
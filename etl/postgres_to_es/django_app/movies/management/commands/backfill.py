@@ -0,0 +1,71 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+
+from movies.etl.backfill import status, work
+from .sync_data_main import Settings, get_es_connection
+
+
+class Command(BaseCommand):
+    help = 'Run a parallel backfill worker coordinated through the lease table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--run',
+            default='default',
+            help='Backfill run name; workers with the same name share partitions'
+        )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=64,
+            help='Number of id-range partitions created for a new run'
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=f'{socket.gethostname()}:{os.getpid()}',
+            help='Lease owner name'
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=300,
+            help='Lease duration; expired leases are picked up by other workers'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Film works fetched per query'
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Print partition progress and exit'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+
+        if options['status']:
+            for state, (count, processed) in sorted(status(settings, options['run']).items()):
+                self.stdout.write(f'{state}: {count} partitions, {processed} film works')
+            return
+
+        es = get_es_connection(settings)
+        try:
+            completed = work(
+                es,
+                settings,
+                options['run'],
+                options['worker_id'],
+                partitions=options['partitions'],
+                lease_seconds=options['lease_seconds'],
+                batch_size=options['batch_size'],
+            )
+        finally:
+            es.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['worker_id']}: completed {completed} partitions"
+        ))
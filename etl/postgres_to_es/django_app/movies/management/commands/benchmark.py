@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.etl.bench import run
+from .sync_data_main import Settings
+
+STAGES = ('fetch', 'transform', 'load')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ETL stages and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stages',
+            default=','.join(STAGES),
+            help='Comma-separated stages to run: fetch, transform, load'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100_000,
+            help='Film works read by the fetch stage'
+        )
+        parser.add_argument(
+            '--sample-size',
+            type=int,
+            default=10_000,
+            help='Rows kept in memory for the transform and load stages'
+        )
+        parser.add_argument(
+            '--load-docs',
+            type=int,
+            default=50_000,
+            help='Documents sent by each load benchmark'
+        )
+        parser.add_argument(
+            '--es-url',
+            help='Real cluster to load into; by default a local bulk stand-in is used'
+        )
+        parser.add_argument(
+            '--reject-rate',
+            type=float,
+            default=0.0,
+            help='Share of documents the stand-in rejects with 429'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the JSON report to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        stages = [stage.strip() for stage in options['stages'].split(',') if stage.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+        try:
+            report = run(
+                Settings(),
+                stages,
+                limit=options['limit'],
+                sample_size=options['sample_size'],
+                load_docs=options['load_docs'],
+                es_url=options['es_url'],
+                reject_rate=options['reject_rate'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
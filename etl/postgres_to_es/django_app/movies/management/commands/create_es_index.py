@@ -1,84 +1,33 @@
-from django.core.management.base import BaseCommand
-from elasticsearch import Elasticsearch, exceptions as es_errors
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from elasticsearch import exceptions as es_errors
 import backoff
 import json
 
+from movies.etl.resources import es_client
+from movies.index_profiles import (
+    DEFAULT_PROFILE, INDEX_PROPERTIES, PROFILES, dynamic_settings, get_profile, index_body
+)
+from movies.models import Movie
+
 INDEX_NAME = 'movies'
-INDEX_BODY = {
-    "settings": {
-        "refresh_interval": "1s",
-        "analysis": {
-            "filter": {
-                "english_stop": {"type": "stop", "stopwords": "_english_"},
-                "english_stemmer": {"type": "stemmer", "language": "english"},
-                "english_possessive_stemmer": {"type": "stemmer", "language": "possessive_english"},
-                "russian_stop": {"type": "stop", "stopwords": "_russian_"},
-                "russian_stemmer": {"type": "stemmer", "language": "russian"}
-            },
-            "analyzer": {
-                "ru_en": {
-                    "tokenizer": "standard",
-                    "filter": [
-                        "lowercase",
-                        "english_stop",
-                        "english_stemmer",
-                        "english_possessive_stemmer",
-                        "russian_stop",
-                        "russian_stemmer"
-                    ]
-                }
-            }
-        }
-    },
-    "mappings": {
-        "dynamic": "strict",
-        "properties": {
-            "id": {"type": "keyword"},
-            "imdb_rating": {"type": "float"},
-            "genres": {"type": "keyword"},
-            "title": {
-                "type": "text",
-                "analyzer": "ru_en",
-                "fields": {"raw": {"type": "keyword"}}
-            },
-            "description": {"type": "text", "analyzer": "ru_en"},
-            "directors_names": {"type": "text", "analyzer": "ru_en"},
-            "actors_names": {"type": "text", "analyzer": "ru_en"},
-            "writers_names": {"type": "text", "analyzer": "ru_en"},
-            "directors": {
-                "type": "nested",
-                "dynamic": "strict",
-                "properties": {
-                    "id": {"type": "keyword"},
-                    "name": {"type": "text", "analyzer": "ru_en"}
-                }
-            },
-            "actors": {
-                "type": "nested",
-                "dynamic": "strict",
-                "properties": {
-                    "id": {"type": "keyword"},
-                    "name": {"type": "text", "analyzer": "ru_en"}
-                }
-            },
-            "writers": {
-                "type": "nested",
-                "dynamic": "strict",
-                "properties": {
-                    "id": {"type": "keyword"},
-                    "name": {"type": "text", "analyzer": "ru_en"}
-                }
-            }
-        }
-    }
-}
+VERSION_PATTERN = re.compile(rf'^{INDEX_NAME}_v(\d+)$')
+
+# Профиль на время полной загрузки: без refresh, реплик и fsync на каждый запрос
+BULK_LOAD_PROFILE = 'bulk-load'
+
 
 class Command(BaseCommand):
-    help = 'Create Elasticsearch movies index with full mapping'
+    help = 'Create an Elasticsearch index (movies, persons or genres) with full mapping'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.es = Elasticsearch(['http://localhost:9200'])
+        self.es = es_client(['http://localhost:9200'])
 
     @backoff.on_exception(
         backoff.expo,
@@ -87,28 +36,54 @@ class Command(BaseCommand):
         max_time=30
     )
     def handle(self, *args, **options):
+        try:
+            profile = get_profile(options['profile'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['replicas'] is not None:
+            profile = profile._replace(replicas=options['replicas'])
+        index = options['index']
+        docs = options['expected_docs']
+        if docs is None:
+            # Объём проекций persons и genres по умолчанию не оцениваем: им хватает шарда
+            docs = Movie.objects.count() if index == INDEX_NAME else 0
+
+        if options['reindex']:
+            if index != INDEX_NAME:
+                raise CommandError('--reindex is only supported for the movies index')
+            self.reindex(options['retain'], profile, docs)
+            return
+
+        if self.es.indices.exists_alias(name=index):
+            # После --reindex имя индекса — алиас: delete/create по нему не работают
+            if not options['force']:
+                self.stdout.write(self.style.WARNING(f'Index {index} already exists'))
+                return
+            self.recreate_behind_alias(index, profile, docs, options['retain'])
+            return
+
         try:
             # Проверка существования индекса
-            if self.es.indices.exists(index=INDEX_NAME):
+            if self.es.indices.exists(index=index):
                 if options['force']:
-                    self.stdout.write(self.style.WARNING(f'Deleting existing index: {INDEX_NAME}'))
-                    self.es.indices.delete(index=INDEX_NAME)
+                    self.stdout.write(self.style.WARNING(f'Deleting existing index: {index}'))
+                    self.es.indices.delete(index=index)
                 else:
-                    self.stdout.write(self.style.WARNING(f'Index {INDEX_NAME} already exists'))
+                    self.stdout.write(self.style.WARNING(f'Index {index} already exists'))
                     return
 
             # Создание индекса
             self.es.indices.create(
-                index=INDEX_NAME,
-                body=INDEX_BODY,
+                index=index,
+                body=index_body(profile, docs, index),
                 ignore=400
             )
 
             # Проверка создания
-            if self.es.indices.exists(index=INDEX_NAME):
-                self.stdout.write(self.style.SUCCESS(f'Successfully created index: {INDEX_NAME}'))
+            if self.es.indices.exists(index=index):
+                self.stdout.write(self.style.SUCCESS(f'Successfully created index: {index}'))
                 self.stdout.write(json.dumps(
-                    self.es.indices.get_mapping(index=INDEX_NAME),
+                    self.es.indices.get_mapping(index=index),
                     indent=2
                 ))
             else:
@@ -120,9 +95,151 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.NOTICE('Use --force to overwrite existing index'))
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            choices=list(INDEX_PROPERTIES),
+            default=INDEX_NAME,
+            help='Index to create: movies or one of its projections'
+        )
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force recreate index if exists'
+            help='Force recreate index if exists (behind the alias after --reindex)'
+        )
+        parser.add_argument(
+            '--reindex',
+            action='store_true',
+            help='Build a new versioned index and swap the alias without downtime'
+        )
+        parser.add_argument(
+            '--retain',
+            type=int,
+            default=2,
+            help='Number of versioned indices to keep after --reindex'
+        )
+        parser.add_argument(
+            '--replicas',
+            type=int,
+            default=None,
+            help='Override the replica count of the chosen profile'
+        )
+        parser.add_argument(
+            '--profile',
+            choices=list(PROFILES),
+            default=DEFAULT_PROFILE,
+            help='Index profile defining shards, mapping options and refresh settings'
         )
+        parser.add_argument(
+            '--expected-docs',
+            type=int,
+            default=None,
+            help='Catalogue size used to size shards (defaults to the film count in Postgres)'
+        )
+
+    def next_version(self):
+        existing = self.versions()
+        return f'{INDEX_NAME}_v{(existing[-1] if existing else 0) + 1}'
+
+    def recreate_behind_alias(self, index, profile, docs, retain):
+        """Пустое новое поколение индекса с атомарной сменой алиаса"""
+        if index != INDEX_NAME:
+            raise CommandError(f'Alias {index} is not managed by this command')
+        new_index = self.next_version()
+        self.es.indices.create(index=new_index, body=index_body(profile, docs, index))
+        self.swap_alias(new_index)
+        self.drop_old_versions(retain)
+        self.stdout.write(self.style.SUCCESS(
+            f'Alias {INDEX_NAME} now points to empty index {new_index}'
+        ))
+
+    def versions(self):
+        """Номера существующих версий индекса по возрастанию"""
+        found = []
+        for name in self.es.indices.get(index=f'{INDEX_NAME}_v*'):
+            match = VERSION_PATTERN.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def reindex(self, retain, profile, docs):
+        """Полная перезагрузка в новую версию индекса с атомарной сменой алиаса"""
+        # ETL-модуль читает настройки Postgres из окружения при импорте Settings
+        from .sync_data_main import (
+            NIL_UUID, BulkLoader, Settings, State, fetch_data_from_pg, transform_data
+        )
+
+        if retain < 1:
+            raise CommandError('--retain must be at least 1')
+
+        new_index = self.next_version()
+        # Статическая часть — от целевого профиля, динамическая — на время загрузки
+        body = index_body(profile, docs)
+        body['settings'].update(dynamic_settings(PROFILES[BULK_LOAD_PROFILE]))
+        self.es.indices.create(index=new_index, body=body)
+        self.stdout.write(f'Created {new_index}, loading documents...')
+
+        settings = Settings()
+        started = timezone.now()
+        fd, state_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(state_path)
+        try:
+            state = State(state_path)
+            total = 0
+            with BulkLoader(self.es, settings) as loader:
+                for batch in fetch_data_from_pg(state, settings):
+                    loader.submit(transform_data(batch, index=new_index))
+                    total += len(batch)
+            self.stdout.write(f'Loaded {total} documents into {new_index}')
+
+            self.finalize(new_index, profile)
+            self.swap_alias(new_index)
+
+            # Правки, сделанные во время загрузки, дописываем уже через алиас
+            state.last_modified = started - timedelta(minutes=1)
+            state.last_id = NIL_UUID
+            with BulkLoader(self.es, settings) as loader:
+                for batch in fetch_data_from_pg(state, settings):
+                    loader.submit(transform_data(batch, index=INDEX_NAME))
+        except Exception:
+            if not self.es.indices.exists_alias(name=INDEX_NAME, index=new_index):
+                self.es.indices.delete(index=new_index, ignore=404)
+            raise
+        finally:
+            if os.path.exists(state_path):
+                os.remove(state_path)
+
+        self.drop_old_versions(retain)
+        self.stdout.write(self.style.SUCCESS(f'Alias {INDEX_NAME} now points to {new_index}'))
+
+    def finalize(self, index, profile):
+        """Перевод индекса на динамические настройки профиля после загрузки"""
+        self.es.indices.refresh(index=index)
+        # Слияние до появления реплик, чтобы копировать уже слитые сегменты
+        self.es.indices.forcemerge(index=index, max_num_segments=1, request_timeout=3600)
+        self.es.indices.put_settings(
+            index=index,
+            body=dynamic_settings(profile),
+        )
+        self.es.cluster.health(index=index, wait_for_status='yellow', request_timeout=600)
+
+    def swap_alias(self, new_index):
+        """Атомарное переключение алиаса на новую версию"""
+        actions = [{"add": {"index": new_index, "alias": INDEX_NAME}}]
+        if self.es.indices.exists_alias(name=INDEX_NAME):
+            for old_index in self.es.indices.get_alias(name=INDEX_NAME):
+                actions.insert(0, {"remove": {"index": old_index, "alias": INDEX_NAME}})
+        elif self.es.indices.exists(index=INDEX_NAME):
+            # Первый переход: обычный индекс movies заменяется алиасом
+            actions.insert(0, {"remove_index": {"index": INDEX_NAME}})
+        self.es.indices.update_aliases(body={"actions": actions})
+
+    def drop_old_versions(self, retain):
+        """Удаление версий сверх retain, кроме той, на которую указывает алиас"""
+        live = set(self.es.indices.get_alias(name=INDEX_NAME))
+        for version in self.versions()[:-retain]:
+            name = f'{INDEX_NAME}_v{version}'
+            if name not in live:
+                self.stdout.write(self.style.WARNING(f'Deleting old index: {name}'))
+                self.es.indices.delete(index=name)
 
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.etl.snapshot import SOURCES, es_items, export, pg_items
+from .sync_data_main import Settings, get_es_connection
+
+
+class Command(BaseCommand):
+    help = 'Export movie documents into compressed NDJSON bulk files with a manifest'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            help='Directory for the chunk files and manifest.json'
+        )
+        parser.add_argument(
+            '--source',
+            choices=SOURCES,
+            default='pg',
+            help='Build documents from Postgres or scroll the live index'
+        )
+        parser.add_argument(
+            '--index',
+            default='movies',
+            help='Index (or alias) scrolled by --source es'
+        )
+        parser.add_argument(
+            '--chunk-docs',
+            type=int,
+            default=50_000,
+            help='Documents per chunk file'
+        )
+        parser.add_argument(
+            '--level',
+            type=int,
+            choices=range(1, 10),
+            default=6,
+            help='gzip compression level'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+        es = None
+        if options['source'] == 'es':
+            es = get_es_connection(settings)
+            items = es_items(es, options['index'])
+        else:
+            items = pg_items(settings)
+
+        try:
+            manifest = export(
+                items,
+                options['directory'],
+                options['source'],
+                chunk_docs=options['chunk_docs'],
+                level=options['level'],
+                index=options['index'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if es is not None:
+                es.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {manifest['docs']} documents in {len(manifest['chunks'])} chunks "
+            f"to {options['directory']}"
+        ))
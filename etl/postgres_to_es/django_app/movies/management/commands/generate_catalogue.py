@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.etl.catalogue import generate
+from .sync_data_main import Settings, pg_connection
+
+
+class Command(BaseCommand):
+    help = 'Fill an empty database with a deterministic synthetic catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--films',
+            type=int,
+            default=10_000,
+            help='Number of film works, e.g. 10000 to 5000000'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed; the same seed yields the same catalogue'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with pg_connection(Settings()) as conn:
+                counts = generate(conn, options['films'], options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: {count}')
+        self.stdout.write(self.style.SUCCESS('Catalogue generated'))
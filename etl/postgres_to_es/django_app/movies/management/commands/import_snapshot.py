@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.etl.snapshot import restore
+from movies.index_profiles import DEFAULT_PROFILE, PROFILES
+from .sync_data_main import Settings, get_es_connection
+
+
+class Command(BaseCommand):
+    help = 'Load a snapshot written by export_snapshot into Elasticsearch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            help='Snapshot directory containing manifest.json'
+        )
+        parser.add_argument(
+            '--index',
+            help='Target index (defaults to the index recorded in the manifest)'
+        )
+        parser.add_argument(
+            '--profile',
+            choices=list(PROFILES),
+            default=DEFAULT_PROFILE,
+            help='Profile of the created index and its settings after the load'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Concurrent bulk requests (defaults to BULK_WORKERS)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore recorded progress and load every chunk again'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+        if options['workers']:
+            settings = settings.copy(update={'bulk_workers': options['workers']})
+
+        es = get_es_connection(settings)
+        try:
+            result = restore(
+                es,
+                settings,
+                options['directory'],
+                index=options['index'],
+                profile=options['profile'],
+                resume=not options['restart'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            es.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {result['docs']} documents from {result['chunks']} chunks "
+            f"into {result['index']}"
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch import helpers
+
+from movies.etl.fingerprints import FingerprintStore, fingerprint
+from .sync_data_main import Settings, get_es_connection
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the document fingerprint cache from the movies index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Fingerprint store path (defaults to FINGERPRINT_PATH)'
+        )
+        parser.add_argument(
+            '--index',
+            default='movies',
+            help='Index or alias to scan'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+        path = options['path'] or settings.fingerprint_path
+        if not path:
+            raise CommandError('Set FINGERPRINT_PATH or pass --path')
+
+        es = get_es_connection(settings)
+        store = FingerprintStore(path, settings.fingerprint_max_entries)
+        try:
+            hits = helpers.scan(
+                es,
+                index=options['index'],
+                query={'query': {'match_all': {}}},
+                size=1000,
+            )
+            total = store.replace_all(
+                (hit['_id'], fingerprint(hit['_source'])) for hit in hits
+            )
+        finally:
+            store.close()
+            es.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} fingerprints in {path}'))
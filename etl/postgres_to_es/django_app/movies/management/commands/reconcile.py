@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from movies.etl.reconcile import reconcile
+from .sync_data_main import Settings, get_es_connection
+
+
+class Command(BaseCommand):
+    help = 'Find and repair drift between Postgres and the movies index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fanout',
+            type=int,
+            default=16,
+            help='Sub-ranges compared per mismatched range'
+        )
+        parser.add_argument(
+            '--leaf-size',
+            type=int,
+            default=1000,
+            help='Ranges with at most this many documents are diffed id by id'
+        )
+        parser.add_argument(
+            '--content',
+            action='store_true',
+            help='Also compare content hashes; changed documents narrow like missing ones'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report divergent documents without reindexing them'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+        es = get_es_connection(settings)
+        try:
+            stats = reconcile(
+                es,
+                settings,
+                fanout=options['fanout'],
+                leaf_size=options['leaf_size'],
+                content=options['content'],
+                dry_run=options['dry_run'],
+            )
+        finally:
+            es.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compared {stats['ranges']} ranges, diffed {stats['leaves']}: "
+            f"{stats['missing']} missing, {stats['extra']} extra, "
+            f"{stats['changed']} changed"
+        ))
@@ -0,0 +1,95 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.etl.deadletter import DeadLetterStore
+from movies.etl.projections import PROJECTIONS, ensure_person_script, reindex_projection
+from .sync_data_main import (
+    BulkLoader, Settings, get_es_connection, pg_connection, reindex_film_works
+)
+
+
+class Command(BaseCommand):
+    help = 'Send documents from the dead-letter store back to Elasticsearch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Dead-letter store path (defaults to DEAD_LETTER_PATH)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Dead letters replayed per round'
+        )
+        parser.add_argument(
+            '--raw',
+            action='store_true',
+            help='Resend stored bulk actions as is instead of rebuilding from Postgres'
+        )
+        parser.add_argument(
+            '--count',
+            action='store_true',
+            help='Print the number of dead letters and exit'
+        )
+
+    def handle(self, *args, **options):
+        settings = Settings()
+        path = options['path'] or settings.dead_letter_path
+        if not path:
+            raise CommandError('Set DEAD_LETTER_PATH or pass --path')
+
+        store = DeadLetterStore(path)
+        if options['count']:
+            self.stdout.write(f'{store.count()} dead letters in {path}')
+            store.close()
+            return
+
+        # Повторно упавшие документы получают новое время и в этот запуск не попадут
+        started = time.time()
+        replayed = 0
+        es = get_es_connection(settings)
+        loader_settings = settings.copy(update={'dead_letter_path': path})
+        try:
+            with pg_connection(settings) as conn:
+                cursor = conn.cursor()
+                while True:
+                    entries = store.entries(options['batch_size'], before=started)
+                    if not entries:
+                        break
+                    with BulkLoader(es, loader_settings) as loader:
+                        if options['raw']:
+                            loader.submit_raw(entry.item for entry in entries)
+                        else:
+                            self.rebuild(es, loader, cursor, entries)
+                    store.remove(entries)
+                    replayed += len(entries)
+            left = store.count()
+        finally:
+            es.close()
+            store.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {replayed} dead letters, {left} still failing'
+        ))
+
+    def rebuild(self, es, loader, cursor, entries):
+        """Пересборка документов из Postgres в индексе, где они упали"""
+        # Сохранённое тело могло устареть, поэтому берём свежую версию
+        ids_by_index = defaultdict(set)
+        for entry in entries:
+            ids_by_index[entry.index].add(entry.id)
+        for index, ids in ids_by_index.items():
+            if index == 'movies':
+                reindex_film_works(loader, cursor, sorted(ids))
+            elif index in PROJECTIONS:
+                if index == 'persons':
+                    ensure_person_script(es)
+                reindex_projection(loader, cursor, index, ids)
+            else:
+                self.stderr.write(f'Resending {len(ids)} stored actions for index {index} as is')
+                loader.submit_raw(
+                    entry.item for entry in entries if entry.index == index
+                )
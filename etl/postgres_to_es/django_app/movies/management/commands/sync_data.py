@@ -1,42 +1,204 @@
 # sync_data.py
+import time
+from collections import deque
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django.db import transaction, OperationalError
-from elasticsearch import exceptions as es_errors
+from elasticsearch import exceptions as es_errors, helpers
+from elasticsearch_dsl.connections import connections
 import backoff
-from ...models import Movie, SyncState
+from ...models import IndexGeneration, Movie, SyncState
 from ...documents import MovieDocument
+from ...etl import metrics
+from ...etl.content_hash import content_hash_sql
+from ...index_profiles import upgrade_mapping
+
+
+class PendingKeys:
+    """Ключи (modified, id) отправленных документов в порядке отправки.
+
+    streaming_bulk возвращает повторённые после 429 документы позже
+    остальных, поэтому результат сопоставляется с отправкой по _id, а чекпоинт
+    двигается только по непрерывному префиксу подтверждённых. Фильм, изменённый
+    во время запуска, приходит со следующей страницей ещё раз: каждая отправка
+    занимает своё место в очереди, а результат подтверждает самую раннюю
+    неподтверждённую отправку этого id. После первой ошибки чекпоинт замирает,
+    и документ будет отправлен при следующем запуске.
+    """
+    def __init__(self):
+        # Отправки по порядку: [id, ключ, подтверждена]
+        self.sends = deque()
+        # Неподтверждённые отправки каждого id в порядке отправки
+        self.outstanding = {}
+        self.failed = False
+
+    def add(self, doc_id, key):
+        send = [doc_id, key, False]
+        self.sends.append(send)
+        self.outstanding.setdefault(doc_id, deque()).append(send)
+
+    def ack(self, doc_id, ok):
+        """Учёт результата; возвращает новый ключ чекпоинта или None"""
+        if not ok:
+            self.failed = True
+        if self.failed:
+            return None
+        waiting = self.outstanding[doc_id]
+        waiting.popleft()[2] = True
+        if not waiting:
+            del self.outstanding[doc_id]
+        acked_key = None
+        while self.sends and self.sends[0][2]:
+            acked_key = self.sends.popleft()[1]
+        return acked_key
+
 
 class Command(BaseCommand):
     help = 'Sync data from Postgres to Elasticsearch with resilience'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Documents per bulk request'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=10000,
+            help='Rows per keyset page (one query per page)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per round trip inside a page'
+        )
+        parser.add_argument(
+            '--checkpoint-every',
+            type=int,
+            default=5000,
+            help='Save SyncState after this many acknowledged documents'
+        )
+
     @backoff.on_exception(
         backoff.expo,
         (OperationalError, es_errors.ConnectionError),
         max_tries=10
     )
     def handle(self, *args, **options):
+        batch_size = options.get('batch_size', 500)
+        checkpoint_every = options.get('checkpoint_every', 5000)
+
         last_state = SyncState.objects.last()
-        last_id = last_state.last_processed_id if last_state else None
-        
-        qs = Movie.objects.all().order_by('id')
-        if last_id:
-            qs = qs.filter(id__gt=last_id)
+        last_key = (
+            (last_state.last_modified, last_state.last_processed_id)
+            if last_state else None
+        )
 
-        batch_size = 500
-        for offset in range(0, qs.count(), batch_size):
-            batch = qs[offset:offset+batch_size]
-            self.process_batch(batch)
+        es = connections.get_connection()
+        upgrade_mapping(es, MovieDocument._index._name)
 
-    @backoff.on_exception(
-        backoff.expo,
-        (es_errors.ConnectionError, OperationalError),
-        max_tries=5
-    )
-    def process_batch(self, batch):
-        docs = [MovieDocument(**movie.to_dict()) for movie in batch]
-        MovieDocument.bulk(docs)
-        
+        # Ключи (modified, id) отправленных, но ещё не подтверждённых документов
+        pending = PendingKeys()
+        actions = self.iter_actions(
+            last_key,
+            pending,
+            options.get('page_size', 10000),
+            options.get('chunk_size', 2000)
+        )
+        results = helpers.streaming_bulk(
+            es,
+            actions,
+            chunk_size=batch_size,
+            max_retries=5,
+            raise_on_error=False,
+        )
+
+        processed = 0
+        acked_key = None
+        started = time.monotonic()
+        for ok, item in results:
+            result = item['index']
+            key = pending.ack(result['_id'], ok)
+            if key is not None:
+                acked_key = key
+            if ok:
+                metrics.DOCUMENTS.inc(stage='bulk')
+            else:
+                error = result.get('error')
+                metrics.BULK_ERRORS.inc(
+                    reason=error.get('type') if isinstance(error, dict) else result.get('status')
+                )
+                self.stderr.write(
+                    f"Document ID: {result['_id']}, Error: {error}"
+                )
+            processed += 1
+            if processed % checkpoint_every == 0 and acked_key is not None:
+                self.save_checkpoint(acked_key)
+                self.write_metrics(processed, started)
+
+        if acked_key is not None:
+            self.save_checkpoint(acked_key)
+        if pending.failed:
+            self.stderr.write('Checkpoint stopped at the first failed document')
+        self.write_metrics(processed, started)
+        self.stdout.write(self.style.SUCCESS(f'Synced {processed} movies'))
+
+    def iter_actions(self, last_key, pending, page_size, chunk_size):
+        """Bulk-действия по фильмам с keyset-пагинацией по (modified, id)"""
+        index = MovieDocument._index._name
+        while True:
+            qs = Movie.objects.annotate(
+                content_hash=RawSQL(content_hash_sql('movies_movie.id'), ())
+            ).order_by('modified', 'id')
+            if last_key is not None:
+                last_modified, last_id = last_key
+                if last_modified is None:
+                    # Чекпоинт старого формата хранил только id
+                    qs = qs.filter(id__gt=last_id)
+                else:
+                    qs = qs.filter(
+                        Q(modified__gt=last_modified)
+                        | Q(modified=last_modified, id__gt=last_id)
+                    )
+
+            count = 0
+            for movie in qs[:page_size].iterator(chunk_size=chunk_size):
+                count += 1
+                last_key = (movie.modified, movie.id)
+                pending.add(str(movie.id), last_key)
+                yield {
+                    '_index': index,
+                    '_id': str(movie.id),
+                    '_source': movie.to_dict(),
+                }
+            if count:
+                metrics.DOCUMENTS.inc(count, stage='extract')
+                metrics.BATCH_SIZE.observe(count, stage='extract')
+            if count < page_size:
+                return
+
+    def write_metrics(self, processed, started):
+        """Снимок метрик для представления /metrics веб-процесса"""
+        elapsed = time.monotonic() - started
+        if processed and elapsed:
+            metrics.DOCS_PER_SECOND.set(processed / elapsed)
+        # Отставание считает само представление в момент запроса
+        metrics.write_snapshot(settings.ETL_METRICS_PATH, exclude=(metrics.LAG_SECONDS,))
+
+    def save_checkpoint(self, last_key):
+        last_modified, last_id = last_key
         with transaction.atomic():
             SyncState.objects.update_or_create(
-                defaults={'last_processed_id': batch.last().id}
+                defaults={
+                    'last_processed_id': last_id,
+                    'last_modified': last_modified,
+                }
             )
+            # Сброс кэша ответов API поиска
+            IndexGeneration.bump()
@@ -1,15 +1,29 @@
+import os
 import time
+import json
+import queue
+import random
 import logging
+import functools
+import threading
+from collections import deque
 from datetime import datetime, timezone
-from typing import Iterator, List, Dict
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 
 import backoff
 import psycopg2
 from elasticsearch import Elasticsearch, helpers
 from elasticsearch.exceptions import ConnectionError as ESConnectionError
+from elasticsearch.exceptions import TransportError
 from pydantic import BaseSettings, Field, AnyUrl
+from psycopg2 import sql
 from psycopg2.extras import DictCursor
 
+from movies.etl import metrics, resources
+from movies.etl.content_hash import content_hash_sql
+from movies.index_profiles import upgrade_mapping
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -22,34 +36,151 @@ class Settings(BaseSettings):
     postgres_port: int = Field(5432, env="POSTGRES_PORT")
     es_host: AnyUrl = Field("http://localhost:9200", env="ES_HOST")
     sleep_interval: int = Field(60, env="SLEEP_INTERVAL")
+    # poll — опрос раз в SLEEP_INTERVAL, notify — LISTEN/NOTIFY с опросом как запасным путём
+    change_capture: str = Field("poll", env="CHANGE_CAPTURE")
+    debounce_seconds: float = Field(0.5, env="DEBOUNCE_SECONDS")
+    debounce_max_seconds: float = Field(5.0, env="DEBOUNCE_MAX_SECONDS")
+    # full — пересборка документов фильмов, partial — скрипт переименования персоны
+    person_update_mode: str = Field("full", env="PERSON_UPDATE_MODE")
+    # Путь к SQLite с отпечатками документов; пусто — кэш выключен
+    fingerprint_path: Optional[str] = Field(None, env="FINGERPRINT_PATH")
+    fingerprint_max_entries: int = Field(5_000_000, env="FINGERPRINT_MAX_ENTRIES")
+    # single — один проход за цикл, lanes — отдельные полосы realtime и bulk
+    scheduler: str = Field("single", env="SCHEDULER")
+    realtime_workers: int = Field(1, env="REALTIME_WORKERS")
+    realtime_batch_size: int = Field(200, env="REALTIME_BATCH_SIZE")
+    realtime_interval: float = Field(1.0, env="REALTIME_INTERVAL")
+    realtime_budget_seconds: float = Field(30.0, env="REALTIME_BUDGET_SECONDS")
+    # sync — блокирующий цикл main(), async — конвейер на asyncio
+    runtime: str = Field("sync", env="ETL_RUNTIME")
+    # batch — постраничные запросы с LIMIT, stream — один проход серверным курсором,
+    # raw — серверный курсор, _source собирается в SQL и уходит в bulk байтами,
+    # split — фильмы и связи из Postgres, имена персон и жанров из LRU-кэша,
+    # document — готовые документы из поддерживаемой триггерами movies_movie
+    extract_mode: str = Field("batch", env="EXTRACT_MODE")
+    pg_itersize: int = Field(2000, env="PG_ITERSIZE")
+    batch_size: int = Field(100, env="BATCH_SIZE")
+    dimension_cache_size: int = Field(100_000, env="DIMENSION_CACHE_SIZE")
+    # join — общий GROUP BY по всем связям, lateral — агрегация по измерениям
+    query_strategy: str = Field("join", env="QUERY_STRATEGY")
+    bulk_workers: int = Field(4, env="BULK_WORKERS")
+    bulk_chunk_size: int = Field(500, env="BULK_CHUNK_SIZE")
+    bulk_max_bytes: int = Field(10 * 1024 * 1024, env="BULK_MAX_BYTES")
+    bulk_queue_size: int = Field(8, env="BULK_QUEUE_SIZE")
+    bulk_max_retries: int = Field(5, env="BULK_MAX_RETRIES")
+    # Документы, отвергнутые ES окончательно; пусто — только запись в лог
+    dead_letter_path: Optional[str] = Field("dead_letters.db", env="DEAD_LETTER_PATH")
+    # Адаптивные размеры пачек (AIMD) и их границы
+    adaptive_batching: bool = Field(False, env="ADAPTIVE_BATCHING")
+    batch_size_min: int = Field(20, env="BATCH_SIZE_MIN")
+    batch_size_max: int = Field(5000, env="BATCH_SIZE_MAX")
+    bulk_chunk_min: int = Field(50, env="BULK_CHUNK_MIN")
+    bulk_chunk_max: int = Field(5000, env="BULK_CHUNK_MAX")
+    bulk_target_latency: float = Field(2.0, env="BULK_TARGET_LATENCY")
+    pg_target_latency: float = Field(1.0, env="PG_TARGET_LATENCY")
+    rss_limit_mb: int = Field(1024, env="RSS_LIMIT_MB")
+    # Увеличивать счётчик поколений индекса для сброса кэша API поиска
+    bump_generation: bool = Field(True, env="BUMP_INDEX_GENERATION")
+    # Пул соединений Postgres, общий для проходов; простоявшие дольше
+    # PG_HEALTH_CHECK_INTERVAL секунд проверяются перед выдачей
+    pg_pool_size: int = Field(8, env="PG_POOL_SIZE")
+    pg_pool_timeout: float = Field(30.0, env="PG_POOL_TIMEOUT")
+    pg_health_check_interval: float = Field(30.0, env="PG_HEALTH_CHECK_INTERVAL")
+    # Транспорт Elasticsearch: gzip тел запросов и keep-alive соединения на узел
+    es_http_compress: bool = Field(True, env="ES_HTTP_COMPRESS")
+    es_connections_per_host: int = Field(
+        resources.ES_CONNECTIONS_PER_HOST, env="ES_CONNECTIONS_PER_HOST"
+    )
+    es_timeout: float = Field(resources.ES_TIMEOUT, env="ES_TIMEOUT")
+    # Индексы, заполняемые из одной выборки фильмов, через запятую: movies,persons,genres
+    index_projections: str = Field("movies", env="INDEX_PROJECTIONS")
+    # Порт HTTP-эндпоинта /metrics; 0 — не поднимать
+    metrics_port: int = Field(0, env="METRICS_PORT")
 
     class Config:
         env_file = ".env"
         case_sensitive = False
 
 
+NIL_UUID = '00000000-0000-0000-0000-000000000000'
+
+
 class State:
-    """Класс для управления состоянием последней обработки"""
-    def __init__(self, file_path: str = 'state.json'):
+    """Класс для управления состоянием последней обработки.
+
+    Хранит составной ключ (modified, id) последней выгруженной записи,
+    чтобы записи с одинаковым modified на границе пачки не терялись.
+    """
+    def __init__(self, file_path: Optional[str] = 'state.json'):
         self.file_path = file_path
         self.last_modified = datetime.min.replace(tzinfo=timezone.utc)
+        self.last_id = NIL_UUID
 
     def load(self) -> None:
         try:
             with open(self.file_path, 'r') as f:
-                self.last_modified = datetime.fromisoformat(f.read().strip())
-        except (FileNotFoundError, ValueError):
-            pass
+                raw = f.read().strip()
+        except FileNotFoundError:
+            return
+
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            # Старый формат: в файле только modified в isoformat
+            data = {'last_modified': raw}
+        if not isinstance(data, dict):
+            return
+
+        try:
+            self.last_modified = datetime.fromisoformat(data['last_modified'])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.last_id = data.get('last_id') or NIL_UUID
 
     def save(self) -> None:
+        if self.file_path is None:
+            return
         with open(self.file_path, 'w') as f:
-            f.write(self.last_modified.isoformat())
+            json.dump({
+                'last_modified': self.last_modified.isoformat(),
+                'last_id': self.last_id,
+            }, f)
+
+    def exists(self) -> bool:
+        return self.file_path is not None and os.path.exists(self.file_path)
+
+    def cursor(self) -> 'State':
+        """Копия позиции в памяти: курсор чтения, который не пишет файл.
+
+        Сам чекпоинт сдвигается только после подтверждения пачек из ES.
+        """
+        cursor = State(None)
+        cursor.last_modified, cursor.last_id = self.last_modified, self.last_id
+        return cursor
+
+    def key(self) -> Dict:
+        """Текущая позиция в виде строки для advance()"""
+        return {'modified': self.last_modified, 'id': self.last_id}
+
+    def child(self, name: str) -> 'State':
+        """Отдельный чекпоинт с именем name рядом с основным файлом"""
+        root, ext = os.path.splitext(self.file_path)
+        child = State(f'{root}.{name}{ext}')
+        child.load()
+        return child
+
+    def advance(self, row: Dict) -> None:
+        """Сдвиг чекпоинта на ключ (modified, id) последней строки пачки"""
+        key = (row['modified'], str(row['id']))
+        if key > (self.last_modified, self.last_id):
+            self.last_modified, self.last_id = key
+            self.save()
 
 
 @backoff.on_exception(backoff.expo, ESConnectionError, max_tries=10)
 def get_es_connection(settings: Settings) -> Elasticsearch:
     """Установка соединения с Elasticsearch"""
-    return Elasticsearch([str(settings.es_host)])
+    return resources.es_client([str(settings.es_host)], settings)
 
 
 @backoff.on_exception(backoff.expo, psycopg2.OperationalError, max_tries=10)
@@ -64,24 +195,183 @@ def get_pg_connection(settings: Settings):
     )
 
 
-def fetch_data_from_pg(
-    state: State,
-    settings: Settings,
-    batch_size: int = 100
-) -> Iterator[List[Dict]]:
-    """Извлечение данных из PostgreSQL с пагинацией"""
-    query = """
-        SELECT
-            fw.id,
-            fw.title,
-            fw.description,
-            fw.rating AS imdb_rating,
-            fw.modified,
-            COALESCE(
-                json_agg(DISTINCT jsonb_build_object('id', g.id, 'name', g.name))
-                FILTER (WHERE g.id IS NOT NULL),
+def pg_connection(settings: Settings):
+    """Соединение из пула процесса на время блока with"""
+    pool = resources.pg_pool(
+        (settings.postgres_host, settings.postgres_port, settings.postgres_db, settings.postgres_user),
+        functools.partial(get_pg_connection, settings),
+        size=settings.pg_pool_size,
+        timeout=settings.pg_pool_timeout,
+        check_interval=settings.pg_health_check_interval,
+    )
+    return pool.connection()
+
+
+FILM_WORK_FROM = """
+    FROM film_work fw
+    LEFT JOIN genre_film_work gfw ON fw.id = gfw.film_work_id
+    LEFT JOIN genre g ON gfw.genre_id = g.id
+    LEFT JOIN person_film_work pfw ON fw.id = pfw.film_work_id
+    LEFT JOIN person p ON pfw.person_id = p.id
+"""
+
+FILM_WORK_SELECT = """
+    SELECT
+        fw.id,
+        fw.title,
+        fw.description,
+        fw.rating AS imdb_rating,
+        fw.modified,
+        COALESCE(
+            json_agg(DISTINCT jsonb_build_object('id', g.id, 'name', g.name))
+            FILTER (WHERE g.id IS NOT NULL),
+            '[]'
+        ) AS genres,
+        COALESCE(
+            json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'director'),
+            '[]'
+        ) AS directors,
+        COALESCE(
+            json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'actor'),
+            '[]'
+        ) AS actors,
+        COALESCE(
+            json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+            FILTER (WHERE pfw.role = 'writer'),
+            '[]'
+        ) AS writers,
+        array_remove(
+            array_agg(DISTINCT p.full_name)
+            FILTER (WHERE pfw.role = 'director'),
+            NULL
+        ) AS directors_names,
+        array_remove(
+            array_agg(DISTINCT p.full_name)
+            FILTER (WHERE pfw.role = 'actor'),
+            NULL
+        ) AS actors_names,
+        array_remove(
+            array_agg(DISTINCT p.full_name)
+            FILTER (WHERE pfw.role = 'writer'),
+            NULL
+        ) AS writers_names,
+        """ + content_hash_sql('fw.id') + """ AS content_hash
+""" + FILM_WORK_FROM
+
+FILM_WORK_QUERY = FILM_WORK_SELECT + """
+    WHERE (fw.modified, fw.id) > (%s, %s)
+    GROUP BY fw.id, fw.modified
+    ORDER BY fw.modified, fw.id
+"""
+
+# Готовый _source документа одной текстовой колонкой — та же форма,
+# что выдаёт transform_data, но без разбора JSON на стороне Python
+FILM_WORK_SOURCE_QUERY = """
+    SELECT
+        fw.id::text AS id,
+        fw.modified,
+        json_build_object(
+            'id', fw.id,
+            'title', fw.title,
+            'imdb_rating', COALESCE(fw.rating, 0)::float,
+            'description', fw.description,
+            'genres', COALESCE(
+                array_agg(DISTINCT g.name) FILTER (WHERE g.id IS NOT NULL),
+                '{}'
+            ),
+            'directors_names', COALESCE(
+                array_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'director' AND p.full_name IS NOT NULL),
+                '{}'
+            ),
+            'actors_names', COALESCE(
+                array_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'actor' AND p.full_name IS NOT NULL),
+                '{}'
+            ),
+            'writers_names', COALESCE(
+                array_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'writer' AND p.full_name IS NOT NULL),
+                '{}'
+            ),
+            'directors', COALESCE(
+                json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'director'),
+                '[]'
+            ),
+            'actors', COALESCE(
+                json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'actor'),
                 '[]'
-            ) AS genres,
+            ),
+            'writers', COALESCE(
+                json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'writer'),
+                '[]'
+            ),
+            'content_hash', """ + content_hash_sql('fw.id') + """
+        )::text AS source
+""" + FILM_WORK_FROM + """
+    WHERE (fw.modified, fw.id) > (%s, %s)
+    GROUP BY fw.id, fw.modified
+    ORDER BY fw.modified, fw.id
+"""
+
+# Документы, которые триггеры из миграции 0003_movie_document держат
+# в актуальном состоянии: чтение — дешёвый проход по индексу (modified, id)
+# Удалённые фильмы этот запрос не видит: их строка movies_movie удаляется
+# триггером, а документ остаётся в индексе до reconcile
+MOVIE_DOCUMENT_QUERY = """
+    SELECT
+        m.id::text AS id,
+        m.modified,
+        (
+            (to_jsonb(m) - 'created_at' - 'modified')
+            || jsonb_build_object('content_hash', """ + content_hash_sql('m.id') + """)
+        )::text AS source
+    FROM movies_movie m
+    WHERE (m.modified, m.id) > (%s, %s)
+    ORDER BY m.modified, m.id
+"""
+
+FILM_WORK_BY_IDS_QUERY = FILM_WORK_SELECT + """
+    WHERE fw.id = ANY(%s::uuid[])
+    GROUP BY fw.id, fw.modified
+"""
+
+# Стратегия без декартова произведения жанров и персон: каждое измерение
+# агрегируется отдельным LATERAL-подзапросом по id фильма. Внешний запрос
+# обходится без GROUP BY, поэтому LIMIT может остановиться по индексу
+# (modified, id), не агрегируя весь хвост таблицы.
+FILM_WORK_LATERAL_SELECT = """
+    SELECT
+        fw.id,
+        fw.title,
+        fw.description,
+        fw.rating AS imdb_rating,
+        fw.modified,
+        gd.genres,
+        pd.directors,
+        pd.actors,
+        pd.writers,
+        pd.directors_names,
+        pd.actors_names,
+        pd.writers_names,
+        """ + content_hash_sql('fw.id') + """ AS content_hash
+    FROM film_work fw
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(
+            json_agg(DISTINCT jsonb_build_object('id', g.id, 'name', g.name)),
+            '[]'
+        ) AS genres
+        FROM genre_film_work gfw
+        JOIN genre g ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = fw.id
+    ) gd
+    CROSS JOIN LATERAL (
+        SELECT
             COALESCE(
                 json_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
                 FILTER (WHERE pfw.role = 'director'),
@@ -97,49 +387,366 @@ def fetch_data_from_pg(
                 FILTER (WHERE pfw.role = 'writer'),
                 '[]'
             ) AS writers,
-            array_remove(
-                array_agg(DISTINCT p.full_name)
-                FILTER (WHERE pfw.role = 'director'),
-                NULL
+            COALESCE(
+                array_agg(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'director'),
+                '{}'
             ) AS directors_names,
-            array_remove(
-                array_agg(DISTINCT p.full_name)
-                FILTER (WHERE pfw.role = 'actor'),
-                NULL
+            COALESCE(
+                array_agg(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'actor'),
+                '{}'
             ) AS actors_names,
-            array_remove(
-                array_agg(DISTINCT p.full_name)
-                FILTER (WHERE pfw.role = 'writer'),
-                NULL
+            COALESCE(
+                array_agg(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'writer'),
+                '{}'
             ) AS writers_names
-        FROM film_work fw
-        LEFT JOIN genre_film_work gfw ON fw.id = gfw.film_work_id
-        LEFT JOIN genre g ON gfw.genre_id = g.id
-        LEFT JOIN person_film_work pfw ON fw.id = pfw.film_work_id
-        LEFT JOIN person p ON pfw.person_id = p.id
-        WHERE fw.modified > %s
-        GROUP BY fw.id, fw.modified
-        ORDER BY fw.modified, fw.id
-        LIMIT %s;
+        FROM person_film_work pfw
+        JOIN person p ON p.id = pfw.person_id
+        WHERE pfw.film_work_id = fw.id
+    ) pd
+"""
+
+FILM_WORK_LATERAL_QUERY = FILM_WORK_LATERAL_SELECT + """
+    WHERE (fw.modified, fw.id) > (%s, %s)
+    ORDER BY fw.modified, fw.id
+"""
+
+FILM_WORK_LATERAL_BY_IDS_QUERY = FILM_WORK_LATERAL_SELECT + """
+    WHERE fw.id = ANY(%s::uuid[])
+"""
+
+# Запросы по стратегиям агрегации (Settings.query_strategy)
+FILM_WORK_QUERIES = {
+    'join': FILM_WORK_QUERY,
+    'lateral': FILM_WORK_LATERAL_QUERY,
+}
+
+FILM_WORK_BY_IDS_QUERIES = {
+    'join': FILM_WORK_BY_IDS_QUERY,
+    'lateral': FILM_WORK_LATERAL_BY_IDS_QUERY,
+}
+
+CHANGED_ENTITIES_QUERY = """
+    SELECT id, modified
+    FROM {table}
+    WHERE (modified, id) > (%s, %s)
+    ORDER BY modified, id
+    LIMIT %s
+"""
+
+PERSON_FILM_WORKS_QUERY = """
+    SELECT pfw.film_work_id, p.id, p.full_name
+    FROM person_film_work pfw
+    JOIN person p ON p.id = pfw.person_id
+    WHERE p.id = ANY(%s::uuid[])
+"""
+
+RENAME_PERSON_SCRIPT_ID = 'movies_rename_person'
+
+# Переписывает имя персоны во вложенных directors/actors/writers
+# и заменяет старое имя в соответствующем массиве *_names.
+RENAME_PERSON_SCRIPT = """
+    boolean changed = false;
+    for (String role : ['directors', 'actors', 'writers']) {
+        def people = ctx._source[role];
+        if (people == null) {
+            continue;
+        }
+        def names = ctx._source[role + '_names'];
+        for (def person : people) {
+            def name = params.persons[person.id];
+            if (name == null || name == person.name) {
+                continue;
+            }
+            if (names != null) {
+                int idx = names.indexOf(person.name);
+                if (idx >= 0) {
+                    names.set(idx, name);
+                } else {
+                    names.add(name);
+                }
+            }
+            person.name = name;
+            changed = true;
+        }
+    }
+    if (!changed) {
+        ctx.op = 'noop';
+    }
+"""
+
+# Таблицы, изменения которых распространяются на связанные фильмы
+ENTITY_PRODUCERS = ('person', 'genre')
+
+AFFECTED_FILM_WORKS_QUERY = """
+    SELECT film_work_id FROM person_film_work WHERE person_id = ANY(%s::uuid[])
+    UNION
+    SELECT film_work_id FROM genre_film_work WHERE genre_id = ANY(%s::uuid[])
+"""
+
+
+def observe_extract(started: float, rows: List, requested: int, tuner=None) -> None:
+    """Учёт времени и размера пачки извлечения"""
+    seconds = time.monotonic() - started
+    metrics.STAGE_SECONDS.observe(seconds, stage='extract')
+    if rows:
+        metrics.BATCH_SIZE.observe(len(rows), stage='extract')
+        metrics.DOCUMENTS.inc(len(rows), stage='extract')
+    if tuner is not None:
+        tuner.observe_query(seconds, len(rows), requested)
+
+
+def fetch_data_from_pg(
+    state: State,
+    settings: Settings,
+    batch_size: int = 100,
+    tuner=None
+) -> Iterator[List[Dict]]:
+    """Извлечение данных из PostgreSQL с пагинацией по ключу (modified, id).
+
+    С tuner (BatchTuner) размер каждой следующей пачки подбирается
+    по времени запроса и памяти процесса.
     """
+    if settings.extract_mode == 'stream':
+        yield from stream_data_from_pg(state, settings, batch_size, tuner)
+        return
+    if settings.extract_mode == 'split':
+        from movies.etl.dimensions import fetch_split_from_pg
+        yield from fetch_split_from_pg(state, settings, batch_size)
+        return
+
+    query = FILM_WORK_QUERIES[settings.query_strategy] + 'LIMIT %s'
 
-    with get_pg_connection(settings) as conn:
+    with pg_connection(settings) as conn:
         cursor = conn.cursor()
         while True:
-            cursor.execute(query, (state.last_modified, batch_size))
+            if tuner is not None:
+                batch_size = tuner.batch.value
+            started = time.monotonic()
+            cursor.execute(
+                query, (state.last_modified, state.last_id, batch_size)
+            )
             rows = cursor.fetchall()
+            observe_extract(started, rows, batch_size, tuner)
             if not rows:
                 break
 
-            max_modified = max(row['modified'] for row in rows)
-            if max_modified > state.last_modified:
-                state.last_modified = max_modified
-                state.save()
-
+            state.advance(rows[-1])
             yield rows
 
 
-def transform_data(rows: List[Dict]) -> Iterator[Dict]:
+def stream_data_from_pg(
+    state: State,
+    settings: Settings,
+    batch_size: int = 100,
+    tuner=None
+) -> Iterator[List[Dict]]:
+    """Потоковое извлечение данных одним запросом через серверный курсор"""
+    with pg_connection(settings) as conn:
+        # Именованный курсор: запрос планируется и агрегируется один раз,
+        # а строки подтягиваются с сервера порциями по itersize
+        cursor = conn.cursor(name='film_work_stream')
+        cursor.itersize = settings.pg_itersize
+        try:
+            cursor.execute(
+                FILM_WORK_QUERIES[settings.query_strategy],
+                (state.last_modified, state.last_id)
+            )
+            rows_iter = iter(cursor)
+            while True:
+                if tuner is not None:
+                    batch_size = tuner.batch.value
+                started = time.monotonic()
+                rows = list(islice(rows_iter, batch_size))
+                observe_extract(started, rows, batch_size, tuner)
+                if not rows:
+                    break
+
+                state.advance(rows[-1])
+                yield rows
+        finally:
+            cursor.close()
+
+
+def raw_bulk_item(doc_id: bytes, source: bytes, index: str = 'movies') -> bytes:
+    """Строки NDJSON для _bulk из готового JSON документа"""
+    return b''.join((
+        b'{"index":{"_index":"', index.encode('utf-8'), b'","_id":"', doc_id,
+        b'"}}\n', source, b'\n',
+    ))
+
+
+def fetch_raw_from_pg(
+    state: State,
+    settings: Settings,
+    batch_size: int = 100,
+    query: str = FILM_WORK_SOURCE_QUERY
+) -> Iterator[List[bytes]]:
+    """Потоковое извлечение готовых bulk-строк без разбора JSON в Python"""
+    with pg_connection(settings) as conn:
+        cursor = conn.cursor(
+            name='film_work_raw', cursor_factory=psycopg2.extensions.cursor
+        )
+        # Текстовые колонки приходят байтами, без декодирования в str
+        psycopg2.extensions.register_type(psycopg2.extensions.BYTES, cursor)
+        cursor.itersize = settings.pg_itersize
+        try:
+            cursor.execute(query, (state.last_modified, state.last_id))
+            rows_iter = iter(cursor)
+            while True:
+                started = time.monotonic()
+                rows = list(islice(rows_iter, batch_size))
+                observe_extract(started, rows, batch_size)
+                if not rows:
+                    break
+
+                doc_id, modified, _ = rows[-1]
+                state.advance({'modified': modified, 'id': doc_id.decode('ascii')})
+                yield [raw_bulk_item(doc_id, source) for doc_id, _, source in rows]
+        finally:
+            cursor.close()
+
+
+def fetch_film_works_by_ids(
+    cursor,
+    ids: List[str],
+    strategy: str = 'join'
+) -> List[Dict]:
+    """Выборка документов фильмов по списку id"""
+    cursor.execute(FILM_WORK_BY_IDS_QUERIES[strategy], (list(ids),))
+    return cursor.fetchall()
+
+
+def resolve_affected_film_works(
+    cursor,
+    person_ids: Iterable[str] = (),
+    genre_ids: Iterable[str] = ()
+) -> List[str]:
+    """id фильмов, связанных с изменёнными персонами и жанрами"""
+    cursor.execute(
+        AFFECTED_FILM_WORKS_QUERY, (list(person_ids), list(genre_ids))
+    )
+    return [str(row[0]) for row in cursor.fetchall()]
+
+
+def reindex_film_works(
+    loader: 'BulkLoader',
+    cursor,
+    ids: Iterable[str],
+    batch_size: int = 100,
+    projections=None
+) -> int:
+    """Переиндексация фильмов по id; отсутствующие в Postgres удаляются из ES"""
+    ids = list(ids)
+    total = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        rows = fetch_film_works_by_ids(
+            cursor, chunk, loader.settings.query_strategy
+        )
+        found = {str(row['id']) for row in rows}
+        loader.submit(transform_data(rows))
+        if projections is not None:
+            projections.submit(rows)
+        loader.submit(
+            {'_op_type': 'delete', '_index': 'movies', '_id': film_work_id}
+            for film_work_id in chunk if film_work_id not in found
+        )
+        total += len(chunk)
+    return total
+
+
+def ensure_scripts(es: Elasticsearch) -> None:
+    """Сохранение painless-скриптов частичного обновления в кластере"""
+    es.put_script(
+        id=RENAME_PERSON_SCRIPT_ID,
+        body={'script': {'lang': 'painless', 'source': RENAME_PERSON_SCRIPT}},
+    )
+
+
+def person_rename_actions(cursor, person_ids: List[str]) -> List[Dict]:
+    """Частичные update-действия с новыми именами персон для их фильмов"""
+    cursor.execute(PERSON_FILM_WORKS_QUERY, (person_ids,))
+    persons_by_film: Dict[str, Dict[str, str]] = {}
+    for film_work_id, person_id, full_name in cursor.fetchall():
+        persons_by_film.setdefault(str(film_work_id), {})[str(person_id)] = full_name
+    return [
+        {
+            '_op_type': 'update',
+            '_index': 'movies',
+            '_id': film_work_id,
+            'script': {
+                'id': RENAME_PERSON_SCRIPT_ID,
+                'params': {'persons': persons},
+            },
+        }
+        for film_work_id, persons in persons_by_film.items()
+    ]
+
+
+def produce_entity_changes(
+    loader: 'BulkLoader',
+    cursor,
+    table: str,
+    state: State,
+    batch_size: int = 100,
+    partial: bool = False,
+    projections=None
+) -> int:
+    """Переиндексация фильмов, чьи персоны или жанры изменились после чекпоинта.
+
+    С partial=True изменения персон отправляются update-скриптом,
+    который переписывает только имена, без пересборки документа;
+    в проекции persons обновляется только full_name.
+    """
+    if not state.exists():
+        # Первый запуск: прошлые правки уже покрыты проходом по film_work
+        cursor.execute(
+            sql.SQL('SELECT max(modified) FROM {}').format(sql.Identifier(table))
+        )
+        latest = cursor.fetchone()[0]
+        if latest is not None:
+            state.last_modified = latest
+        state.save()
+
+    query = sql.SQL(CHANGED_ENTITIES_QUERY).format(table=sql.Identifier(table))
+    position = state.cursor()
+    total = 0
+    while True:
+        cursor.execute(query, (position.last_modified, position.last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        position.advance(rows[-1])
+        ids = [str(row['id']) for row in rows]
+        if partial and table == 'person':
+            actions = person_rename_actions(cursor, ids)
+            loader.submit(actions)
+            if projections is not None:
+                projections.rename_persons({
+                    person_id: name
+                    for action in actions
+                    for person_id, name in action['script']['params']['persons'].items()
+                })
+            total += len(actions)
+        else:
+            film_work_ids = resolve_affected_film_works(
+                cursor,
+                person_ids=ids if table == 'person' else (),
+                genre_ids=ids if table == 'genre' else (),
+            )
+            total += reindex_film_works(
+                loader, cursor, film_work_ids, batch_size, projections
+            )
+        checkpoint = functools.partial(state.advance, position.key())
+        if projections is not None:
+            projections.after(loader, checkpoint)
+        else:
+            loader.after(checkpoint)
+    return total
+
+
+def transform_data(rows: List[Dict], index: str = 'movies') -> Iterator[Dict]:
     """Трансформация данных для Elasticsearch"""
     for row in rows:
         doc = {
@@ -163,26 +770,33 @@ def transform_data(rows: List[Dict]) -> Iterator[Dict]:
                 {'id': str(w['id']), 'name': w['name']}
                 for w in row['writers'] if w.get('id')
             ],
+            'content_hash': row.get('content_hash'),
         }
         yield {
-            '_index': 'movies',
+            '_index': index,
             '_id': doc['id'],
             '_source': doc
         }
 
 
 @backoff.on_exception(backoff.expo, ESConnectionError, max_tries=10)
-def load_to_es(es: Elasticsearch, data: Iterator[Dict]) -> bool:
+def _bulk(es: Elasticsearch, actions: List[Dict]):
+    # Список, а не генератор: повторная попытка должна отправить те же действия
+    return helpers.bulk(es, actions, stats_only=False, raise_on_error=False)
+
+
+def load_to_es(es: Elasticsearch, data: Iterable[Dict]) -> bool:
     """Загрузка данных в Elasticsearch с обработкой ошибок"""
     try:
-        success_count, errors = helpers.bulk(es, data, stats_only=False)
+        success_count, errors = _bulk(es, list(data))
 
         if errors:
             logger.error(f"Failed to index {len(errors)} documents:")
             for error in errors:
+                op_result = next(iter(error.values()))
                 logger.error(
-                    f"Document ID: {error['index']['_id']}, "
-                    f"Error: {error['index']['error']['reason']}"
+                    f"Document ID: {op_result['_id']}, "
+                    f"Error: {op_result['error']['reason']}"
                 )
 
         logger.info(f"Successfully indexed {success_count} documents")
@@ -193,6 +807,457 @@ def load_to_es(es: Elasticsearch, data: Iterator[Dict]) -> bool:
         return False
 
 
+UPDATE_BODY_KEYS = ('doc', 'script', 'upsert', 'doc_as_upsert')
+
+
+def serialize_action(action: Dict) -> bytes:
+    """Сериализация действия в строки NDJSON для _bulk"""
+    op_type = action.get('_op_type', 'index')
+    meta = {op_type: {'_index': action['_index'], '_id': action['_id']}}
+    if op_type == 'delete':
+        return (json.dumps(meta) + '\n').encode('utf-8')
+    if op_type == 'update':
+        meta[op_type]['retry_on_conflict'] = 3
+        body = {key: action[key] for key in UPDATE_BODY_KEYS if key in action}
+    else:
+        body = action['_source']
+    return (
+        json.dumps(meta) + '\n'
+        + json.dumps(body, ensure_ascii=False) + '\n'
+    ).encode('utf-8')
+
+
+def chunk_actions(
+    actions: Iterable[Dict],
+    chunk_size: int,
+    max_bytes: int
+) -> Iterator[List[bytes]]:
+    """Нарезка действий на пачки, ограниченные числом документов и байтами"""
+    return chunk_items(
+        (serialize_action(action) for action in actions), chunk_size, max_bytes
+    )
+
+
+def chunk_items(
+    items: Iterable[bytes],
+    chunk_size: int,
+    max_bytes: int
+) -> Iterator[List[bytes]]:
+    """Нарезка сериализованных bulk-строк на пачки"""
+    chunk: List[bytes] = []
+    size = 0
+    for item in items:
+        if chunk and (len(chunk) >= chunk_size or size + len(item) > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += len(item)
+    if chunk:
+        yield chunk
+
+
+def chunk_ids(chunk: List[bytes]) -> List[str]:
+    """id документов пачки из служебных строк NDJSON"""
+    ids = []
+    for item in chunk:
+        meta = json.loads(item[:item.index(b'\n')])
+        ids.append(next(iter(meta.values()))['_id'])
+    return ids
+
+
+# Статусы перегрузки и недоступности шарда: документ стоит отправить повторно
+RETRYABLE_STATUSES = (429, 503)
+
+
+def is_retryable(error: TransportError) -> bool:
+    """Ошибка запроса, после которой пачку стоит отправить повторно.
+
+    ConnectionError и ConnectionTimeout приходят со статусом 'N/A':
+    узел недоступен или не ответил вовремя, это тоже временный сбой.
+    """
+    return isinstance(error, ESConnectionError) or error.status_code in RETRYABLE_STATUSES
+
+
+def error_reason(error: TransportError) -> str:
+    """Значение метки reason для BULK_ERRORS по ошибке запроса"""
+    if isinstance(error, ESConnectionError):
+        return 'connection'
+    return f'http_{error.status_code}'
+
+
+def count_rejected(response: Dict) -> int:
+    """Число документов, отклонённых ES из-за перегрузки (429)"""
+    return sum(
+        1 for result in response['items']
+        if next(iter(result.values())).get('status') == 429
+    )
+
+
+class WorkerStats:
+    """Счётчики пропускной способности одного bulk-воркера"""
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.retries = 0
+        self.busy = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.busy if self.busy else 0.0
+
+
+class BulkLoader:
+    """Конкурентная загрузка в Elasticsearch с противодавлением.
+
+    Пачки попадают в ограниченную очередь, которую разбирают N потоков.
+    Когда ES отвечает 429, воркеры ждут, очередь заполняется и submit()
+    блокирует извлечение из Postgres, пока кластер не разгрузится.
+
+    Каждая пачка получает порядковый номер; after() откладывает действие
+    (обычно сохранение чекпоинта) до подтверждения всех пачек, поставленных
+    в очередь раньше. Документы с постоянными ошибками уходят в dead-letter
+    хранилище и подтверждению не мешают.
+    """
+    _STOP = object()
+
+    def __init__(
+        self,
+        es: Elasticsearch,
+        settings: Settings,
+        fingerprints=None,
+        tuner=None
+    ):
+        self.es = es
+        self.settings = settings
+        # BatchTuner: подбирает число документов в bulk-запросе
+        self.tuner = tuner
+        # FingerprintStore: отсекает документы, не изменившиеся с прошлой отправки
+        self.fingerprints = fingerprints
+        self.dead_letters = None
+        if settings.dead_letter_path:
+            from movies.etl.deadletter import DeadLetterStore
+            self.dead_letters = DeadLetterStore(settings.dead_letter_path)
+        self.generation = None
+        if settings.bump_generation:
+            from movies.etl.generation import GenerationCounter
+            self.generation = GenerationCounter(settings)
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.bulk_queue_size)
+        self.stats = [
+            WorkerStats(f'bulk-{i}') for i in range(max(settings.bulk_workers, 1))
+        ]
+        self._threads: List[threading.Thread] = []
+        self._error: Optional[BaseException] = None
+        # Номера пачек: выданные, подтверждённые и граница непрерывного префикса
+        self._ack_lock = threading.Lock()
+        self._issued = 0
+        self._acked = set()
+        self._watermark = 0
+        self._waiters: deque = deque()
+
+    def start(self) -> 'BulkLoader':
+        for stats in self.stats:
+            thread = threading.Thread(
+                target=self._run, args=(stats,), name=stats.name, daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def chunk_size(self) -> int:
+        if self.tuner is not None:
+            return self.tuner.bulk.value
+        return self.settings.bulk_chunk_size
+
+    def submit(self, actions: Iterable[Dict]) -> None:
+        """Постановка действий в очередь; блокируется при заполненной очереди"""
+        hashes = None
+        if self.fingerprints is not None:
+            hashes = {}
+            actions = self.fingerprints.filter(actions, hashes)
+        for chunk in chunk_actions(
+            actions, self.chunk_size, self.settings.bulk_max_bytes
+        ):
+            self._put(chunk, hashes)
+
+    def submit_raw(self, items: Iterable[bytes]) -> None:
+        """Постановка уже сериализованных bulk-строк; кэш отпечатков не применяется"""
+        for chunk in chunk_items(
+            items, self.chunk_size, self.settings.bulk_max_bytes
+        ):
+            self._put(chunk)
+
+    def after(self, callback: Callable[[], None]) -> None:
+        """Вызов callback, когда все поставленные до этого пачки подтверждены"""
+        with self._ack_lock:
+            if self._watermark >= self._issued:
+                callback()
+            else:
+                self._waiters.append((self._issued, callback))
+
+    def flush(self) -> None:
+        """Ожидание подтверждения всех поставленных в очередь пачек"""
+        self.queue.join()
+        if self.generation is not None:
+            self.generation.flush()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        """Ожидание отправки всех пачек и вывод статистики по воркерам"""
+        for _ in self._threads:
+            self.queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for stats in self.stats:
+            logger.info(
+                f"{stats.name}: {stats.docs} docs, {stats.bytes} bytes, "
+                f"{stats.errors} errors, {stats.retries} retries, "
+                f"{stats.docs_per_sec:.0f} docs/s"
+            )
+        if self.dead_letters is not None:
+            self.dead_letters.close()
+        if self.generation is not None:
+            self.generation.close()
+        self._raise_if_failed()
+
+    def __enter__(self) -> 'BulkLoader':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, chunk: List[bytes], hashes: Optional[Dict[str, bytes]] = None) -> None:
+        self._raise_if_failed()
+        # Отпечатки документов пачки едут вместе с ней до подтверждения
+        pending = {}
+        if hashes:
+            pending = {
+                doc_id: hashes.pop(doc_id) for doc_id in chunk_ids(chunk) if doc_id in hashes
+            }
+        with self._ack_lock:
+            ticket = self._issued
+            self._issued += 1
+        self.queue.put((ticket, chunk, pending))
+
+    def _ack(self, ticket: int) -> None:
+        with self._ack_lock:
+            self._acked.add(ticket)
+            watermark = self._watermark
+            while self._watermark in self._acked:
+                self._acked.remove(self._watermark)
+                self._watermark += 1
+            while self._waiters and self._waiters[0][0] <= self._watermark:
+                _, callback = self._waiters.popleft()
+                callback()
+            advanced = self._watermark > watermark
+        if advanced and self.generation is not None:
+            self.generation.bump()
+
+    def _run(self, stats: WorkerStats) -> None:
+        while True:
+            job = self.queue.get()
+            try:
+                if job is self._STOP:
+                    return
+                self._process(*job, stats)
+            finally:
+                self.queue.task_done()
+
+    def _process(
+        self,
+        ticket: int,
+        chunk: List[bytes],
+        pending: Dict[str, bytes],
+        stats: WorkerStats
+    ) -> None:
+        if self._error is not None:
+            # После сбоя только вычерпываем очередь, чтобы не блокировать submit();
+            # пачка не подтверждается, и чекпоинт дальше неё не сдвинется
+            self._failed(chunk_ids(chunk))
+            return
+        started = time.monotonic()
+        try:
+            rejected = self._send(chunk, stats)
+        except Exception as e:
+            logger.error(f"{stats.name}: bulk request failed: {e}")
+            self._failed(chunk_ids(chunk))
+            self._error = e
+            return
+        finally:
+            stats.busy += time.monotonic() - started
+        if pending:
+            # Отпечаток сохраняем, только когда ES принял документ
+            self.fingerprints.record({
+                doc_id: value for doc_id, value in pending.items() if doc_id not in rejected
+            })
+        self._ack(ticket)
+
+    def _failed(self, ids: List[str]) -> None:
+        """Документы не попали в индекс — их отпечатки больше не актуальны"""
+        if self.fingerprints is not None and ids:
+            self.fingerprints.forget(ids)
+
+    def _dead_letter(self, failures: List[Tuple[bytes, int, str]]) -> None:
+        """Сохранение документов, которые не удалось загрузить"""
+        for item, status, reason in failures:
+            logger.error(f"Document ID: {chunk_ids([item])[0]}, Error: {reason}")
+        if self.dead_letters is not None:
+            self.dead_letters.add(failures)
+
+    def _backoff(self, attempt: int) -> None:
+        time.sleep(min(2 ** attempt, 60) * random.uniform(0.5, 1.0))
+
+    def _send(self, chunk: List[bytes], stats: WorkerStats) -> Set[str]:
+        """Отправка пачки; возвращает id документов, которые ES не принял"""
+        attempt = 0
+        rejected = set()
+        while chunk:
+            body = b''.join(chunk)
+            started = time.monotonic()
+            try:
+                response = self.es.bulk(body=body)
+            except TransportError as e:
+                metrics.BULK_ERRORS.inc(reason=error_reason(e))
+                if e.status_code == 429 and self.tuner is not None:
+                    self.tuner.observe_bulk(time.monotonic() - started, len(chunk), len(chunk))
+                if not is_retryable(e) or attempt >= self.settings.bulk_max_retries:
+                    raise
+                logger.warning(f"Bulk request failed, retrying: {e}")
+                stats.retries += 1
+                attempt += 1
+                self._backoff(attempt)
+                continue
+
+            stats.bytes += len(body)
+            elapsed = time.monotonic() - started
+            metrics.STAGE_SECONDS.observe(elapsed, stage='bulk')
+            metrics.BATCH_SIZE.observe(len(chunk), stage='bulk')
+            if self.tuner is not None:
+                self.tuner.observe_bulk(
+                    elapsed,
+                    len(chunk),
+                    count_rejected(response) if response['errors'] else 0,
+                )
+            if not response['errors']:
+                stats.docs += len(chunk)
+                metrics.DOCUMENTS.inc(len(chunk), stage='bulk')
+                return rejected
+
+            retry = []
+            failures = []
+            for item, result in zip(chunk, response['items']):
+                op_type, op_result = next(iter(result.items()))
+                status = op_result.get('status', 0)
+                if 'error' in op_result:
+                    metrics.BULK_ERRORS.inc(reason=op_result['error'].get('type', status))
+                if status in RETRYABLE_STATUSES and attempt < self.settings.bulk_max_retries:
+                    retry.append(item)
+                elif op_type == 'update' and status == 404:
+                    # Частичное обновление фильма, которого ещё нет в индексе
+                    logger.debug(f"Skipped update of missing document {op_result.get('_id')}")
+                elif 'error' in op_result:
+                    stats.errors += 1
+                    self._failed([op_result.get('_id')])
+                    rejected.add(op_result.get('_id'))
+                    failures.append((item, status, op_result['error'].get('reason')))
+                else:
+                    stats.docs += 1
+                    metrics.DOCUMENTS.inc(stage='bulk')
+
+            if failures:
+                self._dead_letter(failures)
+            if retry:
+                # Повторяем только отклонённые документы, а не всю пачку
+                stats.retries += 1
+                attempt += 1
+                self._backoff(attempt)
+            chunk = retry
+        return rejected
+
+
+def run_pass(
+    es: Elasticsearch,
+    settings: Settings,
+    state: State,
+    fingerprints=None,
+    tuner=None
+) -> int:
+    """Один проход по фильмам, изменённым после чекпоинта"""
+    from movies.etl.projections import open_projections
+
+    total_processed = 0
+    started = time.monotonic()
+    # Читаем по курсору, а чекпоинт сохраняем по мере подтверждения пачек
+    position = state.cursor()
+    with BulkLoader(es, settings, fingerprints, tuner) as loader, \
+            open_projections(es, settings) as projections:
+        if settings.extract_mode in ('raw', 'document'):
+            query = (
+                MOVIE_DOCUMENT_QUERY if settings.extract_mode == 'document'
+                else FILM_WORK_SOURCE_QUERY
+            )
+            for items in fetch_raw_from_pg(
+                position, settings, settings.batch_size, query=query
+            ):
+                loader.submit_raw(items)
+                loader.after(functools.partial(state.advance, position.key()))
+                total_processed += len(items)
+                logger.info(f"Queued batch of {len(items)} records")
+        else:
+            for batch in fetch_data_from_pg(
+                position, settings, settings.batch_size, tuner
+            ):
+                with metrics.STAGE_SECONDS.time(stage='transform'):
+                    actions = list(transform_data(batch))
+                metrics.DOCUMENTS.inc(len(actions), stage='transform')
+                loader.submit(actions)
+                projections.submit(batch)
+                projections.after(loader, functools.partial(state.advance, position.key()))
+                total_processed += len(batch)
+                logger.info(f"Queued batch of {len(batch)} records")
+
+        total_processed += run_entity_producers(loader, settings, state, projections)
+    elapsed = time.monotonic() - started
+    if total_processed and elapsed:
+        metrics.DOCS_PER_SECOND.set(total_processed / elapsed)
+    return total_processed
+
+
+def run_entity_producers(
+    loader: BulkLoader,
+    settings: Settings,
+    state: State,
+    projections=None
+) -> int:
+    """Проход продюсеров изменений персон и жанров"""
+    if settings.extract_mode == 'document':
+        # Изменения персон и жанров уже учтены триггерами в movies_movie
+        return 0
+
+    total_processed = 0
+    partial = settings.person_update_mode == 'partial'
+    if partial:
+        ensure_scripts(loader.es)
+    with pg_connection(settings) as conn:
+        cursor = conn.cursor()
+        for table in ENTITY_PRODUCERS:
+            affected = produce_entity_changes(
+                loader, cursor, table, state.child(table),
+                partial=partial, projections=projections
+            )
+            if affected:
+                logger.info(f"Queued {affected} film works affected by {table} changes")
+            total_processed += affected
+    return total_processed
+
+
 def main():
     """Основной цикл обработки"""
     try:
@@ -202,21 +1267,68 @@ def main():
         raise
 
     state = State()
+
+    if settings.metrics_port:
+        metrics.LAG_SECONDS.set_function(lambda: metrics.lag_seconds(state.last_modified))
+        metrics.serve(settings.metrics_port)
+
+    if settings.scheduler == 'lanes':
+        from movies.etl.lanes import unsupported_settings
+        problems = unsupported_settings(settings)
+        if problems:
+            raise ValueError(
+                f"SCHEDULER=lanes does not support: {', '.join(problems)}"
+            )
+
     es = get_es_connection(settings)
+    # Индекс, созданный до появления новых полей маппинга, получает их до первой записи
+    upgrade_mapping(es)
+
+    if settings.runtime == 'async':
+        es.close()
+        from movies.etl.async_engine import run, unsupported_settings
+        problems = unsupported_settings(settings)
+        if problems:
+            raise ValueError(
+                f"ETL_RUNTIME=async does not support: {', '.join(problems)}"
+            )
+        try:
+            run(settings, state)
+        except KeyboardInterrupt:
+            logger.info("ETL process stopped by user")
+        return
+
+    fingerprints = None
+    if settings.fingerprint_path:
+        from movies.etl.fingerprints import FingerprintStore
+        fingerprints = FingerprintStore(
+            settings.fingerprint_path, settings.fingerprint_max_entries
+        )
+
+    tuner = None
+    if settings.adaptive_batching:
+        from movies.etl.adaptive import BatchTuner
+        tuner = BatchTuner(settings)
 
     try:
         while True:
             state.load()
-            total_processed = 0
 
             try:
-                for batch in fetch_data_from_pg(state, settings):
-                    transformed = transform_data(batch)
-                    if load_to_es(es, transformed):
-                        total_processed += len(batch)
-                        logger.info(f"Processed batch of {len(batch)} records")
+                if settings.scheduler == 'lanes':
+                    from movies.etl.lanes import run_lanes
+                    run_lanes(es, settings, state, fingerprints)
+                    continue
+
+                if settings.change_capture == 'notify':
+                    from movies.etl.listener import listen
+                    listen(es, settings, state, fingerprints)
+                    continue
 
+                total_processed = run_pass(es, settings, state, fingerprints, tuner)
                 logger.info(f"Total processed: {total_processed}")
+                if fingerprints is not None:
+                    logger.info(f"Skipped unchanged documents: {fingerprints.skipped}")
                 logger.info(f"Next run in {settings.sleep_interval}s...")
                 time.sleep(settings.sleep_interval)
 
@@ -229,6 +1341,9 @@ def main():
     finally:
         if es:
             es.close()
+        if fingerprints is not None:
+            fingerprints.close()
+        resources.close_pools()
         logger.info("Service shutdown completed")
 
 
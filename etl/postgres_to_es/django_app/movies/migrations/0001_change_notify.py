@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Таблицы film_work, person, genre и связи не управляются Django,
+# поэтому триггеры ставятся только если таблицы уже существуют.
+TABLES = (
+    'film_work', 'person', 'genre', 'person_film_work', 'genre_film_work'
+)
+
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION etl_notify_change() RETURNS trigger AS $$
+DECLARE
+    rec record;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME IN ('film_work', 'person', 'genre') THEN
+        PERFORM pg_notify('etl_changes', TG_TABLE_NAME || ':' || rec.id::text);
+    ELSE
+        PERFORM pg_notify('etl_changes', 'film_work:' || rec.film_work_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_TRIGGER = """
+DO $$
+BEGIN
+    IF to_regclass('{table}') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS etl_notify_change ON {table};
+        CREATE TRIGGER etl_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION etl_notify_change();
+    END IF;
+END
+$$;
+"""
+
+DROP_TRIGGER = """
+DO $$
+BEGIN
+    IF to_regclass('{table}') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS etl_notify_change ON {table};
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_FUNCTION,
+            reverse_sql='DROP FUNCTION IF EXISTS etl_notify_change();',
+        ),
+    ] + [
+        migrations.RunSQL(
+            CREATE_TRIGGER.format(table=table),
+            reverse_sql=DROP_TRIGGER.format(table=table),
+        )
+        for table in TABLES
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Индексы под извлечение ETL: keyset по (modified, id), LATERAL-агрегацию
+# по id фильма и разрешение изменённых персон и жанров в фильмы.
+INDEXES = (
+    ('film_work', 'film_work_modified_id_idx', 'modified, id'),
+    ('person', 'person_modified_id_idx', 'modified, id'),
+    ('genre', 'genre_modified_id_idx', 'modified, id'),
+    ('person_film_work', 'person_film_work_film_role_idx', 'film_work_id, role, person_id'),
+    ('person_film_work', 'person_film_work_person_idx', 'person_id'),
+    ('genre_film_work', 'genre_film_work_film_genre_idx', 'film_work_id, genre_id'),
+    ('genre_film_work', 'genre_film_work_genre_idx', 'genre_id'),
+)
+
+
+def table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s)', [table])
+    return cursor.fetchone()[0] is not None
+
+
+def create_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table, name, columns in INDEXES:
+            if table_exists(cursor, table):
+                cursor.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})'
+                )
+
+
+def drop_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for _, name, _ in INDEXES:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('movies', '0001_change_notify'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
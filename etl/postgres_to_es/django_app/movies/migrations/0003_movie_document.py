@@ -0,0 +1,234 @@
+import uuid
+
+from django.db import migrations, models
+
+# Исходные таблицы не управляются Django: триггеры ставятся, только если
+# они существуют. movie_document_refresh() пересобирает строки movies_movie
+# для переданных id фильмов и удаляет строки исчезнувших фильмов.
+REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION movie_document_refresh(ids uuid[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM movies_movie m
+    WHERE m.id = ANY(ids)
+      AND NOT EXISTS (SELECT 1 FROM film_work fw WHERE fw.id = m.id);
+
+    INSERT INTO movies_movie (
+        id, title, description, imdb_rating,
+        genres, directors, actors, writers,
+        directors_names, actors_names, writers_names,
+        created_at, modified
+    )
+    SELECT
+        fw.id,
+        left(fw.title, 255),
+        COALESCE(fw.description, ''),
+        COALESCE(fw.rating, 0),
+        gd.genres,
+        pd.directors,
+        pd.actors,
+        pd.writers,
+        pd.directors_names,
+        pd.actors_names,
+        pd.writers_names,
+        now(),
+        now()
+    FROM film_work fw
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(jsonb_agg(DISTINCT g.name), '[]') AS genres
+        FROM genre_film_work gfw
+        JOIN genre g ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = fw.id
+    ) gd
+    CROSS JOIN LATERAL (
+        SELECT
+            COALESCE(
+                jsonb_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'director'),
+                '[]'
+            ) AS directors,
+            COALESCE(
+                jsonb_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'actor'),
+                '[]'
+            ) AS actors,
+            COALESCE(
+                jsonb_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'writer'),
+                '[]'
+            ) AS writers,
+            COALESCE(
+                jsonb_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'director' AND p.full_name IS NOT NULL),
+                '[]'
+            ) AS directors_names,
+            COALESCE(
+                jsonb_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'actor' AND p.full_name IS NOT NULL),
+                '[]'
+            ) AS actors_names,
+            COALESCE(
+                jsonb_agg(DISTINCT p.full_name)
+                FILTER (WHERE pfw.role = 'writer' AND p.full_name IS NOT NULL),
+                '[]'
+            ) AS writers_names
+        FROM person_film_work pfw
+        JOIN person p ON p.id = pfw.person_id
+        WHERE pfw.film_work_id = fw.id
+    ) pd
+    WHERE fw.id = ANY(ids)
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        description = EXCLUDED.description,
+        imdb_rating = EXCLUDED.imdb_rating,
+        genres = EXCLUDED.genres,
+        directors = EXCLUDED.directors,
+        actors = EXCLUDED.actors,
+        writers = EXCLUDED.writers,
+        directors_names = EXCLUDED.directors_names,
+        actors_names = EXCLUDED.actors_names,
+        writers_names = EXCLUDED.writers_names,
+        modified = EXCLUDED.modified;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Триггеры уровня оператора с переходными таблицами: массовый UPDATE
+# пересобирает затронутые документы одним вызовом, а не построчно.
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION movie_document_sync() RETURNS trigger AS $$
+DECLARE
+    ids uuid[];
+BEGIN
+    IF TG_TABLE_NAME = 'film_work' THEN
+        IF TG_OP = 'DELETE' THEN
+            SELECT array_agg(id) INTO ids FROM old_rows;
+        ELSE
+            SELECT array_agg(id) INTO ids FROM new_rows;
+        END IF;
+    ELSIF TG_TABLE_NAME IN ('person_film_work', 'genre_film_work') THEN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT film_work_id) INTO ids FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT film_work_id) INTO ids FROM old_rows;
+        ELSE
+            SELECT array_agg(DISTINCT film_work_id) INTO ids FROM (
+                SELECT film_work_id FROM new_rows
+                UNION
+                SELECT film_work_id FROM old_rows
+            ) changed;
+        END IF;
+    ELSIF TG_TABLE_NAME = 'person' THEN
+        SELECT array_agg(DISTINCT pfw.film_work_id) INTO ids
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN person_film_work pfw ON pfw.person_id = n.id
+        WHERE n.full_name IS DISTINCT FROM o.full_name;
+    ELSIF TG_TABLE_NAME = 'genre' THEN
+        SELECT array_agg(DISTINCT gfw.film_work_id) INTO ids
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN genre_film_work gfw ON gfw.genre_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name;
+    END IF;
+
+    IF ids IS NOT NULL THEN
+        PERFORM movie_document_refresh(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Переходные таблицы нельзя объявить у триггера на несколько событий,
+# поэтому на каждое событие свой триггер.
+TRIGGER_EVENTS = {
+    'film_work': ('INSERT', 'UPDATE', 'DELETE'),
+    'person_film_work': ('INSERT', 'UPDATE', 'DELETE'),
+    'genre_film_work': ('INSERT', 'UPDATE', 'DELETE'),
+    'person': ('UPDATE',),
+    'genre': ('UPDATE',),
+}
+
+TRANSITION_TABLES = {
+    'INSERT': 'NEW TABLE AS new_rows',
+    'UPDATE': 'NEW TABLE AS new_rows OLD TABLE AS old_rows',
+    'DELETE': 'OLD TABLE AS old_rows',
+}
+
+
+def table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s)', [table])
+    return cursor.fetchone()[0] is not None
+
+
+def install_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if not all(table_exists(cursor, table) for table in TRIGGER_EVENTS):
+            return
+        cursor.execute(REFRESH_FUNCTION)
+        cursor.execute(SYNC_FUNCTION)
+        for table, events in TRIGGER_EVENTS.items():
+            for event in events:
+                name = f'movie_document_{event.lower()}'
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+                cursor.execute(
+                    f'CREATE TRIGGER {name} AFTER {event} ON {table} '
+                    f'REFERENCING {TRANSITION_TABLES[event]} '
+                    f'FOR EACH STATEMENT EXECUTE FUNCTION movie_document_sync()'
+                )
+        # Первичное наполнение документов по уже существующим фильмам
+        cursor.execute('SELECT movie_document_refresh(ARRAY(SELECT id FROM film_work))')
+
+
+def uninstall_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table, events in TRIGGER_EVENTS.items():
+            if not table_exists(cursor, table):
+                continue
+            for event in events:
+                cursor.execute(
+                    f'DROP TRIGGER IF EXISTS movie_document_{event.lower()} ON {table}'
+                )
+        cursor.execute('DROP FUNCTION IF EXISTS movie_document_sync()')
+        cursor.execute('DROP FUNCTION IF EXISTS movie_document_refresh(uuid[])')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_link_table_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('imdb_rating', models.FloatField()),
+                ('genres', models.JSONField(default=list)),
+                ('directors', models.JSONField(default=list)),
+                ('actors', models.JSONField(default=list)),
+                ('writers', models.JSONField(default=list)),
+                ('directors_names', models.JSONField(blank=True, default=list)),
+                ('actors_names', models.JSONField(blank=True, default=list)),
+                ('writers_names', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modified', 'id'], name='movie_modified_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_processed_id', models.UUIDField()),
+                ('last_modified', models.DateTimeField(null=True)),
+                ('timestamp', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(install_triggers, uninstall_triggers),
+    ]
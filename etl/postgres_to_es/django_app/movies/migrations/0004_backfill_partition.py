@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_movie_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.CharField(max_length=64)),
+                ('lower_id', models.UUIDField()),
+                ('upper_id', models.UUIDField(null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], default='pending', max_length=16)),
+                ('owner', models.CharField(blank=True, max_length=255)),
+                ('lease_expires', models.DateTimeField(null=True)),
+                ('last_id', models.UUIDField(null=True)),
+                ('processed', models.BigIntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'lower_id'), name='backfill_run_lower_uniq')],
+                'indexes': [models.Index(fields=['run', 'status'], name='backfill_run_status_idx')],
+            },
+        ),
+    ]
@@ -10,10 +10,17 @@ class Movie(models.Model):
     directors = models.JSONField(default=list)
     actors = models.JSONField(default=list)
     writers = models.JSONField(default=list)
-    directors_names = models.TextField(blank=True)
-    actors_names = models.TextField(blank=True)
-    writers_names = models.TextField(blank=True)
+    directors_names = models.JSONField(default=list, blank=True)
+    actors_names = models.JSONField(default=list, blank=True)
+    writers_names = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Обновляется триггерами при любом изменении исходных таблиц
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='movie_modified_id_idx'),
+        ]
 
     def to_dict(self):
         return {
@@ -24,9 +31,59 @@ class Movie(models.Model):
             "genres": self.genres,
             "directors": self.directors,
             "actors": self.actors,
-            "writers": self.writers
+            "writers": self.writers,
+            "directors_names": self.directors_names,
+            "actors_names": self.actors_names,
+            "writers_names": self.writers_names,
+            # Аннотация запроса; у фильма, загруженного без неё, хэша нет
+            "content_hash": getattr(self, "content_hash", None)
         }
 
 class SyncState(models.Model):
     last_processed_id = models.UUIDField()
+    last_modified = models.DateTimeField(null=True)
     timestamp = models.DateTimeField(auto_now=True)
+
+
+class BackfillPartition(models.Model):
+    """Диапазон id фильмов для параллельной первичной загрузки"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUSES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done')]
+
+    run = models.CharField(max_length=64)
+    lower_id = models.UUIDField()
+    # None — диапазон открыт справа
+    upper_id = models.UUIDField(null=True)
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    owner = models.CharField(max_length=255, blank=True)
+    lease_expires = models.DateTimeField(null=True)
+    last_id = models.UUIDField(null=True)
+    processed = models.BigIntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'lower_id'], name='backfill_run_lower_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['run', 'status'], name='backfill_run_status_idx'),
+        ]
+
+
+class IndexGeneration(models.Model):
+    """Счётчик поколений индекса: ETL увеличивает его после каждой подтверждённой пачки"""
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls, name='movies'):
+        if not cls.objects.filter(name=name).update(value=models.F('value') + 1):
+            cls.objects.get_or_create(name=name, defaults={'value': 1})
+
+    @classmethod
+    def current(cls, name='movies'):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
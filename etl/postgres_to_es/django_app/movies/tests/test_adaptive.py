@@ -0,0 +1,20 @@
+from django.test import SimpleTestCase
+from ..etl.adaptive import AIMDController
+
+
+class AIMDControllerTest(SimpleTestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        controller = AIMDController('test', 100, 10, 1000, step=50)
+        controller.increase('ok')
+        self.assertEqual(controller.value, 150)
+        controller.decrease('slow')
+        self.assertEqual(controller.value, 75)
+
+    def test_value_stays_within_bounds(self):
+        controller = AIMDController('test', 5000, 10, 1000, step=50)
+        self.assertEqual(controller.value, 1000)
+        controller.increase('ok')
+        self.assertEqual(controller.value, 1000)
+        for _ in range(10):
+            controller.decrease('rejected')
+        self.assertEqual(controller.value, 10)
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl import async_engine, metrics
+from ..etl.async_engine import Checkpoint
+from ..management.commands.sync_data_main import State, serialize_action
+
+
+class CheckpointTest(SimpleTestCase):
+    def setUp(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.state = State(path)
+
+    def row(self, day: int) -> dict:
+        return {
+            'modified': datetime(2024, 1, day, tzinfo=timezone.utc),
+            'id': f'{day:08d}',
+        }
+
+    def test_out_of_order_acks_wait_for_gap(self):
+        checkpoint = Checkpoint(self.state)
+        checkpoint.ack(1, self.row(2))
+        self.assertEqual(self.state.last_modified.year, 1)
+
+        checkpoint.ack(0, self.row(1))
+        self.assertEqual(self.state.last_modified, self.row(2)['modified'])
+        self.assertEqual(checkpoint.next_seq, 2)
+
+    def test_generation_is_bumped_when_checkpoint_advances(self):
+        generation = mock.Mock()
+        checkpoint = Checkpoint(self.state, generation)
+        checkpoint.ack(1, self.row(2))
+        generation.bump.assert_not_called()
+        checkpoint.ack(0, self.row(1))
+        generation.bump.assert_called_once_with()
+
+
+class FakeAsyncES:
+    """Отвечает на bulk заранее заданными статусами документов"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    async def bulk(self, body):
+        self.bodies.append(body)
+        statuses = self.responses.pop(0)
+        items = []
+        for status in statuses:
+            result = {'_id': str(len(items)), 'status': status}
+            if status >= 400:
+                result['error'] = {'type': 'error', 'reason': f'status {status}'}
+            items.append({'index': result})
+        return {'errors': any(status >= 400 for status in statuses), 'items': items}
+
+
+class FakeDeadLetters:
+    def __init__(self):
+        self.failures = []
+
+    def add(self, failures):
+        self.failures.extend(failures)
+
+
+async def no_backoff(attempt):
+    pass
+
+
+@mock.patch.object(async_engine, 'backoff', no_backoff)
+class SendTest(SimpleTestCase):
+    settings = SimpleNamespace(bulk_max_retries=3)
+
+    def chunk(self, size: int) -> list:
+        return [
+            serialize_action({'_index': 'movies', '_id': str(i), '_source': {}})
+            for i in range(size)
+        ]
+
+    def test_unavailable_shard_is_retried(self):
+        es = FakeAsyncES([201, 503], [201])
+        indexed = asyncio.run(async_engine.send(es, self.settings, self.chunk(2)))
+        self.assertEqual(indexed, 2)
+        self.assertEqual(len(es.bodies), 2)
+
+    def test_rejected_document_goes_to_dead_letters(self):
+        dead_letters = FakeDeadLetters()
+        es = FakeAsyncES([201, 400])
+        indexed = asyncio.run(
+            async_engine.send(es, self.settings, self.chunk(2), dead_letters)
+        )
+        self.assertEqual(indexed, 1)
+        self.assertEqual([status for _, status, _ in dead_letters.failures], [400])
+
+    def test_bulk_stage_is_recorded_in_metrics(self):
+        key = metrics.DOCUMENTS._key({'stage': 'bulk'})
+        before = metrics.DOCUMENTS._values.get(key, 0)
+        es = FakeAsyncES([201, 400])
+        asyncio.run(async_engine.send(es, self.settings, self.chunk(2), FakeDeadLetters()))
+        self.assertEqual(metrics.DOCUMENTS._values[key] - before, 1)
+        self.assertIn(metrics.BULK_ERRORS._key({'reason': 'error'}), metrics.BULK_ERRORS._values)
+
+    def test_rejection_without_dead_letters_is_not_acknowledged(self):
+        es = FakeAsyncES([400])
+        with self.assertRaises(RuntimeError):
+            asyncio.run(async_engine.send(es, self.settings, self.chunk(1)))
+
+
+class UnsupportedSettingsTest(SimpleTestCase):
+    def settings(self, **overrides) -> SimpleNamespace:
+        values = dict(
+            extract_mode='stream',
+            fingerprint_path=None,
+            index_projections='movies',
+            scheduler='single',
+            change_capture='poll',
+            adaptive_batching=False,
+        )
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    def test_defaults_are_supported(self):
+        self.assertEqual(async_engine.unsupported_settings(self.settings()), [])
+
+    def test_sync_only_features_are_reported(self):
+        problems = async_engine.unsupported_settings(self.settings(
+            extract_mode='split',
+            fingerprint_path='fingerprints.db',
+            index_projections='movies,persons',
+        ))
+        self.assertEqual(problems, [
+            'EXTRACT_MODE=split', 'FINGERPRINT_PATH', 'INDEX_PROJECTIONS=movies,persons',
+        ])
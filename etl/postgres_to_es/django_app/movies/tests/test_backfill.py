@@ -0,0 +1,18 @@
+import uuid
+
+from django.test import SimpleTestCase
+from ..etl.backfill import partition_bounds
+
+
+class PartitionBoundsTest(SimpleTestCase):
+    def test_ranges_cover_uuid_space_without_gaps(self):
+        bounds = partition_bounds(4)
+        self.assertEqual(bounds[0][0], '00000000-0000-0000-0000-000000000000')
+        self.assertIsNone(bounds[-1][1])
+        for (_, upper), (lower, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(upper, lower)
+
+    def test_ranges_are_equal_sized(self):
+        lowers = [uuid.UUID(lower).int for lower, _ in partition_bounds(8)]
+        steps = {b - a for a, b in zip(lowers, lowers[1:])}
+        self.assertEqual(len(steps), 1)
@@ -0,0 +1,31 @@
+import json
+import random
+
+from django.test import SimpleTestCase
+from ..etl.bulk_standin import bulk_items
+from ..etl.catalogue import Catalogue
+
+
+class CatalogueTest(SimpleTestCase):
+    def test_same_seed_same_catalogue(self):
+        first = list(Catalogue(50, seed=7).film_works())
+        second = list(Catalogue(50, seed=7).film_works())
+        self.assertEqual(first, second)
+
+    def test_every_film_has_director_and_genre(self):
+        for rows in Catalogue(200, seed=1).film_works():
+            roles = {row[3] for row in rows['person_film_work']}
+            self.assertIn('director', roles)
+            self.assertTrue(rows['genre_film_work'])
+
+
+class BulkItemsTest(SimpleTestCase):
+    def test_delete_has_no_body_line(self):
+        body = (
+            json.dumps({'index': {'_index': 'movies', '_id': '1'}}) + '\n'
+            + json.dumps({'title': 'x'}) + '\n'
+            + json.dumps({'delete': {'_index': 'movies', '_id': '2'}}) + '\n'
+        ).encode('utf-8')
+        items = bulk_items(body, 0.0, random.Random(0))
+        self.assertEqual([next(iter(item)) for item in items], ['index', 'delete'])
+        self.assertEqual(items[0]['index']['status'], 201)
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl.bulk_standin import BulkStandin
+from ..etl.deadletter import DeadLetterStore
+from ..etl.resources import es_client
+from ..management.commands.sync_data_main import BulkLoader, Settings, chunk_ids
+
+
+def make_actions(total: int) -> list:
+    return [
+        {'_index': 'movies', '_id': str(i), '_source': {'id': str(i)}}
+        for i in range(total)
+    ]
+
+
+class BulkLoaderTest(SimpleTestCase):
+    """BulkLoader против локальной заглушки, отклоняющей половину документов с 429"""
+    def setUp(self):
+        self.standin = BulkStandin(reject_rate=0.5, seed=1).start()
+        self.addCleanup(self.standin.close)
+        self.es = es_client([self.standin.url])
+        self.addCleanup(self.es.close)
+        fd, self.dead_letter_path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.dead_letter_path)
+
+    def settings(self, **overrides) -> Settings:
+        values = dict(
+            postgres_db='movies',
+            postgres_user='app',
+            postgres_password='secret',
+            dead_letter_path=self.dead_letter_path,
+            bump_generation=False,
+            bulk_workers=2,
+            bulk_chunk_size=10,
+        )
+        values.update(overrides)
+        return Settings(**values)
+
+    def dead_letter_count(self) -> int:
+        store = DeadLetterStore(self.dead_letter_path)
+        try:
+            return store.count()
+        finally:
+            store.close()
+
+    def test_rejected_documents_land_in_dead_letters(self):
+        with BulkLoader(self.es, self.settings(bulk_max_retries=0)) as loader:
+            loader.submit(make_actions(100))
+        stats = self.standin.stats.as_dict()
+        self.assertGreater(stats['rejected'], 0)
+        self.assertEqual(stats['docs'] + stats['rejected'], 100)
+        self.assertEqual(self.dead_letter_count(), stats['rejected'])
+
+    @mock.patch.object(BulkLoader, '_backoff')
+    def test_rejected_documents_are_retried(self, _backoff):
+        with BulkLoader(self.es, self.settings(bulk_max_retries=30)) as loader:
+            loader.submit(make_actions(100))
+        self.assertEqual(self.standin.stats.as_dict()['docs'], 100)
+        self.assertEqual(sum(stats.docs for stats in loader.stats), 100)
+        self.assertEqual(self.dead_letter_count(), 0)
+
+    def test_after_waits_for_every_earlier_chunk(self):
+        release = threading.Event()
+        second_sent = threading.Event()
+        calls = []
+        loader = BulkLoader(self.es, self.settings(bulk_chunk_size=1, bulk_max_retries=0))
+        send = loader._send
+
+        def delayed_send(chunk, stats):
+            # Первая пачка задерживается, вторая успевает раньше неё
+            if chunk_ids(chunk) == ['0']:
+                release.wait(5)
+            rejected = send(chunk, stats)
+            if chunk_ids(chunk) == ['1']:
+                second_sent.set()
+            return rejected
+
+        loader._send = delayed_send
+        with loader:
+            loader.submit(make_actions(2))
+            loader.after(lambda: calls.append('acked'))
+            self.assertTrue(second_sent.wait(5))
+            self.assertEqual(calls, [])
+
+            release.set()
+            loader.flush()
+            self.assertEqual(calls, ['acked'])
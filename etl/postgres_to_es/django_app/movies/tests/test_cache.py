@@ -0,0 +1,51 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+from ..cache import ResponseCache
+
+
+class ResponseCacheTest(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(max_entries=2, ttl=60)
+        cache.get_or_compute('a', 0, lambda: 1)
+        cache.get_or_compute('b', 0, lambda: 2)
+        cache.get_or_compute('a', 0, lambda: None)
+        cache.get_or_compute('c', 0, lambda: 3)
+        self.assertEqual(cache.get_or_compute('a', 0, lambda: 'recomputed'), 1)
+        self.assertEqual(cache.get_or_compute('b', 0, lambda: 'recomputed'), 'recomputed')
+
+    def test_expired_entry_is_recomputed(self):
+        cache = ResponseCache(ttl=0)
+        cache.get_or_compute('a', 0, lambda: 1)
+        self.assertEqual(cache.get_or_compute('a', 0, lambda: 2), 2)
+
+    def test_new_generation_clears_cache(self):
+        cache = ResponseCache()
+        cache.get_or_compute('a', 0, lambda: 1)
+        self.assertEqual(cache.get_or_compute('a', 1, lambda: 2), 2)
+
+    def test_concurrent_identical_requests_are_coalesced(self):
+        cache = ResponseCache()
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute('a', 0, compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        while cache.coalesced < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
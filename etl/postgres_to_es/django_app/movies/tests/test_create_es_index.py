@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..management.commands.create_es_index import Command
+
+
+class ForceBehindAliasTest(SimpleTestCase):
+    def setUp(self):
+        self.command = Command()
+        self.command.es = mock.Mock()
+        indices = self.command.es.indices
+        indices.exists_alias.return_value = True
+        indices.get.return_value = {'movies_v1': {}, 'movies_v2': {}}
+        indices.get_alias.return_value = {'movies_v2': {}}
+
+    def handle(self, **overrides):
+        options = dict(
+            profile='serving', replicas=None, index='movies', expected_docs=0,
+            reindex=False, force=True, retain=2,
+        )
+        options.update(overrides)
+        self.command.handle(**options)
+
+    def test_force_creates_new_generation_and_swaps_alias(self):
+        self.handle()
+        indices = self.command.es.indices
+        indices.delete.assert_not_called()
+        self.assertEqual(indices.create.call_args.kwargs['index'], 'movies_v3')
+        actions = indices.update_aliases.call_args.kwargs['body']['actions']
+        self.assertEqual(actions, [
+            {'remove': {'index': 'movies_v2', 'alias': 'movies'}},
+            {'add': {'index': 'movies_v3', 'alias': 'movies'}},
+        ])
+
+    def test_alias_is_kept_without_force(self):
+        self.handle(force=False)
+        self.command.es.indices.create.assert_not_called()
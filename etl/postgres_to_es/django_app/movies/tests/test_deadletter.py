@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+from ..etl.deadletter import DeadLetterStore
+from ..management.commands.sync_data_main import serialize_action
+
+
+def make_item(doc_id: str) -> bytes:
+    return serialize_action({'_index': 'movies', '_id': doc_id, '_source': {'id': doc_id}})
+
+
+class DeadLetterStoreTest(SimpleTestCase):
+    def setUp(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.store = DeadLetterStore(path)
+        self.addCleanup(self.store.close)
+
+    def test_repeated_failure_increments_attempts(self):
+        self.store.add([(make_item('1'), 400, 'mapper_parsing_exception')])
+        self.store.add([(make_item('1'), 429, 'es_rejected_execution_exception')])
+        [entry] = self.store.entries()
+        self.assertEqual((entry.index, entry.id, entry.op_type), ('movies', '1', 'index'))
+        self.assertEqual(entry.attempts, 2)
+        self.assertEqual(entry.status, 429)
+
+    def test_remove_keeps_documents_that_failed_again(self):
+        self.store.add([(make_item('1'), 400, 'a'), (make_item('2'), 400, 'b')])
+        entries = self.store.entries()
+        # Документ 2 снова упал во время повтора
+        self.store.conn.execute(
+            "UPDATE dead_letters SET failed = failed + 1 WHERE id = '2'"
+        )
+        self.store.remove(entries)
+        self.assertEqual([entry.id for entry in self.store.entries(before=float('inf'))], ['2'])
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+from ..etl.dimensions import DimensionCache, assemble_rows
+
+
+class FakeCursor:
+    def __init__(self, names):
+        self.names = names
+        self.queries = 0
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.queries += 1
+        self.result = [(i, self.names[i]) for i in params[0] if i in self.names]
+
+    def fetchall(self):
+        return self.result
+
+
+class DimensionCacheTest(SimpleTestCase):
+    def test_misses_are_filled_once(self):
+        cursor = FakeCursor({'1': 'Ann', '2': 'Bob'})
+        cache = DimensionCache('person', 'full_name', capacity=10)
+        self.assertEqual(cache.get_many(cursor, ['1', '2']), {'1': 'Ann', '2': 'Bob'})
+        self.assertEqual(cache.get_many(cursor, ['1']), {'1': 'Ann'})
+        self.assertEqual(cursor.queries, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_capacity_evicts_least_recently_used(self):
+        cursor = FakeCursor({'1': 'Ann', '2': 'Bob', '3': 'Eve'})
+        cache = DimensionCache('person', 'full_name', capacity=2)
+        cache.get_many(cursor, ['1'])
+        cache.get_many(cursor, ['2'])
+        cache.get_many(cursor, ['1'])
+        cache.get_many(cursor, ['3'])
+        cache.get_many(cursor, ['1'])
+        self.assertEqual(cache.misses, 3)
+
+
+class AssembleRowsTest(SimpleTestCase):
+    def test_rows_match_aggregate_shape(self):
+        base = [{'id': 'f1', 'title': 'T', 'description': '', 'imdb_rating': 5, 'modified': None}]
+        rows = assemble_rows(
+            base,
+            person_links=[('f1', 'p1', 'actor'), ('f1', 'p2', 'director')],
+            genre_links=[('f1', 'g1')],
+            person_names={'p1': 'Ann', 'p2': 'Bob'},
+            genre_names={'g1': 'Drama'},
+        )
+        row = rows[0]
+        self.assertEqual(row['genres'], [{'id': 'g1', 'name': 'Drama'}])
+        self.assertEqual(row['actors'], [{'id': 'p1', 'name': 'Ann'}])
+        self.assertEqual(row['directors_names'], ['Bob'])
+        self.assertEqual(row['writers_names'], [])
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..management.commands import sync_data_main
+from ..management.commands.sync_data_main import (
+    NIL_UUID,
+    State,
+    produce_entity_changes,
+    resolve_affected_film_works,
+    run_entity_producers,
+)
+
+
+class StubCursor:
+    """Отдаёт заранее заданные результаты по порядку вызовов execute()"""
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append(params)
+        self.rows = self.results.pop(0)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+
+class StubLoader:
+    def __init__(self):
+        self.submitted = []
+        self.es = mock.Mock()
+        self.settings = mock.Mock(query_strategy='join')
+
+    def submit(self, actions):
+        self.submitted.extend(actions)
+
+    def after(self, callback):
+        callback()
+
+
+def at(day: int) -> datetime:
+    return datetime(2024, 1, day, tzinfo=timezone.utc)
+
+
+class ProduceEntityChangesTest(SimpleTestCase):
+    def setUp(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.state = State(path)
+
+    def test_partial_rename_updates_persons_projection(self):
+        cursor = StubCursor(
+            [{'id': 'p1', 'modified': at(2)}],
+            [('f1', 'p1', 'New Name'), ('f2', 'p1', 'New Name')],
+            [],
+        )
+        loader = StubLoader()
+        projections = mock.Mock()
+        projections.after.side_effect = lambda loader, callback: callback()
+        produce_entity_changes(
+            loader, cursor, 'person', self.state, partial=True, projections=projections
+        )
+        self.assertEqual(
+            sorted(action['_id'] for action in loader.submitted), ['f1', 'f2']
+        )
+        projections.rename_persons.assert_called_once_with({'p1': 'New Name'})
+        self.assertEqual(self.state.last_modified, at(2))
+
+    def test_first_run_seeds_checkpoint_from_latest_change(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        state = State(os.path.join(directory, 'state.person.json'))
+        self.addCleanup(os.remove, state.file_path)
+        cursor = StubCursor([(at(5),)], [])
+
+        total = produce_entity_changes(StubLoader(), cursor, 'person', state)
+
+        self.assertEqual(total, 0)
+        self.assertTrue(state.exists())
+        self.assertEqual(state.last_modified, at(5))
+        # Правки до первого запуска не переиндексируются повторно
+        self.assertEqual(cursor.executed[1], (at(5), NIL_UUID, 100))
+
+    def test_first_run_on_empty_table_starts_from_the_beginning(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        state = State(os.path.join(directory, 'state.genre.json'))
+        self.addCleanup(os.remove, state.file_path)
+        cursor = StubCursor([(None,)], [])
+
+        produce_entity_changes(StubLoader(), cursor, 'genre', state)
+
+        self.assertTrue(state.exists())
+        self.assertEqual(cursor.executed[1], (State(None).last_modified, NIL_UUID, 100))
+
+    def test_pages_advance_by_keyset_and_checkpoint_follows(self):
+        cursor = StubCursor(
+            [{'id': 'g1', 'modified': at(2)}, {'id': 'g2', 'modified': at(3)}],
+            [('f1',)],
+            [],
+            [{'id': 'g3', 'modified': at(3)}],
+            [('f2',)],
+            [],
+            [],
+        )
+        loader = StubLoader()
+
+        total = produce_entity_changes(loader, cursor, 'genre', self.state, batch_size=2)
+
+        self.assertEqual(total, 2)
+        # Следующая страница строго после (modified, id) последней строки
+        self.assertEqual(cursor.executed[3], (at(3), 'g2', 2))
+        self.assertEqual(cursor.executed[6], (at(3), 'g3', 2))
+        # Жанры ищут фильмы только по genre_ids
+        self.assertEqual(cursor.executed[1], ([], ['g1', 'g2']))
+        self.assertEqual((self.state.last_modified, self.state.last_id), (at(3), 'g3'))
+        # Фильмов нет в Postgres: они удаляются из индекса
+        self.assertEqual(
+            [(action['_op_type'], action['_id']) for action in loader.submitted],
+            [('delete', 'f1'), ('delete', 'f2')],
+        )
+
+
+class ResolveAffectedFilmWorksTest(SimpleTestCase):
+    def test_ids_of_linked_film_works_as_strings(self):
+        film_work_id = uuid.UUID(int=1)
+        cursor = StubCursor([(film_work_id,)])
+        ids = resolve_affected_film_works(cursor, person_ids=['p1'], genre_ids=iter(['g1']))
+        self.assertEqual(ids, [str(film_work_id)])
+        self.assertEqual(cursor.executed, [(['p1'], ['g1'])])
+
+
+class RunEntityProducersTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.state = State(os.path.join(directory, 'state.json'))
+
+    def run_producers(self, **settings):
+        loader = StubLoader()
+        calls = []
+
+        def produce(loader, cursor, table, state, partial=False, projections=None):
+            calls.append((table, state.file_path, partial, projections))
+            return 3
+
+        with mock.patch.object(sync_data_main, 'pg_connection') as pg_connection, \
+                mock.patch.object(sync_data_main, 'ensure_scripts') as ensure_scripts, \
+                mock.patch.object(sync_data_main, 'produce_entity_changes', produce):
+            total = run_entity_producers(
+                loader, mock.Mock(**settings), self.state, projections='projections'
+            )
+        return total, calls, pg_connection, ensure_scripts
+
+    def test_each_entity_has_its_own_checkpoint(self):
+        total, calls, _, ensure_scripts = self.run_producers(
+            extract_mode='batch', person_update_mode='full'
+        )
+        root = os.path.splitext(self.state.file_path)[0]
+        self.assertEqual(total, 6)
+        self.assertEqual(calls, [
+            ('person', f'{root}.person.json', False, 'projections'),
+            ('genre', f'{root}.genre.json', False, 'projections'),
+        ])
+        ensure_scripts.assert_not_called()
+
+    def test_partial_mode_installs_scripts_first(self):
+        _, calls, _, ensure_scripts = self.run_producers(
+            extract_mode='batch', person_update_mode='partial'
+        )
+        ensure_scripts.assert_called_once()
+        self.assertTrue(all(partial for _, _, partial, _ in calls))
+
+    def test_document_mode_skips_producers(self):
+        total, calls, pg_connection, _ = self.run_producers(
+            extract_mode='document', person_update_mode='full'
+        )
+        self.assertEqual((total, calls), (0, []))
+        pg_connection.assert_not_called()
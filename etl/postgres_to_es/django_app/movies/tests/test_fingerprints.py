@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+from ..etl.fingerprints import FingerprintStore
+
+
+def make_action(doc_id: str, title: str) -> dict:
+    return {'_index': 'movies', '_id': doc_id, '_source': {'title': title}}
+
+
+class FingerprintStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.store = FingerprintStore(':memory:', max_entries=3)
+        self.addCleanup(self.store.close)
+
+    def send(self, actions) -> list:
+        """Фильтр и подтверждение, как после успешного bulk"""
+        pending = {}
+        sent = list(self.store.filter(actions, pending))
+        self.store.record(pending)
+        return sent
+
+    def test_unchanged_documents_are_skipped(self):
+        self.send([make_action('1', 'a'), make_action('2', 'b')])
+        sent = self.send([make_action('1', 'a'), make_action('2', 'c')])
+        self.assertEqual([action['_id'] for action in sent], ['2'])
+        self.assertEqual(self.store.skipped, 1)
+
+    def test_unacknowledged_document_is_resent(self):
+        list(self.store.filter([make_action('1', 'a')], {}))
+        self.assertEqual(len(list(self.store.filter([make_action('1', 'a')]))), 1)
+        self.assertEqual(self.store.size, 0)
+
+    def test_forgotten_document_is_resent(self):
+        self.send([make_action('1', 'a')])
+        self.store.forget(['1'])
+        self.assertEqual(len(list(self.store.filter([make_action('1', 'a')]))), 1)
+
+    def test_eviction_keeps_store_bounded(self):
+        self.send([make_action(str(i), 'a') for i in range(5)])
+        self.assertLessEqual(self.store.size, 3)
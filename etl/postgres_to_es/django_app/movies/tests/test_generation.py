@@ -0,0 +1,34 @@
+import time
+
+from django.test import SimpleTestCase
+from ..etl.generation import GenerationCounter
+
+
+class GenerationCounterTest(SimpleTestCase):
+    def setUp(self):
+        self.counter = GenerationCounter(None, min_interval=0.05)
+        self.bumps = []
+        self.counter._bump = self.fake_bump
+        self.addCleanup(self.counter.close)
+
+    def fake_bump(self):
+        self.bumps.append(time.monotonic())
+        self.counter._last_bump = time.monotonic()
+        self.counter._pending = False
+
+    def test_bump_inside_interval_is_sent_after_it(self):
+        self.counter.bump()
+        self.counter.bump()
+        self.assertEqual(len(self.bumps), 1)
+
+        deadline = time.monotonic() + 2
+        while len(self.bumps) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.bumps), 2)
+
+    def test_flush_sends_collapsed_bump(self):
+        self.counter.bump()
+        self.counter.bump()
+        self.counter.flush()
+        self.assertEqual(len(self.bumps), 2)
+        self.assertIsNone(self.counter._timer)
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+from ..index_profiles import PROFILES, get_profile, index_body, shard_count
+
+
+class IndexProfilesTest(SimpleTestCase):
+    def test_shard_count_follows_volume_within_bounds(self):
+        profile = PROFILES['serving']
+        self.assertEqual(shard_count(profile, 0), 1)
+        self.assertEqual(shard_count(profile, profile.docs_per_shard + 1), 2)
+        self.assertEqual(shard_count(profile, 10 ** 12), profile.max_shards)
+
+    def test_bulk_load_shares_static_settings_with_serving(self):
+        serving = index_body(PROFILES['serving'], 10 ** 7)['settings']
+        bulk = index_body(PROFILES['bulk-load'], 10 ** 7)['settings']
+        self.assertEqual(serving['number_of_shards'], bulk['number_of_shards'])
+        self.assertEqual(bulk['refresh_interval'], '-1')
+
+    def test_mapping_options(self):
+        properties = index_body(PROFILES['large-catalogue'])['mappings']['properties']
+        self.assertTrue(properties['genres']['eager_global_ordinals'])
+        self.assertFalse(properties['title']['fields']['raw']['doc_values'])
+        # Общий маппинг не должен меняться от профиля к профилю
+        properties = index_body(PROFILES['serving'])['mappings']['properties']
+        self.assertNotIn('doc_values', properties['title']['fields']['raw'])
+
+    def test_index_sort_rejected_with_nested_fields(self):
+        profile = PROFILES['serving']._replace(index_sort=True)
+        with self.assertRaises(ValueError):
+            index_body(profile)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_profile('fast')
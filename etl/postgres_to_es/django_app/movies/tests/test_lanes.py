@@ -0,0 +1,199 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl import lanes
+from ..etl.lanes import Floor, FreshnessTracker, unsupported_settings
+from ..management.commands.sync_data_main import NIL_UUID, State
+
+NOW = datetime(2024, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def lane_settings(**overrides):
+    values = dict(
+        realtime_budget_seconds=60,
+        realtime_batch_size=2,
+        realtime_interval=0,
+        realtime_workers=1,
+        bulk_workers=4,
+        batch_size=100,
+        bulk_chunk_size=500,
+        sleep_interval=0,
+        query_strategy='join',
+        extract_mode='batch',
+        adaptive_batching=False,
+        change_capture='poll',
+    )
+    values.update(overrides)
+    return mock.Mock(**values)
+
+
+def row(modified, suffix):
+    return {'id': f'00000000-0000-0000-0000-{suffix:012d}', 'modified': modified}
+
+
+class FloorTest(SimpleTestCase):
+    def test_floor_only_moves_forward(self):
+        floor = Floor(datetime(2024, 1, 2, tzinfo=timezone.utc))
+        floor.raise_to(datetime(2024, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(floor.get().day, 2)
+        floor.raise_to(datetime(2024, 1, 3, tzinfo=timezone.utc))
+        self.assertEqual(floor.get().day, 3)
+
+
+class FreshnessTrackerTest(SimpleTestCase):
+    def test_percentiles(self):
+        tracker = FreshnessTracker()
+        for seconds in range(1, 101):
+            tracker.add(float(seconds))
+        self.assertEqual(tracker.percentile(0.5), 51.0)
+        self.assertEqual(tracker.percentile(0.99), 100.0)
+
+
+class UnsupportedSettingsTest(SimpleTestCase):
+    def test_default_settings_are_supported(self):
+        self.assertEqual(unsupported_settings(lane_settings()), [])
+
+    def test_extract_modes_without_lane_queries_are_rejected(self):
+        for mode in ('split', 'raw', 'document'):
+            self.assertEqual(
+                unsupported_settings(lane_settings(extract_mode=mode)),
+                [f'EXTRACT_MODE={mode}'],
+            )
+
+    def test_adaptive_batching_and_notify_are_rejected(self):
+        problems = unsupported_settings(
+            lane_settings(adaptive_batching=True, change_capture='notify')
+        )
+        self.assertEqual(problems, ['ADAPTIVE_BATCHING', 'CHANGE_CAPTURE=notify'])
+
+
+class LaneTestCase(SimpleTestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        for name in ('get_pg_connection', 'BulkLoader', 'open_projections', 'run_entity_producers'):
+            patcher = mock.patch.object(lanes, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(lanes, 'db_now', return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetches(self, *pages):
+        """fetch_lane, отдающий pages по очереди и останавливающий полосу в конце"""
+        pages = list(pages)
+        calls = []
+
+        def fetch(cursor, settings, state, ceiling, limit):
+            calls.append((ceiling, limit))
+            if not pages:
+                self.stop.set()
+                return []
+            return pages.pop(0)
+
+        patcher = mock.patch.object(lanes, 'fetch_lane', side_effect=fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+
+class RealtimeLoopTest(LaneTestCase):
+    def test_backlog_over_budget_raises_floor_and_resets_checkpoint(self):
+        settings = lane_settings()
+        stale = NOW - timedelta(minutes=10)
+        state = State(None)
+        floor = Floor(stale)
+        # Полная пачка старых правок: на следующем шаге отставание сверх бюджета
+        self.fetches([row(stale, 1), row(stale, 2)])
+
+        lanes.realtime_loop(mock.Mock(), settings, state, floor, self.stop)
+
+        self.assertEqual(floor.get(), NOW - timedelta(seconds=30))
+        self.assertEqual((state.last_modified, state.last_id), (floor.get(), NIL_UUID))
+
+    def test_idle_lane_with_old_checkpoint_keeps_floor(self):
+        old = NOW - timedelta(days=1)
+        state = State(None)
+        state.last_modified = old
+        floor = Floor(old)
+        self.fetches()
+
+        lanes.realtime_loop(mock.Mock(), lane_settings(), state, floor, self.stop)
+
+        self.assertEqual(floor.get(), old)
+        self.assertEqual(state.last_modified, old)
+
+    def test_lane_reads_above_floor_without_ceiling(self):
+        calls = self.fetches()
+        lanes.realtime_loop(mock.Mock(), lane_settings(), State(None), Floor(NOW), self.stop)
+        self.assertEqual(calls, [(lanes.UNBOUNDED, 2)])
+
+
+class BulkLoopTest(LaneTestCase):
+    def test_bulk_lane_reads_below_current_floor_in_batches(self):
+        floor = Floor(NOW - timedelta(minutes=5))
+        calls = self.fetches([row(NOW - timedelta(hours=1), 1)])
+        floor_after_handoff = NOW - timedelta(seconds=30)
+
+        def raise_floor(*args):
+            floor.raise_to(floor_after_handoff)
+
+        lanes.BulkLoader.return_value.__enter__.return_value.submit.side_effect = raise_floor
+        lanes.bulk_loop(mock.Mock(), lane_settings(), State(None), floor, self.stop)
+
+        # После сдвига floor полоса bulk дочитывает переданный ей хвост
+        self.assertEqual(calls, [
+            (NOW - timedelta(minutes=5), 100),
+            (floor_after_handoff, 100),
+        ])
+
+
+class RunLanesTest(SimpleTestCase):
+    def run_lanes(self, state, realtime):
+        started = {}
+
+        def fake_loop(name):
+            def loop(es, settings, lane_state, floor, stop, fingerprints=None):
+                started[name] = (lane_state, floor)
+                # Останавливаем планировщик, когда запущены обе полосы
+                if len(started) == 2:
+                    stop.set()
+                stop.wait(5)
+            return loop
+
+        with mock.patch.object(lanes, 'pg_connection'), \
+                mock.patch.object(lanes, 'db_now', return_value=NOW), \
+                mock.patch.object(lanes, 'realtime_loop', fake_loop('realtime')), \
+                mock.patch.object(lanes, 'bulk_loop', fake_loop('bulk')), \
+                mock.patch.object(State, 'child', return_value=realtime):
+            lanes.run_lanes(mock.Mock(), lane_settings(), state)
+        return started
+
+    def test_stale_realtime_checkpoint_is_moved_to_floor(self):
+        state = State(None)
+        state.last_modified = NOW - timedelta(days=1)
+        realtime = State(None)
+        realtime.last_modified = NOW - timedelta(hours=1)
+
+        started = self.run_lanes(state, realtime)
+
+        realtime_state, realtime_floor = started['realtime']
+        bulk_state, bulk_floor = started['bulk']
+        self.assertIs(realtime_floor, bulk_floor)
+        self.assertEqual(realtime_floor.get(), NOW - timedelta(seconds=30))
+        self.assertIs(realtime_state, realtime)
+        self.assertEqual((realtime.last_modified, realtime.last_id), (realtime_floor.get(), NIL_UUID))
+        # Полоса bulk продолжает с основного чекпоинта до той же границы
+        self.assertIs(bulk_state, state)
+        self.assertEqual(state.last_modified, NOW - timedelta(days=1))
+
+    def test_fresh_realtime_checkpoint_becomes_floor(self):
+        recent = NOW - timedelta(seconds=10)
+        realtime = State(None)
+        realtime.last_modified, realtime.last_id = recent, 'abc'
+        with mock.patch.object(State, 'exists', return_value=True):
+            started = self.run_lanes(State(None), realtime)
+
+        self.assertEqual(started['realtime'][1].get(), recent)
+        self.assertEqual((realtime.last_modified, realtime.last_id), (recent, 'abc'))
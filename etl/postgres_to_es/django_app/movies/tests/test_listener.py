@@ -0,0 +1,65 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl import listener
+from ..etl.listener import ChangeSet
+
+
+class ChangeSetTest(SimpleTestCase):
+    def test_payloads_are_grouped_by_entity(self):
+        changes = ChangeSet()
+        for payload in (
+            'film_work:1', 'film_work:1', 'person:2', 'genre:3', 'broken'
+        ):
+            changes.add(payload)
+
+        self.assertEqual(changes.film_work_ids, {'1'})
+        self.assertEqual(changes.person_ids, {'2'})
+        self.assertEqual(changes.genre_ids, {'3'})
+        self.assertEqual(len(changes), 3)
+
+
+class FakeListener:
+    """Отдаёт заданные пачки изменений и останавливает цикл после последней"""
+    def __init__(self, stop, *batches):
+        self.stop = stop
+        self.batches = list(batches)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def wait(self, timeout):
+        changes = self.batches.pop(0)
+        if not self.batches:
+            self.stop.set()
+        return changes
+
+
+class ListenTest(SimpleTestCase):
+    def listen(self, sleep_interval, *batches):
+        stop = threading.Event()
+        settings = SimpleNamespace(sleep_interval=sleep_interval)
+        state = mock.Mock()
+        changes = ChangeSet()
+        changes.add('film_work:1')
+        batches = [changes if batch else None for batch in batches]
+        with mock.patch.object(listener, 'ChangeListener', return_value=FakeListener(stop, *batches)), \
+                mock.patch.object(listener, 'run_pass', return_value=0) as run_pass, \
+                mock.patch.object(listener, 'reindex_changes', return_value=1) as reindex:
+            listener.listen(None, settings, state, stop=stop)
+        return run_pass.call_count, reindex.call_count
+
+    def test_poll_runs_on_schedule_under_steady_events(self):
+        # Начальный проход и по одному после каждой пачки: интервал уже истёк
+        self.assertEqual(self.listen(0, True, True, True), (4, 3))
+
+    def test_events_within_interval_skip_poll(self):
+        self.assertEqual(self.listen(3600, True, True), (1, 2))
+
+    def test_quiet_period_runs_poll(self):
+        self.assertEqual(self.listen(0, False), (2, 0))
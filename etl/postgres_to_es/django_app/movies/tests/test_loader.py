@@ -0,0 +1,70 @@
+import json
+
+from elasticsearch.exceptions import ConnectionTimeout, TransportError
+from django.test import SimpleTestCase
+from ..management.commands.sync_data_main import (
+    chunk_actions, is_retryable, raw_bulk_item, serialize_action
+)
+
+
+def make_action(doc_id: str, description: str = '') -> dict:
+    return {
+        '_index': 'movies',
+        '_id': doc_id,
+        '_source': {'id': doc_id, 'description': description},
+    }
+
+
+class ChunkActionsTest(SimpleTestCase):
+    def test_chunk_by_count(self):
+        actions = [make_action(str(i)) for i in range(5)]
+        chunks = list(chunk_actions(actions, chunk_size=2, max_bytes=10 ** 6))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+
+    def test_chunk_by_bytes(self):
+        actions = [make_action(str(i), 'x' * 100) for i in range(4)]
+        item_size = len(serialize_action(actions[0]))
+        chunks = list(chunk_actions(actions, chunk_size=100, max_bytes=item_size * 2))
+        self.assertEqual([len(c) for c in chunks], [2, 2])
+
+    def test_oversized_document_is_sent_alone(self):
+        actions = [make_action('1', 'x' * 1000), make_action('2')]
+        chunks = list(chunk_actions(actions, chunk_size=100, max_bytes=10))
+        self.assertEqual([len(c) for c in chunks], [1, 1])
+
+
+class SerializeActionTest(SimpleTestCase):
+    def test_update_action_sends_script_only(self):
+        action = {
+            '_op_type': 'update',
+            '_index': 'movies',
+            '_id': '1',
+            'script': {'id': 'movies_rename_person', 'params': {'persons': {}}},
+        }
+        meta, body = serialize_action(action).decode().splitlines()
+        self.assertEqual(
+            json.loads(meta),
+            {'update': {'_index': 'movies', '_id': '1', 'retry_on_conflict': 3}},
+        )
+        self.assertEqual(json.loads(body), {'script': action['script']})
+
+    def test_delete_action_has_no_body(self):
+        action = {'_op_type': 'delete', '_index': 'movies', '_id': '1'}
+        self.assertEqual(len(serialize_action(action).splitlines()), 1)
+
+
+class RawBulkItemTest(SimpleTestCase):
+    def test_raw_item_is_valid_ndjson(self):
+        source = '{"id": "1", "title": "Фильм"}'.encode('utf-8')
+        meta, body = raw_bulk_item(b'1', source).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(meta), {'index': {'_index': 'movies', '_id': '1'}})
+        self.assertEqual(json.loads(body)['title'], 'Фильм')
+
+
+class IsRetryableTest(SimpleTestCase):
+    def test_connection_errors_and_overload_are_retried(self):
+        self.assertTrue(is_retryable(ConnectionTimeout('N/A', 'timed out', None)))
+        self.assertTrue(is_retryable(TransportError(503, 'unavailable_shards_exception')))
+
+    def test_bad_request_is_not_retried(self):
+        self.assertFalse(is_retryable(TransportError(400, 'mapper_parsing_exception')))
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from ..etl.metrics import LAG_SECONDS, Counter, Histogram, drop_family, write_snapshot
+
+
+class MetricsTest(SimpleTestCase):
+    def test_counter_renders_labels(self):
+        counter = Counter('etl_bulk_errors_total', 'Errors', ['reason'])
+        counter.inc(reason='mapper_parsing_exception')
+        counter.inc(2, reason='mapper_parsing_exception')
+        self.assertIn(
+            'etl_bulk_errors_total{reason="mapper_parsing_exception"} 3.0',
+            counter.render(),
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('etl_stage_seconds', 'Stages', ['stage'], buckets=(0.1, 1))
+        histogram.observe(0.05, stage='bulk')
+        histogram.observe(0.5, stage='bulk')
+        lines = histogram.render()
+        self.assertIn('etl_stage_seconds_bucket{stage="bulk",le="0.1"} 1', lines)
+        self.assertIn('etl_stage_seconds_bucket{stage="bulk",le="1.0"} 2', lines)
+        self.assertIn('etl_stage_seconds_bucket{stage="bulk",le="+Inf"} 2', lines)
+        self.assertIn('etl_stage_seconds_count{stage="bulk"} 2', lines)
+
+
+    def test_drop_family_keeps_other_metrics(self):
+        text = (
+            '# HELP etl_lag_seconds Lag\n# TYPE etl_lag_seconds gauge\netl_lag_seconds 1.0\n'
+            '# HELP etl_lag_seconds_total Other\n# TYPE etl_lag_seconds_total counter\n'
+            'etl_lag_seconds_total 2.0\n'
+        )
+        self.assertEqual(
+            drop_family(text, 'etl_lag_seconds'),
+            '# HELP etl_lag_seconds_total Other\n# TYPE etl_lag_seconds_total counter\n'
+            'etl_lag_seconds_total 2.0\n',
+        )
+
+
+class MetricsViewTest(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.prom')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def families(self, body):
+        return [line.split()[2] for line in body.splitlines() if line.startswith('# TYPE ')]
+
+    def scrape(self):
+        from .. import views
+        state = SimpleNamespace(last_modified=datetime.now(timezone.utc) - timedelta(seconds=30))
+        with override_settings(ETL_METRICS_PATH=self.path), \
+                mock.patch.object(views.SyncState.objects, 'last', return_value=state):
+            response = views.metrics_view(RequestFactory().get('/metrics'))
+        return response.content.decode('utf-8')
+
+    def test_each_family_appears_once(self):
+        write_snapshot(self.path, exclude=(LAG_SECONDS,))
+        families = self.families(self.scrape())
+        self.assertEqual(len(families), len(set(families)))
+        self.assertIn('etl_lag_seconds', families)
+
+    def test_lag_from_old_snapshot_is_replaced(self):
+        # Снимок, записанный вместе с etl_lag_seconds
+        LAG_SECONDS.set(5)
+        self.addCleanup(LAG_SECONDS._values.clear)
+        write_snapshot(self.path)
+        body = self.scrape()
+        self.assertEqual(self.families(body).count('etl_lag_seconds'), 1)
+        self.assertNotIn('etl_lag_seconds 5.0', body)
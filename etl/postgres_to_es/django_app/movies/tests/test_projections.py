@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl import projections
+from ..etl.projections import after_all, projection_names, transform_genres, transform_persons
+
+
+def make_row(film_id: str, directors=(), actors=(), genres=()) -> dict:
+    return {
+        'id': film_id,
+        'title': f'Film {film_id}',
+        'imdb_rating': 7.5,
+        'genres': [{'id': genre_id, 'name': name} for genre_id, name in genres],
+        'directors': [{'id': pid, 'name': name} for pid, name in directors],
+        'actors': [{'id': pid, 'name': name} for pid, name in actors],
+        'writers': [],
+    }
+
+
+class FakeLoader:
+    def __init__(self):
+        self.callbacks = []
+        self.submitted = []
+        self.settings = SimpleNamespace(query_strategy='join')
+
+    def submit(self, actions):
+        self.submitted.extend(actions)
+
+    def after(self, callback):
+        self.callbacks.append(callback)
+
+
+class TransformPersonsTest(SimpleTestCase):
+    def test_roles_are_grouped_per_person_and_film(self):
+        rows = [
+            make_row('f1', directors=[('p1', 'Ann')], actors=[('p1', 'Ann'), ('p2', 'Bob')]),
+            make_row('f2', actors=[('p1', 'Ann')]),
+        ]
+        actions = {action['_id']: action for action in transform_persons(rows)}
+        self.assertEqual(set(actions), {'p1', 'p2'})
+
+        films = actions['p1']['upsert']['films']
+        self.assertEqual(
+            [(film['id'], film['roles']) for film in films],
+            [('f1', ['director', 'actor']), ('f2', ['actor'])],
+        )
+        self.assertEqual(actions['p1']['_op_type'], 'update')
+        self.assertEqual(actions['p1']['script']['params']['films'], films)
+
+
+class TransformGenresTest(SimpleTestCase):
+    def test_genres_are_sent_once_per_pass(self):
+        sent = {}
+        rows = [make_row('f1', genres=[('g1', 'Drama'), ('g2', 'Comedy')])]
+        self.assertEqual(len(list(transform_genres(rows, sent=sent))), 2)
+        rows = [make_row('f2', genres=[('g1', 'Drama'), ('g2', 'Comedies')])]
+        self.assertEqual(
+            [action['_source'] for action in transform_genres(rows, sent=sent)],
+            [{'id': 'g2', 'name': 'Comedies'}],
+        )
+
+
+class AfterAllTest(SimpleTestCase):
+    def test_callback_waits_for_every_loader(self):
+        loaders = [FakeLoader(), FakeLoader()]
+        calls = []
+        after_all(loaders, lambda: calls.append(1))
+        loaders[0].callbacks[0]()
+        self.assertEqual(calls, [])
+        loaders[1].callbacks[0]()
+        self.assertEqual(calls, [1])
+
+
+class ProjectionNamesTest(SimpleTestCase):
+    def test_movies_is_implicit(self):
+        settings = SimpleNamespace(index_projections='movies, genres,persons')
+        self.assertEqual(projection_names(settings), ['persons', 'genres'])
+
+    def test_unknown_projection(self):
+        with self.assertRaises(ValueError):
+            projection_names(SimpleNamespace(index_projections='movies,studios'))
+
+
+class ReindexProjectionTest(SimpleTestCase):
+    def test_only_failed_documents_are_rebuilt(self):
+        rows = [make_row('f1', actors=[('p1', 'Ann'), ('p2', 'Bob')])]
+        loader = FakeLoader()
+        with mock.patch.object(projections, 'resolve_affected_film_works', return_value=['f1']), \
+                mock.patch.object(projections, 'fetch_film_works_by_ids', return_value=rows):
+            projections.reindex_projection(loader, None, 'persons', ['p2'])
+        self.assertEqual([action['_id'] for action in loader.submitted], ['p2'])
+        self.assertEqual(loader.submitted[0]['_index'], 'persons')
+
+
+class RenamePersonsTest(SimpleTestCase):
+    def test_only_full_name_is_updated(self):
+        loader = FakeLoader()
+        instance = projections.Projections.__new__(projections.Projections)
+        instance.loaders = {'persons': loader}
+        instance.rename_persons({'p1': 'Ann'})
+        self.assertEqual(loader.submitted, [{
+            '_op_type': 'update', '_index': 'persons', '_id': 'p1',
+            'doc': {'full_name': 'Ann'},
+        }])
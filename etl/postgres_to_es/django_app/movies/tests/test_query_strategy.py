@@ -0,0 +1,125 @@
+import os
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl.async_engine import extract
+from ..management.commands import sync_data_main
+from ..management.commands.sync_data_main import (
+    FILM_WORK_BY_IDS_QUERIES,
+    FILM_WORK_QUERIES,
+    Settings,
+    State,
+    fetch_data_from_pg,
+    fetch_film_works_by_ids,
+)
+
+STRATEGIES = ('join', 'lateral')
+
+
+class StubCursor:
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.pages.pop(0) if self.pages else []
+
+
+class FakeAsyncCursor:
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.executed = []
+        self.sizes = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    async def fetchmany(self, size):
+        self.sizes.append(size)
+        return self.pages.pop(0) if self.pages else []
+
+
+class FakeAsyncConnection:
+    def __init__(self, cursor: FakeAsyncCursor):
+        self._cursor = cursor
+
+    def transaction(self):
+        return FakeAsyncCursor()
+
+    def cursor(self, name=None):
+        return self._cursor
+
+
+def make_settings(**overrides) -> Settings:
+    values = dict(postgres_db='movies', postgres_user='app', postgres_password='secret')
+    values.update(overrides)
+    return Settings(**values)
+
+
+class QueryStrategySettingsTest(SimpleTestCase):
+    def test_strategy_is_read_from_environment(self):
+        for strategy in STRATEGIES:
+            with mock.patch.dict(os.environ, {'QUERY_STRATEGY': strategy}):
+                self.assertEqual(make_settings().query_strategy, strategy)
+
+    def test_every_strategy_has_both_queries(self):
+        for strategy in STRATEGIES:
+            settings = make_settings(query_strategy=strategy)
+            self.assertIn(settings.query_strategy, FILM_WORK_QUERIES)
+            self.assertIn(settings.query_strategy, FILM_WORK_BY_IDS_QUERIES)
+        self.assertEqual(set(FILM_WORK_QUERIES), set(STRATEGIES))
+        self.assertEqual(set(FILM_WORK_BY_IDS_QUERIES), set(STRATEGIES))
+
+    def test_lateral_queries_aggregate_without_group_by(self):
+        self.assertNotIn('GROUP BY', FILM_WORK_QUERIES['lateral'])
+        self.assertNotIn('GROUP BY', FILM_WORK_BY_IDS_QUERIES['lateral'])
+        self.assertIn('GROUP BY', FILM_WORK_QUERIES['join'])
+
+
+class QuerySelectionTest(SimpleTestCase):
+    def test_fetch_by_ids_uses_strategy_query(self):
+        for strategy in STRATEGIES:
+            cursor = StubCursor([{'id': 'f1'}])
+            rows = fetch_film_works_by_ids(cursor, iter(['f1']), strategy)
+            self.assertEqual(rows, [{'id': 'f1'}])
+            self.assertEqual(cursor.executed, [(FILM_WORK_BY_IDS_QUERIES[strategy], (['f1'],))])
+
+    def test_batch_extraction_uses_strategy_query(self):
+        for strategy in STRATEGIES:
+            cursor = StubCursor()
+            settings = mock.Mock(extract_mode='batch', query_strategy=strategy)
+            with mock.patch.object(sync_data_main, 'pg_connection') as pg_connection:
+                pg_connection.return_value.__enter__.return_value.cursor.return_value = cursor
+                self.assertEqual(list(fetch_data_from_pg(State(None), settings, 10)), [])
+            self.assertEqual(cursor.executed[0][0], FILM_WORK_QUERIES[strategy] + 'LIMIT %s')
+
+    def test_async_extract_uses_strategy_query(self):
+        for strategy in STRATEGIES:
+            cursor = FakeAsyncCursor([{'id': 'f1'}])
+            settings = mock.Mock(
+                query_strategy=strategy, pg_itersize=100, batch_size=50, bulk_chunk_size=500
+            )
+            out = asyncio.Queue()
+            asyncio.run(extract(FakeAsyncConnection(cursor), settings, State(None), out))
+            self.assertEqual(cursor.executed[0][0], FILM_WORK_QUERIES[strategy])
+            self.assertEqual(out.get_nowait(), (0, [{'id': 'f1'}]))
+
+    def test_async_extract_reads_batch_size_rows(self):
+        cursor = FakeAsyncCursor([{'id': 'f1'}], [{'id': 'f2'}])
+        settings = mock.Mock(
+            query_strategy='join', pg_itersize=100, batch_size=50, bulk_chunk_size=500
+        )
+        out = asyncio.Queue()
+        asyncio.run(extract(FakeAsyncConnection(cursor), settings, State(None), out))
+        self.assertEqual(cursor.sizes, [50, 50, 50])
+        self.assertEqual(out.qsize(), 2)
@@ -0,0 +1,116 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ..etl import reconcile as reconcile_module
+from ..etl.reconcile import Summary, split_range
+
+
+class SplitRangeTest(SimpleTestCase):
+    def test_children_cover_parent_without_gaps(self):
+        parent = ('40000000-0000-0000-0000-000000000000', None)
+        children = split_range(parent, 16)
+        self.assertEqual(len(children), 16)
+        self.assertEqual(children[0][0], parent[0])
+        self.assertIsNone(children[-1][1])
+        for (_, upper), (lower, _) in zip(children, children[1:]):
+            self.assertEqual(upper, lower)
+
+    def test_narrow_range_splits_into_single_ids(self):
+        lower = uuid.UUID(int=10)
+        parent = (str(lower), str(uuid.UUID(int=13)))
+        children = split_range(parent, 16)
+        self.assertEqual(
+            [uuid.UUID(child[0]).int for child in children], [10, 11, 12]
+        )
+        self.assertEqual(children[-1][1], parent[1])
+
+
+def in_range(film_id, bounds):
+    lower, upper = bounds
+    return film_id >= lower and (upper is None or film_id < upper)
+
+
+class FakeSide:
+    """Документы одной стороны: id -> хэш содержимого"""
+    def __init__(self, documents):
+        self.documents = documents
+
+    def summaries(self, _, ranges, content=False):
+        return [self.summary(bounds, content) for bounds in ranges]
+
+    def summary(self, bounds, content):
+        items = sorted(
+            (film_id, content_hash if content else None)
+            for film_id, content_hash in self.documents.items() if in_range(film_id, bounds)
+        )
+        return Summary(len(items), hash(tuple(items)))
+
+    def documents_in(self, _, bounds, content=False):
+        return {
+            film_id: content_hash if content else None
+            for film_id, content_hash in self.documents.items() if in_range(film_id, bounds)
+        }
+
+
+class ReconcileTest(SimpleTestCase):
+    def setUp(self):
+        step = 2 ** 128 // 64
+        self.ids = [str(uuid.UUID(int=i * step + 1)) for i in range(64)]
+
+    def run_reconcile(self, pg, indexed, **kwargs):
+        reindexed = []
+        pg, indexed = FakeSide(pg), FakeSide(indexed)
+        with mock.patch.object(reconcile_module, 'pg_connection'), \
+                mock.patch.object(reconcile_module, 'BulkLoader'), \
+                mock.patch.object(reconcile_module, 'pg_summaries', pg.summaries), \
+                mock.patch.object(reconcile_module, 'es_summaries', indexed.summaries), \
+                mock.patch.object(reconcile_module, 'pg_documents', pg.documents_in), \
+                mock.patch.object(reconcile_module, 'es_documents', indexed.documents_in), \
+                mock.patch.object(
+                    reconcile_module, 'reindex_film_works',
+                    lambda loader, cursor, ids: reindexed.extend(ids)
+                ):
+            stats = reconcile_module.reconcile(
+                mock.Mock(), mock.Mock(), fanout=4, leaf_size=2, **kwargs
+            )
+        return stats, reindexed
+
+    def test_matching_ranges_are_not_descended(self):
+        documents = dict.fromkeys(self.ids, 'a')
+        stats, reindexed = self.run_reconcile(documents, dict(documents), content=True)
+        self.assertEqual(stats['ranges'], 4)
+        self.assertEqual(stats['leaves'], 0)
+        self.assertEqual(reindexed, [])
+
+    def test_missing_and_extra_ids_narrow_to_their_leaves(self):
+        pg = dict.fromkeys(self.ids[:-1])
+        indexed = dict.fromkeys(self.ids[1:])
+        stats, reindexed = self.run_reconcile(pg, indexed)
+        self.assertEqual(sorted(reindexed), sorted([self.ids[0], self.ids[-1]]))
+        self.assertEqual((stats['missing'], stats['extra']), (1, 1))
+        self.assertEqual(stats['leaves'], 2)
+
+    def test_changed_content_narrows_like_missing_ids(self):
+        pg = dict.fromkeys(self.ids, 'a')
+        indexed = dict(pg, **{self.ids[37]: 'b'})
+        stats, reindexed = self.run_reconcile(pg, indexed, content=True)
+        self.assertEqual(reindexed, [self.ids[37]])
+        self.assertEqual(stats['changed'], 1)
+        self.assertEqual(stats['leaves'], 1)
+        # Уровни по 16, 4 и 1 документу: на каждом делится один диапазон
+        self.assertEqual(stats['ranges'], 4 * 3)
+
+    def test_content_drift_is_ignored_without_content_mode(self):
+        pg = dict.fromkeys(self.ids, 'a')
+        indexed = dict(pg, **{self.ids[37]: 'b'})
+        stats, reindexed = self.run_reconcile(pg, indexed)
+        self.assertEqual(reindexed, [])
+        self.assertEqual(stats['ranges'], 4)
+
+    def test_dry_run_reports_without_reindexing(self):
+        stats, reindexed = self.run_reconcile(
+            dict.fromkeys(self.ids), dict.fromkeys(self.ids[1:]), dry_run=True
+        )
+        self.assertEqual(stats['missing'], 1)
+        self.assertEqual(reindexed, [])
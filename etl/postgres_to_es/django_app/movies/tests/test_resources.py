@@ -0,0 +1,94 @@
+import psycopg2
+from psycopg2.pool import PoolError
+
+from django.test import SimpleTestCase
+from ..etl.resources import PgPool, es_client_options
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, query):
+        if self.conn.dead:
+            raise psycopg2.OperationalError('server closed the connection')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        if self.dead:
+            raise psycopg2.InterfaceError('connection already closed')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class PgPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+        self.pool = PgPool(self.connect, size=2, timeout=0.01, check_interval=0)
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_connection_is_reused_and_committed(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(first.commits, 2)
+
+    def test_dead_idle_connection_is_replaced(self):
+        with self.pool.connection() as first:
+            pass
+        first.dead = True
+        with self.pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.discarded, 1)
+
+    def test_error_rolls_back_and_keeps_connection(self):
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as conn:
+                raise ValueError
+        self.assertEqual(conn.rollbacks, 1)
+        with self.pool.connection() as again:
+            pass
+        self.assertIs(conn, again)
+
+    def test_checkout_waits_for_free_slot(self):
+        with self.pool.connection(), self.pool.connection():
+            with self.assertRaises(PoolError):
+                with self.pool.connection():
+                    pass
+
+
+class EsClientOptionsTest(SimpleTestCase):
+    def test_defaults_compress_and_keep_connections(self):
+        options = es_client_options()
+        self.assertTrue(options['http_compress'])
+        self.assertGreater(options['maxsize'], 1)
@@ -0,0 +1,45 @@
+import json
+import tempfile
+
+from django.test import SimpleTestCase
+from ..etl.snapshot import Progress, export, read_items, read_manifest
+from ..management.commands.sync_data_main import serialize_action
+
+
+def make_item(doc_id: str) -> bytes:
+    return serialize_action({'_index': 'movies', '_id': doc_id, '_source': {'id': doc_id}})
+
+
+class SnapshotTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_round_trip_in_chunks(self):
+        items = [make_item(str(i)) for i in range(5)]
+        manifest = export(iter(items), self.directory, 'pg', chunk_docs=2)
+        self.assertEqual([chunk['docs'] for chunk in manifest['chunks']], [2, 2, 1])
+        self.assertEqual(read_manifest(self.directory)['docs'], 5)
+
+        restored = []
+        for chunk in manifest['chunks']:
+            restored.extend(read_items(f"{self.directory}/{chunk['file']}"))
+        self.assertEqual(restored, items)
+
+    def test_read_items_rewrites_index(self):
+        manifest = export([make_item('1')], self.directory, 'pg')
+        [item] = read_items(f"{self.directory}/{manifest['chunks'][0]['file']}", 'movies_v2')
+        meta, source = item.decode('utf-8').splitlines()
+        self.assertEqual(json.loads(meta), {'index': {'_index': 'movies_v2', '_id': '1'}})
+        self.assertEqual(json.loads(source), {'id': '1'})
+
+    def test_existing_snapshot_is_not_overwritten(self):
+        export([make_item('1')], self.directory, 'pg')
+        with self.assertRaises(ValueError):
+            export([make_item('2')], self.directory, 'pg')
+
+    def test_progress_survives_restart(self):
+        Progress(self.directory, 'movies').mark('chunk-00000.ndjson.gz')
+        self.assertEqual(Progress(self.directory, 'movies').done, {'chunk-00000.ndjson.gz'})
+        self.assertEqual(Progress(self.directory, 'movies_v2').done, set())
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase
+from ..management.commands.sync_data_main import State, NIL_UUID
+
+
+class StateTest(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def test_roundtrip_composite_key(self):
+        state = State(self.path)
+        state.advance({
+            'modified': datetime(2024, 1, 1, tzinfo=timezone.utc),
+            'id': '479f20b0-58d1-4f16-8944-9b82f5b1f22a',
+        })
+
+        restored = State(self.path)
+        restored.load()
+        self.assertEqual(restored.last_modified, state.last_modified)
+        self.assertEqual(restored.last_id, '479f20b0-58d1-4f16-8944-9b82f5b1f22a')
+
+    def test_legacy_plain_timestamp(self):
+        with open(self.path, 'w') as f:
+            f.write('2024-01-01T00:00:00+00:00')
+
+        state = State(self.path)
+        state.load()
+        self.assertEqual(
+            state.last_modified, datetime(2024, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(state.last_id, NIL_UUID)
+
+    def test_advance_ignores_older_key(self):
+        state = State(self.path)
+        modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        state.advance({'modified': modified, 'id': 'b' * 8})
+        state.advance({'modified': modified, 'id': 'a' * 8})
+        self.assertEqual(state.last_id, 'b' * 8)
+
+    def test_cursor_does_not_write_checkpoint(self):
+        state = State(self.path)
+        state.save()
+        cursor = state.cursor()
+        cursor.advance({'modified': datetime(2024, 1, 1, tzinfo=timezone.utc), 'id': 'a' * 8})
+
+        restored = State(self.path)
+        restored.load()
+        self.assertEqual(restored.last_id, NIL_UUID)
+        self.assertEqual(cursor.key()['id'], 'a' * 8)
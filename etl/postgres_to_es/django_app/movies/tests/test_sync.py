@@ -1,5 +1,15 @@
-from django.test import TestCase
+import uuid
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
 from elasticsearch import Elasticsearch
+from ..management.commands import sync_data, sync_data_main
+from ..management.commands.sync_data import Command, PendingKeys
+from ..management.commands.sync_data_main import (
+    FILM_WORK_SOURCE_QUERY, MOVIE_DOCUMENT_QUERY, State, run_pass
+)
 from ..models import Movie, SyncState
 
 class DataSyncTests(TestCase):
@@ -25,3 +35,147 @@ class DataSyncTests(TestCase):
         from ..management.commands.sync_data import Command
         Command().handle()
         self.assertGreater(SyncState.objects.count(), initial_count)
+
+
+class PendingKeysTest(SimpleTestCase):
+    def setUp(self):
+        self.pending = PendingKeys()
+        for doc_id in ('1', '2', '3'):
+            self.pending.add(doc_id, ('2024-01-01', doc_id))
+
+    def test_results_are_matched_by_id(self):
+        self.assertIsNone(self.pending.ack('2', True))
+        self.assertEqual(self.pending.ack('1', True), ('2024-01-01', '2'))
+        self.assertEqual(self.pending.ack('3', True), ('2024-01-01', '3'))
+
+    def test_checkpoint_stops_at_first_failure(self):
+        self.assertEqual(self.pending.ack('1', True), ('2024-01-01', '1'))
+        self.assertIsNone(self.pending.ack('2', False))
+        self.assertIsNone(self.pending.ack('3', True))
+        self.assertTrue(self.pending.failed)
+
+    def test_resent_document_keeps_both_positions(self):
+        pending = PendingKeys()
+        pending.add('1', ('t1', '1'))
+        pending.add('2', ('t1', '2'))
+        pending.add('1', ('t9', '1'))
+        self.assertEqual(pending.ack('1', True), ('t1', '1'))
+        self.assertIsNone(pending.ack('1', True))
+        self.assertEqual(pending.ack('2', True), ('t9', '1'))
+
+
+class FakeQuerySet:
+    """Страницы фильмов по порядку запросов; запоминает условия filter()"""
+    def __init__(self, pages, filters):
+        self.pages = pages
+        self.filters = filters
+        self.limit = None
+
+    def annotate(self, **kwargs):
+        return self
+
+    def order_by(self, *fields):
+        return self
+
+    def filter(self, *args, **kwargs):
+        self.filters.append(args[0] if args else Q(**kwargs))
+        return self
+
+    def __getitem__(self, item):
+        self.limit = item.stop
+        return self
+
+    def iterator(self, chunk_size):
+        page = self.pages.pop(0) if self.pages else []
+        return iter(page[:self.limit])
+
+
+def movie(minute, number):
+    return mock.Mock(
+        id=uuid.UUID(int=number),
+        modified=datetime(2024, 1, 1, 0, minute, tzinfo=timezone.utc),
+        **{'to_dict.return_value': {'id': str(uuid.UUID(int=number))}}
+    )
+
+
+class IterActionsTest(SimpleTestCase):
+    def iter_actions(self, last_key, pages, page_size=2):
+        filters = []
+        pending = PendingKeys()
+        objects = mock.Mock()
+        objects.annotate.side_effect = lambda **kwargs: FakeQuerySet(pages, filters)
+        with mock.patch.object(sync_data.Movie, 'objects', objects):
+            actions = list(Command().iter_actions(last_key, pending, page_size, 100))
+        return actions, filters, pending
+
+    def test_pages_follow_the_last_key_of_the_previous_page(self):
+        first, second, third = movie(1, 1), movie(1, 2), movie(2, 3)
+        actions, filters, pending = self.iter_actions(
+            None, [[first, second], [third]]
+        )
+        self.assertEqual(
+            [action['_id'] for action in actions],
+            [str(first.id), str(second.id), str(third.id)],
+        )
+        # Первая страница без условия, вторая — строго после (modified, id) второго фильма
+        self.assertEqual(filters, [
+            Q(modified__gt=second.modified) | Q(modified=second.modified, id__gt=second.id),
+        ])
+        self.assertEqual(
+            [send[1] for send in pending.sends],
+            [(m.modified, m.id) for m in (first, second, third)],
+        )
+
+    def test_full_last_page_is_followed_by_an_empty_query(self):
+        actions, filters, _ = self.iter_actions(None, [[movie(1, 1), movie(1, 2)]])
+        self.assertEqual(len(actions), 2)
+        self.assertEqual(len(filters), 1)
+
+    def test_old_checkpoint_without_modified_falls_back_to_id(self):
+        last_id = uuid.UUID(int=5)
+        after = movie(3, 6)
+        actions, filters, _ = self.iter_actions((None, last_id), [[after]])
+        self.assertEqual([action['_id'] for action in actions], [str(after.id)])
+        self.assertEqual(filters, [Q(id__gt=last_id)])
+
+    def test_checkpoint_key_filters_first_page(self):
+        last_key = (datetime(2024, 1, 1, tzinfo=timezone.utc), uuid.UUID(int=9))
+        _, filters, _ = self.iter_actions(last_key, [[]])
+        self.assertEqual(filters, [
+            Q(modified__gt=last_key[0]) | Q(modified=last_key[0], id__gt=last_key[1]),
+        ])
+
+
+class ExtractModeTest(SimpleTestCase):
+    def run_pass(self, extract_mode):
+        settings = mock.Mock(extract_mode=extract_mode, batch_size=10)
+        queries = []
+
+        def fetch_raw(position, settings, batch_size, query):
+            queries.append(query)
+            yield [b'item']
+
+        with mock.patch.object(sync_data_main, 'BulkLoader') as loader, \
+                mock.patch('movies.etl.projections.open_projections'), \
+                mock.patch.object(sync_data_main, 'fetch_raw_from_pg', fetch_raw), \
+                mock.patch.object(sync_data_main, 'pg_connection') as pg_connection:
+            total = run_pass(mock.Mock(), settings, State(None))
+        return total, queries, loader.return_value.__enter__.return_value, pg_connection
+
+    def test_document_mode_reads_maintained_documents(self):
+        total, queries, loader, pg_connection = self.run_pass('document')
+        self.assertEqual(queries, [MOVIE_DOCUMENT_QUERY])
+        loader.submit_raw.assert_called_once_with([b'item'])
+        self.assertEqual(total, 1)
+        # Персоны и жанры уже учтены триггерами: продюсеры изменений не запускаются
+        pg_connection.assert_not_called()
+
+    def test_raw_mode_reads_built_sources(self):
+        with mock.patch.object(sync_data_main, 'run_entity_producers', return_value=0):
+            _, queries, _, _ = self.run_pass('raw')
+        self.assertEqual(queries, [FILM_WORK_SOURCE_QUERY])
+
+    def test_document_query_pages_movies_by_keyset(self):
+        self.assertIn('FROM movies_movie m', MOVIE_DOCUMENT_QUERY)
+        self.assertIn('WHERE (m.modified, m.id) > (%s, %s)', MOVIE_DOCUMENT_QUERY)
+        self.assertIn('ORDER BY m.modified, m.id', MOVIE_DOCUMENT_QUERY)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.movie_search, name='movie-search'),
+    path('<uuid:movie_id>', views.movie_detail, name='movie-detail'),
+]
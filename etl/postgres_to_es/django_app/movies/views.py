@@ -0,0 +1,108 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .cache import GenerationPoller, ResponseCache
+from .documents import MovieDocument
+from .etl import metrics
+from .index_profiles import SERVICE_FIELDS
+from .models import IndexGeneration, SyncState
+
+SEARCH_FIELDS = ['title^3', 'actors_names', 'directors_names', 'writers_names']
+SORTS = {
+    'relevance': None,
+    'imdb_rating': {'imdb_rating': {'order': 'asc'}},
+    '-imdb_rating': {'imdb_rating': {'order': 'desc'}},
+}
+MAX_PAGE_SIZE = 100
+# index.max_result_window по умолчанию
+MAX_RESULT_WINDOW = 10000
+
+CACHE = ResponseCache(settings.MOVIE_API_CACHE_SIZE, settings.MOVIE_API_CACHE_TTL)
+GENERATION = GenerationPoller(IndexGeneration.current, settings.MOVIE_API_GENERATION_POLL)
+
+
+def metrics_view(request):
+    """Метрики последнего запуска sync_data и текущее отставание"""
+    try:
+        with open(settings.ETL_METRICS_PATH) as f:
+            snapshot = f.read()
+    except FileNotFoundError:
+        snapshot = ''
+    # Снимок старой версии команды мог содержать это семейство
+    snapshot = metrics.drop_family(snapshot, metrics.LAG_SECONDS.name)
+
+    # Отставание считаем в момент запроса: между запусками команды оно растёт
+    lag = metrics.Gauge('etl_lag_seconds', metrics.LAG_SECONDS.documentation)
+    state = SyncState.objects.last()
+    value = metrics.lag_seconds(state.last_modified if state else None)
+    if value is not None:
+        lag.set(value)
+    body = snapshot + '\n'.join(lag.render()) + '\n'
+    return HttpResponse(body, content_type=metrics.CONTENT_TYPE)
+
+
+def search_params(query_dict):
+    """Разбор и проверка параметров поиска; ValueError — ошибка клиента"""
+    sort = query_dict.get('sort', 'relevance')
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+    page = int(query_dict.get('page', 1))
+    size = int(query_dict.get('size', 20))
+    if page < 1 or not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f'page must be >= 1 and size between 1 and {MAX_PAGE_SIZE}')
+    if page * size > MAX_RESULT_WINDOW:
+        raise ValueError(f'page * size must not exceed {MAX_RESULT_WINDOW}')
+    return {
+        'query': query_dict.get('query', '').strip(),
+        'genre': query_dict.get('genre', '').strip(),
+        'sort': sort,
+        'page': page,
+        'size': size,
+    }
+
+
+def search_movies(query, genre, sort, page, size):
+    """Полнотекстовый поиск по названию и именам с фильтром по жанру"""
+    search = MovieDocument.search().source(excludes=SERVICE_FIELDS)
+    if query:
+        search = search.query('multi_match', query=query, fields=SEARCH_FIELDS)
+    if genre:
+        search = search.filter('term', genres=genre)
+    if SORTS[sort] is not None:
+        search = search.sort(SORTS[sort], '_score')
+    search = search[(page - 1) * size:page * size]
+    response = search.execute()
+    return {
+        'total': response.hits.total.value,
+        'page': page,
+        'size': size,
+        'results': [hit.to_dict() for hit in response],
+    }
+
+
+def movie_search(request):
+    try:
+        params = search_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    key = ('search',) + tuple(params.values())
+    body = CACHE.get_or_compute(
+        key, GENERATION.get(),
+        lambda: json.dumps(search_movies(**params), ensure_ascii=False).encode('utf-8'),
+    )
+    return HttpResponse(body, content_type='application/json')
+
+
+def movie_detail(request, movie_id):
+    def fetch():
+        doc = MovieDocument.get(id=str(movie_id), ignore=404, _source_excludes=SERVICE_FIELDS)
+        if doc is None:
+            return 404, json.dumps({'error': 'not found'}).encode('utf-8')
+        return 200, json.dumps(doc.to_dict(), ensure_ascii=False).encode('utf-8')
+
+    # Отсутствующий фильм тоже кэшируем: до следующего поколения он не появится
+    status, body = CACHE.get_or_compute(('detail', str(movie_id)), GENERATION.get(), fetch)
+    return HttpResponse(body, status=status, content_type='application/json')